@@ -0,0 +1,754 @@
+import asyncio
+import threading
+import time
+import concurrent.futures
+from contextlib import AsyncExitStack
+from typing import Optional, Dict, Tuple, List, AsyncIterator, Awaitable, Any, Callable
+
+from PIL import Image
+
+from genai_wrapper import TextRequest
+from resilience import async_call_with_retry, async_hedged_call
+from job_manager import JobManager
+from chat_session import ChatSession
+from code_patch import apply_patch
+from file_stream import (
+    FILES_SCHEMA, MANIFEST_SCHEMA, FileStreamParser, parse_manifest, strip_code_fence
+)
+
+# Maximum number of files generated concurrently by generate_project
+PROJECT_CONCURRENCY = 4
+
+
+class BackgroundLoop:
+    """An asyncio event loop running in a daemon thread.
+    
+    The Tk main loop and the CLI submit coroutines to it from their own
+    threads and receive concurrent.futures.Future objects back.
+    """
+    
+    def __init__(self):
+        """Create the loop and start its thread."""
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run, name="genai-event-loop", daemon=True
+        )
+        self._thread.start()
+    
+    def _run(self) -> None:
+        """Run the event loop until stop() is called."""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+    
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop from any thread.
+        
+        Args:
+            coro: The coroutine to run
+        
+        Returns:
+            Future that resolves to the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block until it finishes.
+        
+        Args:
+            coro: The coroutine to run
+            timeout: Optional time limit in seconds
+        
+        Returns:
+            The coroutine's result
+        """
+        return self.submit(coro).result(timeout)
+    
+    def stop(self) -> None:
+        """Stop the loop; pending work is abandoned."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class AsyncGenAIWrapper:
+    """Coroutine versions of the GenAIWrapper methods built on the SDK's async client.
+    
+    Settings (model, system prompt, generation config), prompts and the
+    response cache are shared with the synchronous wrapper, and so is the
+    priority scheduler that bounds how many requests run at once. All
+    coroutines must run on this wrapper's background loop; use submit()
+    from other threads.
+    """
+    
+    def __init__(self, genai_wrapper, max_concurrency: Optional[int] = None, timeout: float = 120.0):
+        """Initialize the async wrapper.
+        
+        Args:
+            genai_wrapper: The GenAIWrapper providing client, settings and cache
+            max_concurrency: Optional override of the scheduler's limit on requests in flight
+            timeout: Default per-call timeout in seconds
+        """
+        self.genai = genai_wrapper
+        if max_concurrency is not None:
+            genai_wrapper.scheduler.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.background = BackgroundLoop()
+        # Requests from the sync and async wrappers share one priority scheduler
+        self.scheduler = genai_wrapper.scheduler
+        
+        # Cancellable, sequence-numbered jobs submitted by the GUI
+        self.jobs = JobManager(self.submit)
+    
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The background event loop."""
+        return self.background.loop
+    
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """Schedule a coroutine on the background loop from any thread."""
+        return self.background.submit(coro)
+    
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the background loop and wait for its result."""
+        return self.background.run(coro, timeout)
+    
+    async def _retrying_call(self, factory: Callable[[], Awaitable[Any]], timeout: Optional[float],
+                             model: Optional[str] = None, tokens: int = 0) -> Any:
+        """Await an SDK call with retries; each attempt gets its own timeout and concurrency slot.
+        
+        When a model is given, every attempt waits for the shared rate limiter
+        once it holds its slot (so quota is reserved in priority order),
+        outside the timeout.
+        """
+        async def attempt():
+            async with self.scheduler.slot_async():
+                if model:
+                    await self.genai.rate_limiter.acquire_async(model, tokens)
+                return await asyncio.wait_for(factory(), timeout or self.timeout)
+        return await async_call_with_retry(attempt, self.genai.retry_policy)
+    
+    async def _open_stream(self, model: str, tokens: int,
+                           open_stream: Callable[[], Awaitable[Any]]) -> Tuple[AsyncExitStack, Any]:
+        """Async variant of GenAIWrapper._open_stream.
+        
+        Returns:
+            Tuple of (slot, open_stream() result); exit the slot once the stream ends
+        """
+        async def attempt():
+            async with AsyncExitStack() as slot:
+                await slot.enter_async_context(self.scheduler.slot_async())
+                await self.genai.rate_limiter.acquire_async(model, tokens)
+                stream = await open_stream()
+                return slot.pop_all(), stream
+        return await async_call_with_retry(attempt, self.genai.retry_policy)
+    
+    async def _resilient_call(self, model: str, request: Callable[[str], Awaitable[Any]],
+                              timeout: Optional[float], tokens: int = 0) -> Any:
+        """Await request(model) with rate limiting and retries, hedged against a fallback model when enabled.
+        
+        Args:
+            model: Primary model
+            request: Function returning the SDK awaitable for a given model
+            timeout: Per-attempt timeout in seconds
+            tokens: Estimated input tokens, charged to the rate limiter
+        
+        Returns:
+            The first successful response
+        """
+        genai = self.genai
+        
+        def attempt(target):
+            return lambda: self._retrying_call(lambda: request(target), timeout, target, tokens)
+        
+        fallback = genai.hedge_target(model)
+        if fallback is None:
+            return await attempt(model)()
+        return await async_hedged_call(attempt(model), attempt(fallback), genai.hedge_delay(model))
+    
+    async def _cached_context(self, request: TextRequest) -> Tuple[Optional[str], int]:
+        """Async variant of GenAIWrapper._cached_context.
+        
+        Creating a context goes through the sync wrapper's limited call path,
+        in a worker thread so it doesn't block the event loop.
+        """
+        if not request.context:
+            return None, request.tokens
+        return await asyncio.to_thread(self.genai._cached_context, request)
+    
+    async def _generate_text(self, prompt: str, system_instruction: Optional[str] = None,
+                             use_cache: bool = True, timeout: Optional[float] = None,
+                             task: Optional[str] = None,
+                             response_schema: Optional[Dict[str, Any]] = None,
+                             context: Optional[str] = None,
+                             sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Send a text request, answering from the response cache when possible.
+        
+        Args:
+            prompt: The prompt to send
+            system_instruction: System instruction, defaults to the configured system prompt
+            use_cache: Set to False to bypass the response cache for this call
+            timeout: Per-call timeout in seconds, defaults to self.timeout
+            task: Task name used for model routing
+            response_schema: Optional schema for a JSON response
+            context: Optional large, stable prefix, sent from the provider-side context cache
+            sources: Files the context comes from
+        
+        Returns:
+            Tuple of (success, response_text_or_error)
+        """
+        genai = self.genai
+        try:
+            request = genai._text_request(prompt, system_instruction, use_cache, task, response_schema, context, sources)
+            if request.cache_key:
+                # The response cache is SQLite backed, keep its I/O off the loop
+                cached = await asyncio.to_thread(genai.response_cache.get, request.cache_key)
+                if cached is not None:
+                    return True, cached
+            
+            async def send():
+                cached_context, tokens = await self._cached_context(request)
+                
+                async def call(target_model):
+                    start = time.perf_counter()
+                    response = await genai.client.aio.models.generate_content(
+                        **genai._request_args(request, target_model, cached_context)
+                    )
+                    genai.router.record_latency(target_model, time.perf_counter() - start)
+                    return response
+                
+                response = await self._resilient_call(request.model, call, timeout, tokens)
+                text = response.text
+                if request.cache_key and text:
+                    await asyncio.to_thread(genai.response_cache.put, request.cache_key, text)
+                return text
+            
+            # Identical requests already in flight share one call
+            text = await genai.single_flight.do_async(request.request_key, send)
+            return True, text
+        except asyncio.TimeoutError:
+            return False, f"Error in AI processing: request timed out after {timeout or self.timeout:.0f}s"
+        except Exception as e:
+            return False, f"Error in AI processing: {e}"
+    
+    async def _stream_text(self, prompt: str, system_instruction: Optional[str] = None,
+                           use_cache: bool = True, timeout: Optional[float] = None,
+                           task: Optional[str] = None,
+                           response_schema: Optional[Dict[str, Any]] = None,
+                           context: Optional[str] = None,
+                           sources: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """Stream a text request, yielding chunks as the model produces them.
+        
+        The timeout applies to the wait for each chunk rather than the whole
+        stream, so long outputs are not cut off while they are still flowing.
+        Opening the stream is retried on transient errors; once chunks flow it is not.
+        Identical streams already in flight are shared, a late joiner first
+        receives the chunks produced so far.
+        
+        Yields:
+            Text chunks of the response
+        
+        Raises:
+            Exception: Errors from the SDK (and asyncio.TimeoutError) are propagated
+        """
+        genai = self.genai
+        timeout = timeout or self.timeout
+        request = genai._text_request(prompt, system_instruction, use_cache, task, response_schema, context, sources)
+        if request.cache_key:
+            cached = await asyncio.to_thread(genai.response_cache.get, request.cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        async def open_stream(cached_context):
+            # Errors usually surface with the first chunk, so fetch it inside the retry
+            started = time.perf_counter()
+            stream = await asyncio.wait_for(
+                genai.client.aio.models.generate_content_stream(
+                    **genai._request_args(request, request.model, cached_context)
+                ),
+                timeout
+            )
+            iterator = stream.__aiter__()
+            try:
+                first = await asyncio.wait_for(iterator.__anext__(), timeout)
+            except StopAsyncIteration:
+                first = None
+            return started, iterator, first
+        
+        async def model_stream():
+            chunks = []
+            cached_context, tokens = await self._cached_context(request)
+            slot, (start, iterator, response) = await self._open_stream(
+                request.model, tokens, lambda: open_stream(cached_context)
+            )
+            async with slot:
+                while response is not None:
+                    text = response.text
+                    if text:
+                        chunks.append(text)
+                        yield text
+                    try:
+                        response = await asyncio.wait_for(iterator.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        response = None
+                genai.router.record_latency(request.model, time.perf_counter() - start)
+            
+            if request.cache_key and chunks:
+                await asyncio.to_thread(genai.response_cache.put, request.cache_key, "".join(chunks))
+        
+        async for text in genai.single_flight.stream_async(request.request_key, model_stream):
+            yield text
+    
+    async def ask_question(self, question: str, context: Optional[str] = None,
+                           use_cache: bool = True, timeout: Optional[float] = None,
+                           sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Ask a question to the model."""
+        prompt, system_instruction, context = self.genai._ask_question_prompt(question, context)
+        return await self._generate_text(
+            prompt, system_instruction, use_cache, timeout, task="ask", context=context, sources=sources
+        )
+    
+    async def explain_code(self, code: str, use_cache: bool = True,
+                           timeout: Optional[float] = None,
+                           sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Have the model explain code."""
+        prompt, system_instruction, context = self.genai._explain_code_prompt(code)
+        return await self._generate_text(
+            prompt, system_instruction, use_cache, timeout, task="explain", context=context, sources=sources
+        )
+    
+    async def _edit_via_patch(self, code: str, instruction: str, task: str,
+                              rewrite_prompt: Tuple[str, Optional[str]], use_cache: bool,
+                              timeout: Optional[float]) -> Tuple[bool, str]:
+        """Ask for a diff and apply it locally, falling back to a full rewrite on conflict."""
+        prompt, system_instruction = self.genai._patch_prompt(code, instruction)
+        success, diff = await self._generate_text(prompt, system_instruction, use_cache, timeout, task=task)
+        if success:
+            applied, result = apply_patch(code, diff)
+            if applied:
+                return True, result
+        prompt, system_instruction = rewrite_prompt
+        return await self._generate_text(prompt, system_instruction, use_cache, timeout, task=task)
+    
+    async def refactor_code(self, code: str, instruction: str, use_cache: bool = True,
+                            timeout: Optional[float] = None, as_patch: bool = False) -> Tuple[bool, str]:
+        """Have the model refactor code according to instructions, optionally via a diff."""
+        prompt, system_instruction = self.genai._refactor_code_prompt(code, instruction)
+        if as_patch:
+            return await self._edit_via_patch(
+                code, instruction, "refactor", (prompt, system_instruction), use_cache, timeout
+            )
+        return await self._generate_text(prompt, system_instruction, use_cache, timeout, task="refactor")
+    
+    async def generate_documentation(self, code: str, use_cache: bool = True,
+                                     timeout: Optional[float] = None,
+                                     sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Have the model generate documentation for code."""
+        prompt, system_instruction, context = self.genai._documentation_prompt(code)
+        return await self._generate_text(
+            prompt, system_instruction, use_cache, timeout, task="docs", context=context, sources=sources
+        )
+    
+    async def suggest_improvements(self, code: str, use_cache: bool = True,
+                                   timeout: Optional[float] = None,
+                                   sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Have the model suggest improvements for code."""
+        prompt, system_instruction, context = self.genai._improvements_prompt(code)
+        return await self._generate_text(
+            prompt, system_instruction, use_cache, timeout, task="improve", context=context, sources=sources
+        )
+    
+    async def modify_with_instruction(self, code: str, instruction: str, use_cache: bool = True,
+                                      timeout: Optional[float] = None, as_patch: bool = False) -> Tuple[bool, str]:
+        """Modify code based on user instruction, optionally via a diff."""
+        prompt, system_instruction = self.genai._modify_prompt(code, instruction)
+        if as_patch:
+            return await self._edit_via_patch(
+                code, instruction, "modify", (prompt, system_instruction), use_cache, timeout
+            )
+        return await self._generate_text(prompt, system_instruction, use_cache, timeout, task="modify")
+    
+    def ask_question_stream(self, question: str, context: Optional[str] = None,
+                            use_cache: bool = True, timeout: Optional[float] = None,
+                            sources: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """Streaming variant of ask_question that yields text chunks."""
+        prompt, system_instruction, context = self.genai._ask_question_prompt(question, context)
+        return self._stream_text(
+            prompt, system_instruction, use_cache, timeout, task="ask", context=context, sources=sources
+        )
+    
+    def explain_code_stream(self, code: str, use_cache: bool = True,
+                            timeout: Optional[float] = None,
+                            sources: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """Streaming variant of explain_code that yields text chunks."""
+        prompt, system_instruction, context = self.genai._explain_code_prompt(code)
+        return self._stream_text(
+            prompt, system_instruction, use_cache, timeout, task="explain", context=context, sources=sources
+        )
+    
+    def refactor_code_stream(self, code: str, instruction: str, use_cache: bool = True,
+                             timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Streaming variant of refactor_code that yields text chunks."""
+        prompt, system_instruction = self.genai._refactor_code_prompt(code, instruction)
+        return self._stream_text(prompt, system_instruction, use_cache, timeout, task="refactor")
+    
+    def generate_documentation_stream(self, code: str, use_cache: bool = True,
+                                      timeout: Optional[float] = None,
+                                      sources: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """Streaming variant of generate_documentation that yields text chunks."""
+        prompt, system_instruction, context = self.genai._documentation_prompt(code)
+        return self._stream_text(
+            prompt, system_instruction, use_cache, timeout, task="docs", context=context, sources=sources
+        )
+    
+    def suggest_improvements_stream(self, code: str, use_cache: bool = True,
+                                    timeout: Optional[float] = None,
+                                    sources: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """Streaming variant of suggest_improvements that yields text chunks."""
+        prompt, system_instruction, context = self.genai._improvements_prompt(code)
+        return self._stream_text(
+            prompt, system_instruction, use_cache, timeout, task="improve", context=context, sources=sources
+        )
+    
+    def modify_with_instruction_stream(self, code: str, instruction: str, use_cache: bool = True,
+                                       timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Streaming variant of modify_with_instruction that yields text chunks."""
+        prompt, system_instruction = self.genai._modify_prompt(code, instruction)
+        return self._stream_text(prompt, system_instruction, use_cache, timeout, task="modify")
+    
+    def edit_patch_stream(self, code: str, instruction: str, use_cache: bool = True,
+                          timeout: Optional[float] = None, task: str = "refactor") -> AsyncIterator[str]:
+        """Stream a unified diff that applies an instruction to code (see GenAIWrapper.edit_patch_stream)."""
+        prompt, system_instruction = self.genai._patch_prompt(code, instruction)
+        return self._stream_text(prompt, system_instruction, use_cache, timeout, task=task)
+    
+    async def chat_stream(self, session: ChatSession, message: str,
+                          timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Send a follow-up in a chat session (see GenAIWrapper.chat_stream).
+        
+        The timeout applies to the wait for each chunk, as in _stream_text.
+        
+        Yields:
+            Text chunks of the answer
+        
+        Raises:
+            Exception: Errors from the SDK (and asyncio.TimeoutError) are propagated
+        """
+        genai = self.genai
+        timeout = timeout or self.timeout
+        cached_content = await asyncio.to_thread(session.cached_content)
+        tokens = session.request_tokens(message, cached=bool(cached_content))
+        chat = session.create_chat(genai.client.aio.chats, cached_content)
+        turn = session.turn_message(message, cached_content)
+        
+        async def open_stream():
+            # Errors usually surface with the first chunk, so fetch it inside the retry
+            started = time.perf_counter()
+            stream = await asyncio.wait_for(chat.send_message_stream(turn), timeout)
+            iterator = stream.__aiter__()
+            try:
+                first = await asyncio.wait_for(iterator.__anext__(), timeout)
+            except StopAsyncIteration:
+                first = None
+            return started, iterator, first
+        
+        slot, (start, iterator, response) = await self._open_stream(session.model, tokens, open_stream)
+        async with slot:
+            while response is not None:
+                text = response.text
+                if text:
+                    yield text
+                try:
+                    response = await asyncio.wait_for(iterator.__anext__(), timeout)
+                except StopAsyncIteration:
+                    response = None
+            genai.router.record_latency(session.model, time.perf_counter() - start)
+        
+        session.record(chat.get_history(curated=True))
+    
+    async def generate_files(self, instruction: str, existing_files: Optional[Dict[str, str]] = None,
+                             timeout: Optional[float] = None,
+                             structured: bool = False) -> Tuple[bool, Dict[str, str]]:
+        """Generate multiple files based on an instruction.
+        
+        Args:
+            instruction: The instruction for file generation
+            existing_files: Optional dictionary of existing files {filename: content}
+            timeout: Per-call timeout in seconds, defaults to self.timeout
+            structured: Request JSON output (FILES_SCHEMA) instead of FILENAME blocks;
+                only for models with structured output support
+        
+        Returns:
+            Tuple of (success, files_dict) where files_dict is {filename: content}
+        """
+        genai = self.genai
+        try:
+            # Building the context may count tokens with the SDK, keep it off the loop
+            request = await asyncio.to_thread(
+                genai._generate_files_request, instruction, existing_files, structured
+            )
+            
+            async def call(target_model):
+                start = time.perf_counter()
+                response = await genai.client.aio.models.generate_content(
+                    **genai._request_args(request, target_model, None)
+                )
+                genai.router.record_latency(target_model, time.perf_counter() - start)
+                return response
+            
+            async def send():
+                return await self._resilient_call(request.model, call, timeout, request.tokens)
+            
+            response = await genai.single_flight.do_async(request.request_key, send)
+            return True, genai._parse_generated_files(response.text, structured)
+        except asyncio.TimeoutError:
+            return False, {"error": f"Error in AI processing: request timed out after {timeout or self.timeout:.0f}s"}
+        except Exception as e:
+            return False, {"error": f"Error in AI processing: {e}"}
+    
+    async def generate_files_stream(self, instruction: str, existing_files: Optional[Dict[str, str]] = None,
+                                    use_cache: bool = True,
+                                    timeout: Optional[float] = None) -> AsyncIterator[Dict[str, str]]:
+        """Stream generated files, yielding each one as soon as its JSON object is complete.
+        
+        Args:
+            instruction: The instruction for file generation
+            existing_files: Optional dictionary of existing files {filename: content}
+            use_cache: Set to False to bypass the response cache for this call
+            timeout: Per-chunk timeout in seconds, defaults to self.timeout
+        
+        Yields:
+            File objects {"filename", "language", "content"}
+        
+        Raises:
+            Exception: SDK errors, or ValueError if the JSON is invalid or truncated
+        """
+        prompt, system_instruction = await asyncio.to_thread(
+            self.genai._generate_files_prompt, instruction, existing_files, structured=True
+        )
+        parser = FileStreamParser()
+        async for chunk in self._stream_text(prompt, system_instruction, use_cache, timeout,
+                                             task="generate_files", response_schema=FILES_SCHEMA):
+            for file in parser.feed(chunk):
+                yield file
+        parser.close()
+    
+    async def plan_project(self, instruction: str, existing_files: Optional[Dict[str, str]] = None,
+                           timeout: Optional[float] = None) -> Tuple[bool, Any]:
+        """Ask for the manifest of a project: its files, their purpose and interfaces.
+        
+        Args:
+            instruction: The project instruction
+            existing_files: Optional dictionary of existing files {filename: content}
+            timeout: Per-call timeout in seconds, defaults to self.timeout
+        
+        Returns:
+            Tuple of (success, manifest_or_error); the manifest is a list of
+            {"filename", "purpose", "interfaces"}
+        """
+        prompt, system_instruction = await asyncio.to_thread(
+            self.genai._plan_project_prompt, instruction, existing_files
+        )
+        success, text = await self._generate_text(
+            prompt, system_instruction, True, timeout, task="plan_project", response_schema=MANIFEST_SCHEMA
+        )
+        if not success:
+            return False, text
+        try:
+            manifest = parse_manifest(text or "")
+        except ValueError as e:
+            return False, f"Invalid project plan: {e}"
+        if not manifest:
+            return False, "The project plan lists no files"
+        return True, manifest
+    
+    async def generate_project(self, instruction: str, existing_files: Optional[Dict[str, str]] = None,
+                               timeout: Optional[float] = None,
+                               on_progress: Optional[Callable[[str, str, str], None]] = None,
+                               max_parallel: int = PROJECT_CONCURRENCY) -> Tuple[bool, Dict[str, str]]:
+        """Generate a project in two phases: a manifest, then every file concurrently.
+        
+        Each file is its own request with the manifest as shared context, so
+        the project is not limited by one response's max_output_tokens and
+        takes about as long as the slowest file.
+        
+        Args:
+            instruction: The project instruction
+            existing_files: Optional dictionary of existing files {filename: content}
+            timeout: Per-call timeout in seconds, defaults to self.timeout
+            on_progress: Optional callback (filename, status, detail), run on the event
+                loop thread; status is "planned", "generating", "done" or "failed"
+            max_parallel: Maximum number of files generated at once
+        
+        Returns:
+            Tuple of (success, files_dict) where files_dict is {filename: content};
+            files that failed are left out and reported through on_progress
+        """
+        def report(filename, status, detail=""):
+            if on_progress:
+                try:
+                    on_progress(filename, status, detail)
+                except Exception as e:
+                    print(f"Error in progress callback: {e}")
+        
+        success, manifest = await self.plan_project(instruction, existing_files, timeout)
+        if not success:
+            return False, {"error": manifest}
+        for entry in manifest:
+            report(entry["filename"], "planned", entry["purpose"])
+        
+        existing_files = existing_files or {}
+        limiter = asyncio.Semaphore(max_parallel)
+        
+        async def generate_one(filename):
+            async with limiter:
+                report(filename, "generating")
+                prompt, system_instruction = self.genai._project_file_prompt(
+                    instruction, manifest, filename, existing_files.get(filename)
+                )
+                success, content = await self._generate_text(
+                    prompt, system_instruction, True, timeout, task="generate_file"
+                )
+            if success:
+                content = strip_code_fence(content or "")
+                report(filename, "done", content)
+            else:
+                report(filename, "failed", content)
+            return filename, success, content
+        
+        results = await asyncio.gather(*(generate_one(entry["filename"]) for entry in manifest))
+        files = {filename: content for filename, success, content in results if success}
+        if not files:
+            return False, {"error": f"No file could be generated: {results[0][2]}"}
+        return True, files
+    
+    async def generate_image(self, prompt: str, model: str = "imagen-3.0-generate-002",
+                             timeout: Optional[float] = None) -> Tuple[bool, Optional[Image.Image], str]:
+        """Generate an image based on a prompt.
+        
+        Args:
+            prompt: Text description of the desired image
+            model: Image model to use, defaults to Imagen 3.0
+            timeout: Per-call timeout in seconds, defaults to self.timeout
+        
+        Returns:
+            Tuple of (success, image_object, message)
+        """
+        try:
+            if len(prompt.strip()) < 3:
+                return False, None, "Prompt is too short. Please provide a more detailed description."
+            
+            response = await self._retrying_call(
+                lambda: self.genai.client.aio.models.generate_images(
+                    model=model,
+                    prompt=prompt,
+                    config=self.genai._image_config()
+                ),
+                timeout,
+                model
+            )
+            
+            return self.genai._image_from_response(response)
+        except asyncio.TimeoutError:
+            return False, None, f"Error generating image: request timed out after {timeout or self.timeout:.0f}s"
+        except Exception as e:
+            return False, None, f"Error generating image: {str(e)}"
+    
+    async def generate_embedding(self, text: str, model: Optional[str] = None,
+                                 timeout: Optional[float] = None) -> Tuple[bool, Optional[List[float]], str]:
+        """Generate an embedding vector for the given text.
+        
+        Args:
+            text: The text to embed
+            model: Optional specific embedding model to use
+            timeout: Per-call timeout in seconds, defaults to self.timeout
+        
+        Returns:
+            Tuple of (success, embedding_vector, message)
+        """
+        try:
+            embedding_model = self.genai.embedding_model(model)
+            if not embedding_model:
+                return False, None, "No embedding model available"
+            
+            response = await self._retrying_call(
+                lambda: self.genai.client.aio.models.embed_content(
+                    model=embedding_model,
+                    contents=text
+                ),
+                timeout,
+                embedding_model,
+                self.genai.context_builder.estimate_tokens(text)
+            )
+            
+            if hasattr(response, 'embedding'):
+                return True, response.embedding, "Embedding generated successfully"
+            else:
+                return False, None, "Failed to generate embedding"
+        except asyncio.TimeoutError:
+            return False, None, f"Error generating embedding: request timed out after {timeout or self.timeout:.0f}s"
+        except Exception as e:
+            return False, None, f"Error generating embedding: {str(e)}"
+    
+    async def test_model_availability(self, model_name: str,
+                                      timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """Test if a specific model is available and working.
+        
+        Args:
+            model_name: The name of the model to test
+            timeout: Per-call timeout in seconds, defaults to self.timeout
+        
+        Returns:
+            Tuple of (success, message)
+        """
+        return await self._probe(model_name, timeout, save=True)
+    
+    async def _probe(self, model_name: str, timeout: Optional[float], save: bool) -> Tuple[bool, str]:
+        """Send a tiny request to a model and record the outcome in the health table.
+        
+        With save, the table is written to disk in a worker thread.
+        """
+        health = self.genai.model_health
+        try:
+            async with self.scheduler.slot_async():
+                await self.genai.rate_limiter.acquire_async(model_name, 1)
+                # Time only the request itself, not the waits for a slot and quota
+                start = time.perf_counter()
+                await asyncio.wait_for(
+                    self.genai.client.aio.models.generate_content(
+                        model=model_name,
+                        contents="Hello",
+                        config=self.genai._probe_config()
+                    ),
+                    timeout or self.timeout
+                )
+                latency = time.perf_counter() - start
+            health.record(model_name, True, latency, save=False)
+            result = True, f"Model {model_name} is available"
+        except asyncio.TimeoutError:
+            health.record(model_name, False, None, "request timed out", save=False)
+            result = False, f"Model {model_name} is not available: request timed out"
+        except Exception as e:
+            health.record(model_name, False, None, str(e), save=False)
+            result = False, f"Model {model_name} is not available: {str(e)}"
+        
+        if save:
+            # Writing the table is file I/O; keep it off the event loop
+            await asyncio.to_thread(health.save)
+        return result
+    
+    async def probe_models(self, models: Optional[List[str]] = None,
+                           timeout: Optional[float] = 20.0) -> Dict[str, Dict[str, Any]]:
+        """Probe several models concurrently and record their health.
+        
+        Args:
+            models: Models to probe, defaults to all available text models
+            timeout: Per-probe timeout in seconds
+        
+        Returns:
+            Dictionary of {model: health_entry} for the probed models
+        """
+        models = list(models if models is not None else self.genai.available_text_models)
+        await asyncio.gather(*(self._probe(model, timeout, save=False) for model in models))
+        
+        health = self.genai.model_health
+        await asyncio.to_thread(health.save)
+        return {model: health.get(model) for model in models}
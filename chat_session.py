@@ -0,0 +1,131 @@
+import hashlib
+from typing import Optional, List, Any, Union
+
+from google.genai import types
+
+# Question/answer history kept per session; older turns are dropped first
+CHAT_HISTORY_TOKENS = 8000
+
+
+def content_hash(content: str) -> str:
+    """Hash of a file's content, used to tell whether a chat still matches it."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ChatSession:
+    """A multi-turn conversation about one file.
+    
+    The session is bound to a file and the hash of the content it was
+    started with. Large files are registered once as a provider-side cached
+    context; smaller ones (and files for models without caching support)
+    are sent as the first user turn of the chat instead. Either way only
+    the question/answer turns are kept as history, so a follow-up doesn't
+    rebuild a "Context + Question" prompt. History is trimmed
+    oldest-turn-first to a token budget; the file itself is never dropped.
+    
+    Turns are sent through the SDK chat API by GenAIWrapper.chat_stream and
+    AsyncGenAIWrapper.chat_stream; send one turn at a time per session.
+    """
+    
+    def __init__(self, genai_wrapper, filename: str, content: str, model: str,
+                 max_history_tokens: int = CHAT_HISTORY_TOKENS):
+        """Initialize the session.
+        
+        Args:
+            genai_wrapper: The GenAIWrapper providing settings and caches
+            filename: File the conversation is about
+            content: Content of the file when the session started
+            model: Model every turn is sent to
+            max_history_tokens: Token budget for the question/answer history
+        """
+        self.genai = genai_wrapper
+        self.filename = filename
+        self.content_hash = content_hash(content)
+        self.model = model
+        self.max_history_tokens = max_history_tokens
+        self.history = []  # types.Content turns, alternating user/model
+        self.turns = 0
+        self.dropped_turns = 0
+        
+        # Same system instruction and context as ask_question, so both share a cached context
+        self.system_instruction = genai_wrapper.system_prompt
+        self.context = f"Context:\n{content}"
+        self.context_tokens = genai_wrapper.context_builder.estimate_tokens(self.context, model)
+    
+    def matches(self, filename: str, content: str) -> bool:
+        """Check whether the session is about this file in this state."""
+        return filename == self.filename and content_hash(content) == self.content_hash
+    
+    def cached_content(self) -> Optional[str]:
+        """Get the cached context holding the file, registering it if needed (blocking).
+        
+        Returns:
+            Cached content name, or None if the file can't be cached
+        """
+        return self.genai.context_cache.get(
+            self.model, self.system_instruction, self.context, self.context_tokens, [self.filename]
+        )
+    
+    def build_config(self, cached_content: Optional[str]) -> types.GenerateContentConfig:
+        """Generation config for a turn, on top of the cached context if there is one."""
+        return self.genai._build_config(self.system_instruction, cached_content=cached_content)
+    
+    def request_tokens(self, message: str, cached: bool) -> int:
+        """Estimate the input tokens of a turn; a cached context is not charged again."""
+        tokens = self.history_tokens() + self._estimate(message)
+        if not cached:
+            tokens += self.context_tokens
+        return tokens
+    
+    def create_chat(self, chats, cached_content: Optional[str]) -> Any:
+        """Create an SDK chat primed with this session's history.
+        
+        Args:
+            chats: client.chats, or client.aio.chats for an async chat
+            cached_content: Name of the cached context holding the file, or
+                None to send the file in front of the first user turn
+        """
+        history = list(self.history)
+        if not cached_content and history:
+            history[0] = types.Content(
+                role=history[0].role,
+                parts=[types.Part(text=self.context)] + list(history[0].parts or [])
+            )
+        return chats.create(
+            model=self.model, config=self.build_config(cached_content), history=history
+        )
+    
+    def turn_message(self, message: str, cached_content: Optional[str]) -> Union[str, List[str]]:
+        """The message to send for a turn; without a cached context the first turn carries the file."""
+        if not cached_content and not self.history:
+            return [self.context, message]
+        return message
+    
+    def record(self, history: List[types.Content]) -> None:
+        """Keep the history of a chat after a completed turn, trimmed to the token budget."""
+        history = list(history)
+        # The file is kept out of the history; create_chat puts it back when needed
+        if history and history[0].parts and history[0].parts[0].text == self.context:
+            history[0] = types.Content(role=history[0].role, parts=list(history[0].parts[1:]))
+        while len(history) > 2 and self._tokens(history) > self.max_history_tokens:
+            # Drop the oldest question and its answer together
+            del history[:2]
+            self.dropped_turns += 1
+            while history and history[0].role != "user":
+                del history[0]
+        self.history = history
+        self.turns += 1
+    
+    def history_tokens(self) -> int:
+        """Estimated tokens of the kept history."""
+        return self._tokens(self.history)
+    
+    def _tokens(self, history: List[types.Content]) -> int:
+        return sum(
+            self._estimate(part.text or "")
+            for content in history
+            for part in (content.parts or [])
+        )
+    
+    def _estimate(self, text: str) -> int:
+        return self.genai.context_builder.estimate_tokens(text, self.model)
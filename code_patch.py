@@ -0,0 +1,224 @@
+import re
+from typing import Optional, List, Tuple, Union
+
+# A line edit: replace original lines [start, end) with new lines
+LineEdit = Tuple[int, int, List[str]]
+
+# Hunk header; models often get the numbers wrong or leave them out
+HUNK_HEADER = re.compile(r"^@@(?:\s*-(\d+)(?:,(\d+))?)?(?:\s*\+\d+(?:,(\d+))?)?\s*(?:@@.*)?$")
+DIFF_FENCE = re.compile(r"```(?:diff|patch|udiff)?[ \t]*\n(.*?)```", re.DOTALL)
+
+PATCH_SYSTEM_INSTRUCTION = (
+    "You are a code editor. Reply with only a unified diff (as produced by `diff -u`) "
+    "against the code you are given: `--- a/code` and `+++ b/code` headers, then one "
+    "`@@ -start,count +start,count @@` hunk per change with 3 lines of unchanged context. "
+    "Copy context and removed lines exactly, including indentation. Do not repeat unchanged "
+    "code outside the hunks and do not add explanations. If nothing needs to change, reply "
+    "with an empty diff."
+)
+
+
+class Hunk:
+    """One hunk of a unified diff."""
+    
+    def __init__(self, old_start: Optional[int], old_count: Optional[int] = None,
+                 new_count: Optional[int] = None):
+        """Initialize the hunk.
+        
+        Args:
+            old_start: 1-based line number of the hunk in the original, if given
+            old_count: Number of original lines the header announces, if given
+            new_count: Number of new lines the header announces, if given;
+                counts left out are treated as unknown rather than as 1
+        """
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_count = new_count
+        self.old_lines = []  # context and removed lines
+        self.new_lines = []  # context and added lines
+    
+    def complete(self) -> bool:
+        """Whether the line counts announced by the header are used up."""
+        if self.old_count is None or self.new_count is None:
+            return False
+        return len(self.old_lines) >= self.old_count and len(self.new_lines) >= self.new_count
+
+
+def extract_diff(text: str) -> str:
+    """Get the diff from a model response, dropping surrounding code fences."""
+    blocks = DIFF_FENCE.findall(text)
+    if blocks:
+        return "\n".join(blocks)
+    return text
+
+
+def _header_number(match: "re.Match", group: int) -> Optional[int]:
+    """Get a number of a hunk header, or None if it was left out."""
+    value = match.group(group)
+    return int(value) if value is not None else None
+
+
+def _is_file_header(hunk: Hunk, line: str, following: List[str]) -> bool:
+    """Whether a line inside a hunk is a "--- "/"+++ " file header.
+    
+    Removed "-- comment" and added "++ x" lines look the same, so a header
+    is only recognised once the hunk's announced line counts are used up,
+    or, without counts, as a "--- " line directly followed by "+++ ".
+    """
+    if not line.startswith(("--- ", "+++ ")):
+        return False
+    if hunk.complete():
+        return True
+    if hunk.old_count is None or hunk.new_count is None:
+        return line.startswith("--- ") and bool(following) and following[0].startswith("+++ ")
+    return False
+
+
+def parse_unified_diff(text: str) -> List[Hunk]:
+    """Parse the hunks of a unified diff for a single file.
+    
+    File headers, "\\ No newline" markers and text outside hunks are ignored.
+    
+    Args:
+        text: Diff text, optionally wrapped in a code fence
+    
+    Returns:
+        List of hunks in order
+    """
+    hunks = []
+    current = None
+    lines = extract_diff(text).split("\n")
+    for index, line in enumerate(lines):
+        match = HUNK_HEADER.match(line)
+        if match:
+            current = Hunk(*(_header_number(match, group) for group in (1, 2, 3)))
+            hunks.append(current)
+        elif current is None or line.startswith("\\"):
+            continue
+        elif _is_file_header(current, line, lines[index + 1:index + 2]):
+            # Headers of the next file end the hunk
+            current = None
+        elif line.startswith("-"):
+            current.old_lines.append(line[1:])
+        elif line.startswith("+"):
+            current.new_lines.append(line[1:])
+        elif line.startswith(" ") or line == "":
+            # Models sometimes drop the leading space of empty context lines
+            current.old_lines.append(line[1:])
+            current.new_lines.append(line[1:])
+        else:
+            # Commentary after a hunk ends it
+            current = None
+    
+    # A trailing empty "context" line is usually the end of the response
+    for hunk in hunks:
+        while (hunk.old_lines and hunk.new_lines and hunk.old_lines[-1] == ""
+               and hunk.new_lines[-1] == ""):
+            hunk.old_lines.pop()
+            hunk.new_lines.pop()
+    return [hunk for hunk in hunks if hunk.old_lines or hunk.new_lines]
+
+
+def _find_block(lines: List[str], block: List[str], start: int, expected: int) -> Optional[int]:
+    """Find block in lines at or after start, closest to the expected index.
+    
+    Exact matches win; then matches ignoring trailing whitespace, then
+    ignoring all surrounding whitespace.
+    """
+    normalizers = [lambda s: s, lambda s: s.rstrip(), lambda s: s.strip()]
+    for normalize in normalizers:
+        wanted = [normalize(line) for line in block]
+        first = wanted[0]
+        candidates = [
+            index for index in range(start, len(lines) - len(block) + 1)
+            if normalize(lines[index]) == first
+            and [normalize(line) for line in lines[index:index + len(block)]] == wanted
+        ]
+        if candidates:
+            return min(candidates, key=lambda index: abs(index - expected))
+    return None
+
+
+def plan_patch(original: str, diff_text: str) -> Tuple[bool, Union[List[LineEdit], str]]:
+    """Validate a diff against the original and turn it into line edits.
+    
+    Hunks are located by their content, so wrong line numbers are tolerated;
+    a hunk whose context or removed lines can't be found is a conflict.
+    
+    Args:
+        original: The code the diff was made against
+        diff_text: Unified diff, e.g. a model response
+    
+    Returns:
+        Tuple of (success, edits_or_error); edits are (start, end, new_lines)
+        on the lines of original.split("\\n"), in order
+    """
+    if not extract_diff(diff_text).strip():
+        # An empty diff means nothing needs to change
+        return True, []
+    if "@@" not in diff_text:
+        return False, "Response is not a unified diff"
+    
+    lines = original.split("\n")
+    edits = []
+    cursor = 0
+    for number, hunk in enumerate(parse_unified_diff(diff_text), 1):
+        expected = (hunk.old_start - 1) if hunk.old_start else cursor
+        
+        if not hunk.old_lines:
+            # Pure insertion without context: "-N,0" inserts after line N
+            if hunk.old_start is None:
+                return False, f"Hunk {number} has no context to place it"
+            position = min(max(hunk.old_start, cursor), len(lines))
+            edits.append((position, position, hunk.new_lines))
+            cursor = position
+            continue
+        
+        position = _find_block(lines, hunk.old_lines, cursor, max(expected, cursor))
+        if position is None:
+            return False, f"Hunk {number} does not match the code (conflict)"
+        end = position + len(hunk.old_lines)
+        cursor = end
+        
+        # Keep only the changed lines, so edits touch as little as possible
+        new_lines = list(hunk.new_lines)
+        while position < end and new_lines and lines[position] == new_lines[0]:
+            position += 1
+            new_lines.pop(0)
+        while position < end and new_lines and lines[end - 1] == new_lines[-1]:
+            end -= 1
+            new_lines.pop()
+        if position < end or new_lines:
+            edits.append((position, end, new_lines))
+    return True, edits
+
+
+def apply_edits(original: str, edits: List[LineEdit]) -> str:
+    """Apply line edits produced by plan_patch to the original text."""
+    lines = original.split("\n")
+    for start, end, new_lines in reversed(edits):
+        lines[start:end] = new_lines
+    return "\n".join(lines)
+
+
+def apply_patch(original: str, diff_text: str) -> Tuple[bool, str]:
+    """Apply a unified diff to the original text.
+    
+    Args:
+        original: The code the diff was made against
+        diff_text: Unified diff, e.g. a model response
+    
+    Returns:
+        Tuple of (success, patched_text_or_error)
+    """
+    success, edits = plan_patch(original, diff_text)
+    if not success:
+        return False, edits
+    return True, apply_edits(original, edits)
+
+
+def edit_stats(edits: List[LineEdit]) -> Tuple[int, int]:
+    """Count the (added, removed) lines of a list of line edits."""
+    added = sum(len(new_lines) for _, _, new_lines in edits)
+    removed = sum(end - start for start, end, _ in edits)
+    return added, removed
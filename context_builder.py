@@ -0,0 +1,344 @@
+import os
+import re
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple, Any, Iterable
+
+from sandbox_manager import BINARY_EXTENSIONS
+
+# Words ignored when ranking files against an instruction
+STOPWORDS = {
+    "the", "and", "for", "with", "this", "that", "these", "those", "from", "into",
+    "please", "file", "files", "code", "what", "how", "all", "each", "any", "are",
+    "can", "you", "make", "should", "would", "could", "about", "them", "its", "use"
+}
+
+# Lines kept when a file is reduced to an outline
+OUTLINE_PATTERN = re.compile(
+    r"^\s*(def |class |async def |function |export |import |from \S+ import |#{1,6} |"
+    r"(pub )?(fn|struct|enum|trait|impl|mod) |\[[\w.-]+\]\s*$)"
+)
+
+
+class BuiltContext:
+    """Result of ContextBuilder.build."""
+    
+    def __init__(self, text: str, tokens: int, budget: int, included: List[str],
+                 truncated: List[str], summarized: List[str], omitted: List[str]):
+        self.text = text
+        self.tokens = tokens
+        self.budget = budget
+        self.included = included
+        self.truncated = truncated
+        self.summarized = summarized
+        self.omitted = omitted
+    
+    def describe(self) -> str:
+        """Short human-readable summary of what made it into the context."""
+        parts = [f"{len(self.included)} full"]
+        if self.truncated:
+            parts.append(f"{len(self.truncated)} truncated")
+        if self.summarized:
+            parts.append(f"{len(self.summarized)} summarized")
+        if self.omitted:
+            parts.append(f"{len(self.omitted)} omitted")
+        return f"{', '.join(parts)} (~{self.tokens}/{self.budget} tokens)"
+
+
+class ContextBuilder:
+    """Builds token-budgeted prompt context from a set of files.
+    
+    Files are ranked by relevance to the instruction and packed into a
+    per-model token budget: the most relevant files are included whole, the
+    rest are reduced to an outline or a truncated excerpt, and anything that
+    still doesn't fit is listed by name only.
+    """
+    
+    # Input token budgets by model name prefix (first match wins)
+    DEFAULT_BUDGETS = [
+        ("gemini-1.0", 24000),
+        ("gemma", 96000),
+        ("gemini", 200000),
+    ]
+    DEFAULT_BUDGET = 24000
+    
+    # Smallest excerpt worth including for a file that doesn't fit whole
+    MIN_EXCERPT_TOKENS = 256
+    
+    def __init__(self, client=None, budgets: Optional[List[Tuple[str, int]]] = None,
+                 chars_per_token: float = 4.0):
+        """Initialize the context builder.
+        
+        Args:
+            client: Optional genai.Client used for exact token counts
+            budgets: Optional list of (model_prefix, token_budget) overriding the defaults
+            chars_per_token: Initial characters-per-token ratio for local estimates
+        """
+        self.client = client
+        self.budgets = list(budgets) if budgets is not None else list(self.DEFAULT_BUDGETS)
+        self.default_chars_per_token = chars_per_token
+        
+        self._lock = threading.Lock()
+        self._ratios = {}  # model -> calibrated chars per token
+        self._counts = OrderedDict()  # (model, sha256) -> exact token count
+        self._max_cached_counts = 2048
+    
+    def get_budget(self, model: str) -> int:
+        """Get the input token budget for a model."""
+        name = model.lower().split("/")[-1]
+        for prefix, budget in self.budgets:
+            if name.startswith(prefix):
+                return budget
+        return self.DEFAULT_BUDGET
+    
+    def set_budget(self, model_prefix: str, budget: int) -> None:
+        """Set the token budget for models whose name starts with model_prefix."""
+        self.budgets = [(p, b) for p, b in self.budgets if p != model_prefix]
+        self.budgets.insert(0, (model_prefix, budget))
+    
+    def estimate_tokens(self, text: str, model: Optional[str] = None) -> int:
+        """Estimate tokens locally using the (calibrated) chars-per-token ratio."""
+        ratio = self._ratios.get(model, self.default_chars_per_token)
+        return int(math.ceil(len(text) / ratio))
+    
+    def count_tokens(self, text: str, model: str) -> int:
+        """Count tokens with the SDK, caching results by content hash.
+        
+        Falls back to the local estimate when no client is configured or
+        the request fails. Successful counts recalibrate the local ratio.
+        
+        Args:
+            text: Text to count
+            model: Model whose tokenizer to use
+        
+        Returns:
+            Number of tokens
+        """
+        key = (model, hashlib.sha256(text.encode("utf-8")).hexdigest())
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        
+        if self.client is None or not text:
+            return self.estimate_tokens(text, model)
+        
+        try:
+            response = self.client.models.count_tokens(model=model, contents=text)
+            tokens = int(response.total_tokens)
+        except Exception:
+            return self.estimate_tokens(text, model)
+        
+        with self._lock:
+            self._counts[key] = tokens
+            while len(self._counts) > self._max_cached_counts:
+                self._counts.popitem(last=False)
+            if tokens > 0:
+                self._ratios[model] = max(1.0, len(text) / tokens)
+        return tokens
+    
+    def calibrate(self, model: str, sample: str, max_chars: int = 20000) -> None:
+        """Calibrate the local estimate for a model with one SDK count, if not done yet."""
+        if self.client is None or model in self._ratios or not sample:
+            return
+        self.count_tokens(sample[:max_chars], model)
+    
+    @staticmethod
+    def sample(texts: Iterable[str], max_chars: int = 20000) -> str:
+        """Join texts into a calibration sample, stopping once max_chars are collected."""
+        parts = []
+        size = 0
+        for text in texts:
+            parts.append(text[:max_chars - size])
+            size += len(parts[-1]) + 1
+            if size >= max_chars:
+                break
+        return "\n".join(parts)
+    
+    @staticmethod
+    def is_binary(filename: str, content: Any) -> bool:
+        """Check whether a file should be skipped as binary."""
+        if isinstance(content, (bytes, bytearray)):
+            return True
+        _, ext = os.path.splitext(filename)
+        if ext.lower() in BINARY_EXTENSIONS:
+            return True
+        return "\x00" in content[:4096]
+    
+    @staticmethod
+    def _terms(text: str) -> List[str]:
+        """Split an instruction into lowercase search terms."""
+        words = re.findall(r"[a-zA-Z_][a-zA-Z0-9_]{2,}", text.lower())
+        return [w for w in words if w not in STOPWORDS]
+    
+    def rank_files(self, files: Dict[str, str], instruction: str) -> List[str]:
+        """Order filenames by relevance to the instruction, most relevant first."""
+        terms = set(self._terms(instruction))
+        instruction_lower = instruction.lower()
+        scores = {}
+        for index, (filename, content) in enumerate(files.items()):
+            name_lower = filename.lower()
+            stem = os.path.splitext(os.path.basename(name_lower))[0]
+            score = 0.0
+            # Explicit mentions of the file are the strongest signal
+            if name_lower in instruction_lower or (len(stem) > 2 and stem in terms):
+                score += 100.0
+            content_lower = content.lower()
+            for term in terms:
+                if term in name_lower:
+                    score += 5.0
+                occurrences = content_lower.count(term)
+                if occurrences:
+                    score += 1.0 + math.log(occurrences)
+            # Prefer smaller files on ties; keep original order as the last resort
+            scores[filename] = (-score, len(content), index)
+        return sorted(files, key=lambda name: scores[name])
+    
+    @staticmethod
+    def outline(content: str, max_lines: int = 80) -> str:
+        """Reduce a file to its structural lines (definitions, imports, headings)."""
+        lines = [line.rstrip() for line in content.splitlines() if OUTLINE_PATTERN.match(line)]
+        if len(lines) > max_lines:
+            lines = lines[:max_lines] + [f"... ({len(lines) - max_lines} more definitions)"]
+        return "\n".join(lines)
+    
+    def excerpt(self, content: str, max_tokens: int, model: Optional[str] = None) -> str:
+        """Keep the head and tail of a file within max_tokens."""
+        ratio = self._ratios.get(model, self.default_chars_per_token)
+        max_chars = int(max_tokens * ratio)
+        if len(content) <= max_chars:
+            return content
+        head_chars = int(max_chars * 0.7)
+        tail_chars = max_chars - head_chars
+        head = content[:head_chars]
+        tail = content[-tail_chars:] if tail_chars > 0 else ""
+        # Cut at line boundaries
+        head = head[:head.rfind("\n") + 1] or head
+        tail = tail[tail.find("\n") + 1:] or tail
+        skipped = content.count("\n", len(head), len(content) - len(tail))
+        return f"{head}... [{skipped} lines truncated] ...\n{tail}"
+    
+    def _share_budget(self, budget: int, filenames: List[str], costs: Dict[str, int]) -> Dict[str, int]:
+        """Split a token budget across files in proportion to their full size.
+        
+        Files are dropped least relevant first until every remaining share is
+        at least MIN_EXCERPT_TOKENS, so one large file can't take the whole
+        budget and the others aren't cut to useless slivers.
+        
+        Args:
+            budget: Tokens to share
+            filenames: Files in order of relevance
+            costs: Full token cost of each file
+        
+        Returns:
+            Dictionary of {filename: token share} for the files that get an excerpt
+        """
+        candidates = list(filenames)
+        while candidates:
+            total = sum(costs[name] for name in candidates)
+            shares = {name: budget * costs[name] // total for name in candidates}
+            if min(shares.values()) >= self.MIN_EXCERPT_TOKENS:
+                return shares
+            candidates.pop()
+        return {}
+    
+    def build(self, files: Dict[str, str], instruction: str, model: str,
+              heading_format: str = "File: {filename}", reserved_tokens: Optional[int] = None,
+              budget: Optional[int] = None, calibrate: bool = False) -> BuiltContext:
+        """Build the file context for a prompt within the model's token budget.
+        
+        Args:
+            files: Dictionary of {filename: content}; binary files are skipped
+            instruction: The user instruction, used for ranking
+            model: Target model, used for the budget and token counting
+            heading_format: Heading printed above each file
+            reserved_tokens: Tokens kept free for the instruction and response
+                framing, defaults to the instruction size plus a margin
+            budget: Optional explicit token budget overriding the per-model one
+            calibrate: Calibrate the token estimate with one SDK call first
+        
+        Returns:
+            BuiltContext with the joined text and what was included
+        """
+        text_files = {
+            name: content for name, content in files.items()
+            if not self.is_binary(name, content)
+        }
+        skipped_binary = [name for name in files if name not in text_files]
+        
+        if calibrate and text_files:
+            self.calibrate(model, self.sample(text_files.values()))
+        
+        total_budget = budget or self.get_budget(model)
+        if reserved_tokens is None:
+            reserved_tokens = self.estimate_tokens(instruction, model) + 512
+        remaining = max(0, total_budget - reserved_tokens)
+        
+        ranked = self.rank_files(text_files, instruction)
+        sections = {}
+        included, truncated, summarized, omitted = [], [], [], []
+        
+        def section(filename, body, note=""):
+            heading = heading_format.format(filename=filename) + note
+            return f"{heading}\n```\n{body}\n```\n\n"
+        
+        # First pass: whole files in order of relevance
+        deferred = []
+        full_costs = {}
+        for filename in ranked:
+            block = section(filename, text_files[filename])
+            cost = self.estimate_tokens(block, model)
+            if cost <= remaining:
+                sections[filename] = block
+                included.append(filename)
+                remaining -= cost
+            else:
+                deferred.append(filename)
+                full_costs[filename] = cost
+        
+        # Second pass: the rest as excerpts sharing the room that's left, or outlines
+        shares = self._share_budget(remaining, deferred, full_costs)
+        for filename in deferred:
+            content = text_files[filename]
+            share = min(shares.get(filename, 0), remaining)
+            if share >= self.MIN_EXCERPT_TOKENS:
+                overhead = self.estimate_tokens(section(filename, "", " (truncated)"), model)
+                block = section(
+                    filename,
+                    self.excerpt(content, share - overhead - 16, model),
+                    " (truncated)"
+                )
+                cost = self.estimate_tokens(block, model)
+                if cost <= remaining:
+                    sections[filename] = block
+                    truncated.append(filename)
+                    remaining -= cost
+                    continue
+            outline = self.outline(content)
+            if outline:
+                block = section(filename, outline, " (outline only)")
+                cost = self.estimate_tokens(block, model)
+                if cost <= remaining:
+                    sections[filename] = block
+                    summarized.append(filename)
+                    remaining -= cost
+                    continue
+            omitted.append(filename)
+        
+        parts = [sections[name] for name in ranked if name in sections]
+        if omitted or skipped_binary:
+            listed = omitted + [f"{name} (binary)" for name in skipped_binary]
+            parts.append("Other files not shown: " + ", ".join(listed) + "\n\n")
+        
+        text = "".join(parts)
+        return BuiltContext(
+            text=text,
+            tokens=self.estimate_tokens(text, model),
+            budget=total_budget,
+            included=included,
+            truncated=truncated,
+            summarized=summarized,
+            omitted=omitted + skipped_binary
+        )
@@ -0,0 +1,202 @@
+import time
+import hashlib
+import threading
+from typing import Optional, Dict, Iterable, Any, Callable
+
+from google.genai import types, errors
+
+from single_flight import SingleFlight
+
+# Lifetime of a provider-side cached context, renewed by creating it again
+CONTEXT_CACHE_TTL = 600
+
+# Cached contexts are not used this close to their expiry
+EXPIRY_MARGIN = 30
+
+# The provider only caches prefixes above a minimum size; smaller contexts
+# are cheap enough to send inline
+CONTEXT_CACHE_MIN_TOKENS = 4096
+
+# Status codes of the provider's "caching is not supported" answers
+UNSUPPORTED_STATUS_CODES = {400, 404}
+
+
+class _Entry:
+    """A context registered with the provider."""
+    
+    def __init__(self, name: str, model: str, expires_at: float, sources: Iterable[str]):
+        self.name = name
+        self.model = model
+        self.expires_at = expires_at
+        self.sources = set(sources)
+
+
+class ContextCache:
+    """Registers large, stable prompt prefixes as provider-side cached content.
+    
+    A prefix (system instruction plus file contents) is uploaded once per
+    model, keyed by a hash of its content, and referenced by name in later
+    requests until its TTL expires, so follow-up questions about the same
+    file don't pay for its tokens again. Entries remember the files they
+    were built from; invalidate_file() drops them when a file changes.
+    
+    get() blocks while a context is created; async callers run it with
+    asyncio.to_thread.
+    """
+    
+    def __init__(self, client, ttl: int = CONTEXT_CACHE_TTL, min_tokens: int = CONTEXT_CACHE_MIN_TOKENS,
+                 limited_call: Optional[Callable[[str, int, Callable[[], Any]], Any]] = None):
+        """Initialize the cache.
+        
+        Args:
+            client: The google.genai client
+            ttl: Lifetime of a cached context in seconds
+            min_tokens: Smallest context (in estimated tokens) worth caching
+            limited_call: Optional limited_call(model, tokens, request) running the
+                create request under the rate limiter, scheduler and retry policy
+        """
+        self.client = client
+        self.limited_call = limited_call
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> _Entry
+        self._unsupported = set()  # models that rejected context caching
+        self._single_flight = SingleFlight()
+        self._stats = {"created": 0, "hits": 0}
+    
+    @staticmethod
+    def make_key(model: str, system_instruction: Optional[str], context: str) -> str:
+        """Build the cache key for a context and the system instruction sent with it."""
+        digest = hashlib.sha256()
+        for part in (model, system_instruction or "", context):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def _usable(self, model: str, tokens: int) -> bool:
+        return self.enabled and tokens >= self.min_tokens and model not in self._unsupported
+    
+    def _lookup(self, key: str) -> Optional[str]:
+        """Get the name of a live cached context (lock held)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at - EXPIRY_MARGIN < time.time():
+            del self._entries[key]
+            return None
+        self._stats["hits"] += 1
+        return entry.name
+    
+    def _create_config(self, system_instruction: Optional[str], context: str) -> types.CreateCachedContentConfig:
+        return types.CreateCachedContentConfig(
+            system_instruction=system_instruction or None,
+            contents=[types.Content(role="user", parts=[types.Part(text=context)])],
+            ttl=f"{self.ttl}s",
+            display_name="sandbox-ide-context"
+        )
+    
+    def _register(self, key: str, model: str, name: str, sources: Iterable[str]) -> str:
+        with self._lock:
+            self._entries[key] = _Entry(name, model, time.time() + self.ttl, sources)
+            self._stats["created"] += 1
+        return name
+    
+    @staticmethod
+    def is_unsupported(error: Exception) -> bool:
+        """Check whether an error says the model (or account) doesn't support context caching."""
+        if not isinstance(error, errors.ClientError) or error.code not in UNSUPPORTED_STATUS_CODES:
+            return False
+        message = str(error).lower()
+        return "cach" in message and any(
+            phrase in message for phrase in ("not supported", "unsupported", "does not support", "not found")
+        )
+    
+    def _failed(self, model: str, error: Exception) -> None:
+        # Only a "not supported" answer stops caching for this model; rate
+        # limits, quota and server errors are retried with the next request
+        if self.is_unsupported(error):
+            self._unsupported.add(model)
+        print(f"Context caching unavailable for {model}: {error}")
+    
+    def get(self, model: str, system_instruction: Optional[str], context: str, tokens: int,
+            sources: Iterable[str] = ()) -> Optional[str]:
+        """Get the cached content name for a context, registering it if needed.
+        
+        Args:
+            model: Model the context is used with
+            system_instruction: System instruction stored with the context
+            context: The large, stable part of the prompt
+            tokens: Estimated tokens of the context
+            sources: Files the context was built from, for invalidation
+        
+        Returns:
+            Cached content name, or None if the context should be sent inline
+        """
+        if not self._usable(model, tokens):
+            return None
+        key = self.make_key(model, system_instruction, context)
+        with self._lock:
+            name = self._lookup(key)
+        if name:
+            return name
+        
+        def request():
+            return self.client.caches.create(
+                model=model, config=self._create_config(system_instruction, context)
+            )
+        
+        def create():
+            # Creating a context is charged for its tokens like any other request
+            if self.limited_call:
+                cached = self.limited_call(model, tokens, request)
+            else:
+                cached = request()
+            return self._register(key, model, cached.name, sources)
+        
+        try:
+            return self._single_flight.do(key, create)
+        except Exception as e:
+            self._failed(model, e)
+            return None
+    
+    def invalidate_file(self, filename: str) -> int:
+        """Drop the cached contexts built from a file, e.g. after it was written.
+        
+        Returns:
+            Number of contexts dropped
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if filename in entry.sources]
+            names = [self._entries.pop(key).name for key in stale]
+        self._delete_remote(names)
+        return len(names)
+    
+    def clear(self) -> None:
+        """Drop every cached context."""
+        with self._lock:
+            names = [entry.name for entry in self._entries.values()]
+            self._entries.clear()
+        self._delete_remote(names)
+    
+    def _delete_remote(self, names) -> None:
+        """Delete cached contexts from the provider in the background; they expire anyway."""
+        if not names:
+            return
+        
+        def delete():
+            for name in names:
+                try:
+                    self.client.caches.delete(name=name)
+                except Exception as e:
+                    print(f"Error deleting cached context {name}: {e}")
+        
+        threading.Thread(target=delete, name="context-cache-delete", daemon=True).start()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of live, created and reused cached contexts."""
+        with self._lock:
+            now = time.time()
+            live = sum(1 for entry in self._entries.values() if entry.expires_at > now)
+            return {"live": live, **self._stats}
@@ -0,0 +1,175 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Optional, Dict, List, Tuple
+
+
+class EmbeddingCache:
+    """Persistent cache of embedding vectors keyed by (model, sha256(text)).
+    
+    Vectors are packed as float32 blobs in SQLite and evicted least recently
+    used first once the cache grows past its size limit.
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 128 * 1024 * 1024):
+        """Initialize the cache.
+        
+        Args:
+            cache_dir: Directory for the database file, or None for memory only
+            max_bytes: Size limit of the stored vectors
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        
+        path = ":memory:"
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                path = os.path.join(cache_dir, "embeddings.sqlite3")
+            except OSError as e:
+                print(f"Embedding cache using memory only: {e}")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "size INTEGER NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (model, text_hash))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed_at)"
+        )
+        self._db.commit()
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Hash a text for use as a cache key."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def pack(vector: List[float]) -> bytes:
+        """Pack a vector as float32 bytes."""
+        return array("f", vector).tobytes()
+    
+    @staticmethod
+    def unpack(blob: bytes) -> List[float]:
+        """Unpack float32 bytes into a list of floats."""
+        vector = array("f")
+        vector.frombytes(blob)
+        return vector.tolist()
+    
+    def get_many(self, model: str, text_hashes: List[str]) -> Dict[str, List[float]]:
+        """Look up vectors for several texts at once.
+        
+        Args:
+            model: Embedding model name
+            text_hashes: Hashes produced by text_hash
+        
+        Returns:
+            Dictionary of {text_hash: vector} for the hashes that were found
+        """
+        found = {}
+        unique = list(dict.fromkeys(text_hashes))
+        with self._lock:
+            try:
+                # Stay well under SQLite's bound-parameter limit
+                for start in range(0, len(unique), 500):
+                    batch = unique[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT text_hash, vector FROM embeddings "
+                        f"WHERE model = ? AND text_hash IN ({placeholders})",
+                        [model] + batch
+                    ).fetchall()
+                    for text_hash, blob in rows:
+                        found[text_hash] = self.unpack(blob)
+                
+                if found:
+                    now = time.time()
+                    self._db.executemany(
+                        "UPDATE embeddings SET accessed_at = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model, text_hash) for text_hash in found]
+                    )
+                    self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache read error: {e}")
+            
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(unique) - len(found)
+        return found
+    
+    def put_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        """Store vectors for several texts.
+        
+        Args:
+            model: Embedding model name
+            vectors: Dictionary of {text_hash: vector}
+        """
+        now = time.time()
+        rows = []
+        for text_hash, vector in vectors.items():
+            blob = self.pack(vector)
+            rows.append((model, text_hash, blob, len(blob), now))
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache write error: {e}")
+    
+    def clear(self) -> None:
+        """Remove all vectors and reset the counters."""
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
+            try:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache clear error: {e}")
+    
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and the stored size.
+        
+        Returns:
+            Dictionary of statistics
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"], stats["bytes"] = self._usage()
+            return stats
+    
+    def _usage(self) -> Tuple[int, int]:
+        """Return (entry_count, total_bytes) of the stored vectors."""
+        try:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+            return count, total
+        except sqlite3.Error:
+            return 0, 0
+    
+    def _evict(self) -> None:
+        """Drop least recently used vectors until under the size limit."""
+        _, total = self._usage()
+        if total <= self.max_bytes:
+            return
+        
+        rows = self._db.execute(
+            "SELECT model, text_hash, size FROM embeddings ORDER BY accessed_at ASC"
+        ).fetchall()
+        for model, text_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute(
+                "DELETE FROM embeddings WHERE model = ? AND text_hash = ?", (model, text_hash)
+            )
+            total -= size
+            self._stats["evictions"] += 1
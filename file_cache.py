@@ -0,0 +1,84 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple, Union
+
+# Identity of a file's content as seen by stat: (st_mtime_ns, st_size)
+Signature = Tuple[int, int]
+
+
+class FileContentCache:
+    """Bounded LRU cache of decoded file contents.
+    
+    Entries are keyed by sandbox path and read mode and validated against
+    the file's (st_mtime_ns, st_size) on every lookup, so a file changed
+    by another program is read again. Writes through the SandboxManager
+    drop the entry right away. Sizes are the in-memory size of the cached
+    str or bytes object, so non-ASCII text counts at its decoded size.
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 8 * 1024 * 1024):
+        """Initialize the cache.
+        
+        Args:
+            max_bytes: Total size limit of the cached objects in memory
+            max_entry_bytes: Contents larger than this in memory are not cached
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (path, binary) -> (signature, content, size)
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+    
+    def get(self, path: str, binary: bool, signature: Signature) -> Optional[Union[str, bytes]]:
+        """Get the cached content of a file if it still has this signature."""
+        key = (path, binary)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                if entry is not None:
+                    self._drop(key)
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+    
+    def put(self, path: str, binary: bool, signature: Signature, content: Union[str, bytes]) -> None:
+        """Store the content read for a signature, evicting least recently used files."""
+        size = sys.getsizeof(content)
+        if size > self.max_entry_bytes:
+            return
+        key = (path, binary)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (signature, content, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+    
+    def invalidate(self, path: str) -> None:
+        """Drop the cached contents of a file."""
+        with self._lock:
+            for binary in (False, True):
+                if (path, binary) in self._entries:
+                    self._drop((path, binary))
+    
+    def clear(self) -> None:
+        """Drop every cached file."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss/eviction counters and the cache size."""
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes}
+    
+    def _drop(self, key) -> None:
+        """Remove an entry (lock held)."""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,194 @@
+import re
+import json
+from typing import Optional, Dict, List
+
+# Response schema for generate_files: a JSON array of file objects. A plain
+# dict is accepted by the SDK for GenerateContentConfig.response_schema.
+FILES_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "filename": {"type": "STRING", "description": "Path of the file relative to the project root"},
+            "language": {"type": "STRING", "description": "Programming language or file type"},
+            "content": {"type": "STRING", "description": "The complete file content"},
+        },
+        "required": ["filename", "content"],
+    },
+}
+
+# Response schema for the planning call of generate_project: one entry per file
+MANIFEST_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "filename": {"type": "STRING", "description": "Path of the file relative to the project root"},
+            "purpose": {"type": "STRING", "description": "What the file is responsible for"},
+            "interfaces": {
+                "type": "STRING",
+                "description": "Functions, classes, exports or endpoints the file provides or uses"
+            },
+        },
+        "required": ["filename", "purpose"],
+    },
+}
+
+CODE_FENCE = re.compile(r"^\s*```[\w+.-]*[ \t]*\n(.*?)\n?```\s*$", re.DOTALL)
+
+
+class FileStreamParser:
+    """Incremental parser for a streamed JSON array of file objects.
+    
+    Text is fed in arbitrary chunks; every object of the array is decoded
+    and returned as soon as its closing brace arrives, so files can be
+    shown while later ones are still being generated. Braces and brackets
+    inside strings (e.g. in file content) are skipped while scanning.
+    """
+    
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # next character of the buffer to scan
+        self._stack = []  # open "[" / "{" containers
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None  # buffer index of the file object being read
+    
+    def feed(self, text: str) -> List[Dict[str, str]]:
+        """Add a chunk of the response.
+        
+        Args:
+            text: Next chunk of the JSON text
+        
+        Returns:
+            File objects completed by this chunk, as {"filename", "language", "content"}
+        
+        Raises:
+            ValueError: If a completed object is not valid JSON
+        """
+        self._buffer += text
+        files = []
+        buffer = self._buffer
+        for index in range(self._pos, len(buffer)):
+            char = buffer[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                # A file object is an object directly inside an array
+                if char == "{" and self._stack and self._stack[-1] == "[":
+                    self._object_start = index
+                self._stack.append(char)
+            elif char in "]}":
+                if not self._stack:
+                    raise ValueError(f"Unexpected '{char}' in JSON response")
+                self._stack.pop()
+                if char == "}" and self._stack and self._stack[-1] == "[" and self._object_start is not None:
+                    file = self._decode(buffer[self._object_start:index + 1])
+                    if file is not None:
+                        files.append(file)
+                    self._object_start = None
+        self._pos = len(buffer)
+        
+        # Drop the text already consumed, keeping only a partial object
+        keep = self._object_start if self._object_start is not None else self._pos
+        self._buffer = buffer[keep:]
+        self._pos -= keep
+        if self._object_start is not None:
+            self._object_start = 0
+        return files
+    
+    def close(self) -> None:
+        """Check that the response ended with a complete array.
+        
+        Raises:
+            ValueError: If the response was cut off
+        """
+        if self._stack or self._in_string:
+            raise ValueError("JSON response ended early (output may have been truncated)")
+    
+    def _decode(self, text: str) -> Optional[Dict[str, str]]:
+        """Decode one file object, ignoring objects without a filename."""
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid file object in JSON response: {e}")
+        filename = str(data.get("filename") or "").strip()
+        if not filename:
+            return None
+        return {
+            "filename": filename,
+            "language": str(data.get("language") or ""),
+            "content": str(data.get("content") or ""),
+        }
+
+
+def parse_manifest(text: str) -> List[Dict[str, str]]:
+    """Parse a JSON project manifest into a list of {"filename", "purpose", "interfaces"}.
+    
+    Entries without a filename and repeated filenames are dropped.
+    
+    Raises:
+        ValueError: If the text is not a JSON array
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if isinstance(data, dict):
+        # Tolerate {"files": [...]}
+        data = next((value for value in data.values() if isinstance(value, list)), None)
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of files")
+    
+    manifest = []
+    seen = set()
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        filename = str(item.get("filename") or "").strip()
+        if not filename or filename in seen:
+            continue
+        seen.add(filename)
+        manifest.append({
+            "filename": filename,
+            "purpose": str(item.get("purpose") or ""),
+            "interfaces": str(item.get("interfaces") or ""),
+        })
+    return manifest
+
+
+def format_manifest(manifest: List[Dict[str, str]]) -> str:
+    """Render a manifest as the plain-text plan shared by every file request."""
+    lines = []
+    for entry in manifest:
+        lines.append(f"- {entry['filename']}: {entry['purpose']}")
+        if entry.get("interfaces"):
+            lines.append(f"  Interfaces: {entry['interfaces']}")
+    return "\n".join(lines)
+
+
+def strip_code_fence(text: str) -> str:
+    """Remove a code fence wrapped around the whole text, if present."""
+    match = CODE_FENCE.match(text)
+    if match:
+        return match.group(1)
+    return text
+
+
+def parse_files_json(text: str) -> Dict[str, str]:
+    """Parse a complete JSON files response into {filename: content}.
+    
+    Raises:
+        ValueError: If the response is not a complete JSON array of files
+    """
+    parser = FileStreamParser()
+    files = parser.feed(text)
+    parser.close()
+    return {file["filename"]: file["content"] for file in files}
@@ -1,18 +1,79 @@
 import os
 import json
-from typing import Optional, Dict, Any, Tuple, List
+from typing import Optional, Dict, Any, Tuple, List, Iterator, Callable, TypeVar
 import base64
 import tempfile
 from PIL import Image
 import io
+import threading
+import time
+import itertools
+from contextlib import ExitStack, closing
 from google import genai
 from google.genai import types
 
+from response_cache import ResponseCache
+from context_builder import ContextBuilder
+from embedding_cache import EmbeddingCache
+from model_health import ModelHealth
+from model_router import ModelRouter
+from resilience import RetryPolicy, call_with_retry, hedged_call
+from rate_limiter import RateLimiter
+from single_flight import SingleFlight
+from scheduler import PriorityScheduler
+from context_cache import ContextCache
+from chat_session import ChatSession
+from code_patch import PATCH_SYSTEM_INSTRUCTION, apply_patch
+from file_stream import FILES_SCHEMA, FileStreamParser, parse_files_json, format_manifest
+
+T = TypeVar("T")
+
+# Maximum number of texts sent in one embedding request
+EMBEDDING_BATCH_SIZE = 100
+
+# Age (seconds) after which the cached model catalogue is refreshed at startup
+MODEL_CATALOG_TTL = 24 * 60 * 60
+
+# Hedging waits this long for the primary model until enough latencies are
+# recorded to use its p95 instead
+DEFAULT_HEDGE_DELAY = 8.0
+MIN_HEDGE_SAMPLES = 5
+
+
+class TextRequest:
+    """A text request resolved against the wrapper's settings.
+    
+    Built by GenAIWrapper._text_request and used by the sync and async
+    wrappers alike, so the system prompt default, model choice, cache keys
+    and token estimate are worked out in one place.
+    """
+    
+    def __init__(self, prompt: str, full_prompt: str, system_instruction: Optional[str],
+                 context: Optional[str], sources: Optional[List[str]], model: str,
+                 response_schema: Optional[Dict[str, Any]], request_key: str,
+                 cache_key: Optional[str], tokens: int):
+        self.prompt = prompt
+        self.full_prompt = full_prompt  # context and prompt, as sent without a cached context
+        self.system_instruction = system_instruction
+        self.context = context  # large, stable prefix; may be sent as a cached context
+        self.sources = sources or []
+        self.model = model
+        self.response_schema = response_schema
+        self.request_key = request_key  # identity of the request, for single-flight
+        self.cache_key = cache_key  # response cache key, None when the cache is bypassed
+        self.tokens = tokens
+
+
 class GenAIWrapper:
     """Wrapper for Google's GenAI SDK."""
     
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the GenAI client."""
+    def __init__(self, api_key: Optional[str] = None, cache_dir: Optional[str] = None):
+        """Initialize the GenAI client.
+        
+        Args:
+            api_key: Google GenAI API key, defaults to GOOGLE_API_KEY
+            cache_dir: Directory for persistent caches, defaults to ~/.sandbox_ide_cache
+        """
         self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("API key is required. Set GOOGLE_API_KEY environment variable or provide directly.")
@@ -28,118 +89,189 @@ class GenAIWrapper:
             "top_k": 40
         }
         
-        # Initialize available models
+        # Response cache for repeated text requests
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".sandbox_ide_cache")
+        self.cache_enabled = True
+        self.response_cache = ResponseCache(self.cache_dir)
+        
+        # Persistent embedding vectors, keyed by (model, text hash)
+        self.embedding_cache = EmbeddingCache(self.cache_dir)
+        
+        # Availability and probe latency of each model
+        self.model_health = ModelHealth(self.cache_dir)
+        
+        # Token-budgeted file context for multi-file prompts
+        self.context_builder = ContextBuilder(self.client)
+        
+        # Large file contexts registered provider-side and reused until they expire
+        self.context_cache = ContextCache(self.client, limited_call=self._limited_call)
+        
+        # Optional per-request model routing; rules can be overridden in routing_rules.json
+        self.routing_enabled = False
+        self.router = ModelRouter(health_check=self.model_health.is_healthy)
+        self.router.load_rules(os.path.join(self.cache_dir, "routing_rules.json"))
+        
+        # Retries for transient errors, and optional hedging against a second model
+        self.retry_policy = RetryPolicy()
+        self.hedging_enabled = False
+        self.hedge_model = None  # None picks a healthy flash model
+        
+        # Client-side requests/tokens per minute limits shared by every entry point;
+        # limits can be overridden per model prefix in rate_limits.json
+        self.rate_limiter = RateLimiter()
+        self.rate_limiter.load_limits(os.path.join(self.cache_dir, "rate_limits.json"))
+        
+        # Concurrent identical requests share one underlying call
+        self.single_flight = SingleFlight()
+        
+        # Admits sync and async requests by priority class (interactive first)
+        self.scheduler = PriorityScheduler()
+        
+        # Async counterpart, created on first use
+        self._async_wrapper = None
+        self._async_lock = threading.Lock()
+        
+        # Initialize available models from the on-disk catalogue (or defaults)
+        # and refresh it in the background instead of blocking startup
         self.available_text_models = []
         self.available_image_models = []
         self.available_embedding_models = []  # New category for embedding models
-        self.fetch_available_models()
+        self.models_fetched_at = 0.0
+        self._model_listeners = []
+        self._models_lock = threading.Lock()
+        self._models_refresh_thread = None
+        if not self._load_model_catalog():
+            self._set_available_models([], [], [])
+        if time.time() - self.models_fetched_at > MODEL_CATALOG_TTL:
+            self.refresh_models_in_background()
+    
+    @property
+    def model_catalog_path(self) -> str:
+        """Path of the cached model catalogue."""
+        return os.path.join(self.cache_dir, "models.json")
+    
+    def _load_model_catalog(self) -> bool:
+        """Load the model lists from the catalogue file.
+        
+        Returns:
+            True if a catalogue was loaded, even a stale one
+        """
+        try:
+            with open(self.model_catalog_path, "r", encoding="utf-8") as f:
+                catalog = json.load(f)
+            self._set_available_models(
+                catalog.get("text", []),
+                catalog.get("image", []),
+                catalog.get("embedding", [])
+            )
+            self.models_fetched_at = float(catalog.get("fetched_at", 0))
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading model catalogue: {e}")
+            return False
+    
+    def _save_model_catalog(self) -> None:
+        """Write the current model lists to the catalogue file."""
+        catalog = {
+            "fetched_at": self.models_fetched_at,
+            "text": self.available_text_models,
+            "image": self.available_image_models,
+            "embedding": self.available_embedding_models
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = self.model_catalog_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(catalog, f, indent=2)
+            os.replace(temp_path, self.model_catalog_path)
+        except Exception as e:
+            print(f"Error saving model catalogue: {e}")
+    
+    def add_models_listener(self, callback: Callable[[], None]) -> None:
+        """Register a callback run when the available model lists change.
+        
+        The callback is invoked from the background refresh thread.
+        
+        Args:
+            callback: Function called without arguments
+        """
+        self._model_listeners.append(callback)
+    
+    def remove_models_listener(self, callback: Callable[[], None]) -> None:
+        """Unregister a callback added with add_models_listener."""
+        if callback in self._model_listeners:
+            self._model_listeners.remove(callback)
+    
+    def refresh_models_in_background(self) -> None:
+        """Fetch the model catalogue on a daemon thread, unless a refresh is running."""
+        with self._models_lock:
+            if self._models_refresh_thread and self._models_refresh_thread.is_alive():
+                return
+            self._models_refresh_thread = threading.Thread(
+                target=self.fetch_available_models,
+                name="model-catalog-refresh",
+                daemon=True
+            )
+            self._models_refresh_thread.start()
     
     def fetch_available_models(self) -> Tuple[bool, str]:
-        """Fetch available models from the API.
+        """Fetch available models from the API and update the catalogue.
+        
+        Listeners registered with add_models_listener are notified if the
+        lists changed.
         
         Returns:
             Tuple of (success, message)
         """
         try:
             # Get all available models
-            all_models = self.client.list_models()
-            self.available_text_models = []
-            self.available_image_models = []
-            self.available_embedding_models = []  # New category for embedding models
-            
-            # Print available models for debugging
-            print("Available models from API:")
-            for model in all_models:
-                model_id = model.name
-                if 'gemini' in model_id.lower() and 'embedding' in model_id.lower():
-                    print(f"- {model_id} (Embedding model)")
-                    self.available_embedding_models.append(model_id)
-                elif 'gemini' in model_id.lower():
-                    print(f"- {model_id} (Text model)")
-                    self.available_text_models.append(model_id)
-                elif 'imagen' in model_id.lower():
-                    print(f"- {model_id} (Image model)")
-                    self.available_image_models.append(model_id)
-                elif 'gemma' in model_id.lower():
-                    print(f"- {model_id} (Other model)")
-                    self.available_text_models.append(model_id)
-                elif 'embedding' in model_id.lower():
-                    print(f"- {model_id} (Embedding model)")
-                    self.available_embedding_models.append(model_id)
-                else:
-                    print(f"- {model_id} (Other)")
-            
-            # Default embedding models
-            if not self.available_embedding_models:
-                self.available_embedding_models = [
-                    "gemini-embedding-exp-03-07",  # Experimental Gemini-based embeddings
-                    "text-embedding-004"           # Standard text embeddings
-                ]
-            
-            # If no models were found, add these safe defaults including newer models
-            if not self.available_text_models:
-                self.available_text_models = [
-                    "gemini-2.5-pro-preview-03-25",     # Newest Gemini 2.5 Pro (billing enabled)
-                    "gemini-2.5-pro-exp-03-25",         # Experimental Gemini 2.5 Pro (free tier)
-                    "gemini-2.0-flash-001",             # Gemini 2.0 Flash
-                    "gemini-2.0-pro-001",               # Gemini 2.0 Pro
-                    "gemini-2.0-flash-lite",            # Gemini 2.0 Flash-Lite
-                    "gemini-1.5-flash-001",             # Gemini 1.5 Flash
-                    "gemini-1.5-pro-001",               # Gemini 1.5 Pro
-                    "gemma-3-27b-it",                   # Gemma 3 27B
-                    "gemini-1.0-pro-001"                # Gemini 1.0 Pro (legacy)
-                ]
-            
-            if not self.available_image_models:
-                self.available_image_models = [
-                    "imagen-3.0-generate-002",
-                    "gemini-2.0-flash-imagen"           # Experimental Gemini with image generation/editing
-                ]
-            
-            # Sort models from newest to oldest versions
-            def model_priority(model_name):
-                model_name = model_name.lower()
-                # Version-based priority
-                if '2.5' in model_name:
-                    base_priority = 0  # Highest priority
-                elif '2.0' in model_name:
-                    base_priority = 10
-                elif '1.5' in model_name:
-                    base_priority = 20
-                elif 'gemma-3' in model_name:
-                    base_priority = 5
-                elif '1.0' in model_name:
-                    base_priority = 30
-                else:
-                    base_priority = 40  # Lowest priority
-                
-                # Model type refinement
-                if 'pro' in model_name and 'preview' in model_name:
-                    return base_priority     # Pro preview gets highest within version
-                elif 'pro' in model_name and 'exp' in model_name:
-                    return base_priority + 1 # Experimental pro
-                elif 'pro' in model_name:
-                    return base_priority + 2 # Regular pro 
-                elif 'flash' in model_name and 'lite' in model_name:
-                    return base_priority + 4 # Flash lite
-                elif 'flash' in model_name:
-                    return base_priority + 3 # Flash
-                else:
-                    return base_priority + 5
-                
-            self.available_text_models.sort(key=model_priority)
+            model_names = [model.name for model in self.client.models.list()]
+        except Exception as e:
+            return False, f"Error fetching models: {e}"
             
-            # Ensure current models are in the available lists
-            if self.model not in self.available_text_models and self.available_text_models:
-                self.model = self.available_text_models[0]
-                
-            if self.image_model not in self.available_image_models and self.available_image_models:
-                self.image_model = self.available_image_models[0]
+        text_models, image_models, embedding_models = [], [], []
+        for model_id in model_names:
+            model_id = model_id.split("/")[-1]  # Drop the "models/" prefix
+            if 'gemini' in model_id.lower() and 'embedding' in model_id.lower():
+                embedding_models.append(model_id)
+            elif 'gemini' in model_id.lower():
+                text_models.append(model_id)
+            elif 'imagen' in model_id.lower():
+                image_models.append(model_id)
+            elif 'gemma' in model_id.lower():
+                text_models.append(model_id)
+            elif 'embedding' in model_id.lower():
+                embedding_models.append(model_id)
+            
+        previous = (self.available_text_models, self.available_image_models, self.available_embedding_models)
+        self._set_available_models(text_models, image_models, embedding_models)
+        self.models_fetched_at = time.time()
+        self._save_model_catalog()
+            
+        if previous != (self.available_text_models, self.available_image_models, self.available_embedding_models):
+            for callback in list(self._model_listeners):
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"Error in models listener: {e}")
+            
+        return True, f"Found {len(self.available_text_models)} text models, {len(self.available_image_models)} image models, and {len(self.available_embedding_models)} embedding models"
+            
+    def _set_available_models(self, text_models: List[str], image_models: List[str],
+                              embedding_models: List[str]) -> None:
+        """Set the model lists, filling in defaults and sorting text models newest first."""
+        # Default embedding models
+        if not embedding_models:
+            embedding_models = [
+                "gemini-embedding-exp-03-07",  # Experimental Gemini-based embeddings
+                "text-embedding-004"           # Standard text embeddings
+            ]
                 
-            return True, f"Found {len(self.available_text_models)} text models, {len(self.available_image_models)} image models, and {len(self.available_embedding_models)} embedding models"
-        except Exception as e:
-            # Use defaults on error including newer models
-            self.available_text_models = [
+        # If no models were found, add these safe defaults including newer models
+        if not text_models:
+            text_models = [
                 "gemini-2.5-pro-preview-03-25",     # Newest Gemini 2.5 Pro (billing enabled)
                 "gemini-2.5-pro-exp-03-25",         # Experimental Gemini 2.5 Pro (free tier)
                 "gemini-2.0-flash-001",             # Gemini 2.0 Flash
@@ -150,11 +282,55 @@ class GenAIWrapper:
                 "gemma-3-27b-it",                   # Gemma 3 27B
                 "gemini-1.0-pro-001"                # Gemini 1.0 Pro (legacy)
             ]
-            self.available_image_models = [
-                "imagen-3.0-generate-002", 
-                "gemini-2.0-flash-imagen"
+        
+        if not image_models:
+            image_models = [
+                "imagen-3.0-generate-002",
+                "gemini-2.0-flash-imagen"           # Experimental Gemini with image generation/editing
             ]
-            return False, f"Error fetching models: {e}"
+        
+        # Sort models from newest to oldest versions
+        def model_priority(model_name):
+            model_name = model_name.lower()
+            # Version-based priority
+            if '2.5' in model_name:
+                base_priority = 0  # Highest priority
+            elif '2.0' in model_name:
+                base_priority = 10
+            elif '1.5' in model_name:
+                base_priority = 20
+            elif 'gemma-3' in model_name:
+                base_priority = 5
+            elif '1.0' in model_name:
+                base_priority = 30
+            else:
+                base_priority = 40  # Lowest priority
+            
+            # Model type refinement
+            if 'pro' in model_name and 'preview' in model_name:
+                return base_priority     # Pro preview gets highest within version
+            elif 'pro' in model_name and 'exp' in model_name:
+                return base_priority + 1 # Experimental pro
+            elif 'pro' in model_name:
+                return base_priority + 2 # Regular pro 
+            elif 'flash' in model_name and 'lite' in model_name:
+                return base_priority + 4 # Flash lite
+            elif 'flash' in model_name:
+                return base_priority + 3 # Flash
+            else:
+                return base_priority + 5
+        
+        # Assign new lists rather than mutating, readers on other threads see a consistent list
+        self.available_text_models = sorted(text_models, key=model_priority)
+        self.available_image_models = list(image_models)
+        self.available_embedding_models = list(embedding_models)
+        
+        # Ensure current models are in the available lists
+        if self.model not in self.available_text_models and self.available_text_models:
+            self.model = self.available_text_models[0]
+            
+        if self.image_model not in self.available_image_models and self.available_image_models:
+            self.image_model = self.available_image_models[0]
     
     def test_model_availability(self, model_name: str) -> Tuple[bool, str]:
         """Test if a specific model is available and working.
@@ -167,20 +343,51 @@ class GenAIWrapper:
         """
         try:
             # Try a simple request to see if the model works
-            response = self.client.models.generate_content(
-                model=model_name,
-                contents="Hello",
-                config=types.GenerateContentConfig(
-                    temperature=0.1,
-                    max_output_tokens=10
+            with self.scheduler.slot():
+                self.rate_limiter.acquire(model_name, 1)
+                start = time.perf_counter()
+                response = self.client.models.generate_content(
+                    model=model_name,
+                    contents="Hello",
+                    config=self._probe_config()
                 )
-            )
+                latency = time.perf_counter() - start
             
             # If we get here, the model is available
+            self.model_health.record(model_name, True, latency)
             return True, f"Model {model_name} is available"
         except Exception as e:
+            self.model_health.record(model_name, False, None, str(e))
             return False, f"Model {model_name} is not available: {str(e)}"
     
+    def probe_models(self, models: Optional[List[str]] = None,
+                     timeout: float = 20.0) -> Dict[str, Dict[str, Any]]:
+        """Probe several models concurrently and record their health.
+        
+        Args:
+            models: Models to probe, defaults to all available text models
+            timeout: Per-probe timeout in seconds
+            
+        Returns:
+            Dictionary of {model: health_entry}
+        """
+        async_wrapper = self.get_async_wrapper()
+        # Each probe is bounded by its own timeout
+        return async_wrapper.run(async_wrapper.probe_models(models, timeout))
+    
+    def select_fastest_model(self) -> Tuple[bool, str]:
+        """Switch to the available text model with the lowest recent probe latency.
+        
+        Returns:
+            Tuple of (success, message)
+        """
+        fastest = self.model_health.fastest(self.available_text_models)
+        if not fastest:
+            return False, "No recently probed working model; run a health check first"
+        self.model = fastest
+        latency = self.model_health.get(fastest)["latency"]
+        return True, f"Using {fastest} ({latency * 1000:.0f} ms)"
+    
     def get_available_text_models(self) -> List[str]:
         """Get the list of available text models.
         
@@ -197,224 +404,789 @@ class GenAIWrapper:
         """
         return self.available_image_models
     
-    def ask_question(self, question: str, context: Optional[str] = None) -> Tuple[bool, str]:
-        """Ask a question to the model."""
-        try:
-            prompt = question
-            if context:
-                prompt = f"Context:\n{context}\n\nQuestion: {question}"
-            
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    temperature=self.generation_config["temperature"],
-                    max_output_tokens=self.generation_config["max_output_tokens"],
-                    top_p=self.generation_config["top_p"],
-                    top_k=self.generation_config["top_k"]
-                )
-            )
+    def get_async_wrapper(self):
+        """Get the shared AsyncGenAIWrapper, starting its background event loop on first use.
+        
+        Returns:
+            The AsyncGenAIWrapper bound to this wrapper
+        """
+        with self._async_lock:
+            if self._async_wrapper is None:
+                from async_genai_wrapper import AsyncGenAIWrapper
+                self._async_wrapper = AsyncGenAIWrapper(self)
+            return self._async_wrapper
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Get response cache hit/miss counts and sizes.
+        
+        Returns:
+            Dictionary of cache statistics
+        """
+        return self.response_cache.stats()
+    
+    def clear_cache(self) -> None:
+        """Remove all cached responses."""
+        self.response_cache.clear()
+    
+    def _build_config(self, system_instruction: Optional[str],
+                      response_schema: Optional[Dict[str, Any]] = None,
+                      cached_content: Optional[str] = None) -> types.GenerateContentConfig:
+        """Build the generation config for a text request.
+        
+        Args:
+            system_instruction: System instruction sent with the prompt
+            response_schema: Optional schema; the model then replies with matching JSON
+            cached_content: Optional cached context name; it already holds the system instruction
+        """
+        config = {
+            "temperature": self.generation_config["temperature"],
+            "max_output_tokens": self.generation_config["max_output_tokens"],
+            "top_p": self.generation_config["top_p"],
+            "top_k": self.generation_config["top_k"]
+        }
+        if cached_content:
+            config["cached_content"] = cached_content
+        else:
+            config["system_instruction"] = system_instruction
+        if response_schema is not None:
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = response_schema
+        return types.GenerateContentConfig(**config)
+    
+    @staticmethod
+    def _probe_config() -> types.GenerateContentConfig:
+        """Config of the tiny "Hello" request used to test a model."""
+        return types.GenerateContentConfig(
+            temperature=0.1,
+            max_output_tokens=10
+        )
+    
+    @staticmethod
+    def _image_config() -> types.GenerateImagesConfig:
+        """Config of an image generation request."""
+        return types.GenerateImagesConfig(
+            number_of_images=1,
+            output_mime_type='image/jpeg',
+            guidance_scale=9.0  # Higher values adhere more closely to prompt
+        )
+    
+    def embedding_model(self, model: Optional[str] = None) -> Optional[str]:
+        """Return the embedding model to use: the given one or the first available."""
+        if model:
+            return model
+        if self.available_embedding_models:
+            return self.available_embedding_models[0]
+        return None
+    
+    @staticmethod
+    def _full_prompt(prompt: str, context: Optional[str]) -> str:
+        """The prompt as sent without a cached context: the context first, then the prompt."""
+        return f"{context}\n\n{prompt}" if context else prompt
+    
+    def _text_request(self, prompt: str, system_instruction: Optional[str] = None,
+                      use_cache: bool = True, task: Optional[str] = None,
+                      response_schema: Optional[Dict[str, Any]] = None,
+                      context: Optional[str] = None, sources: Optional[List[str]] = None) -> TextRequest:
+        """Resolve a text request: system prompt default, model, cache keys and token estimate.
+        
+        Args:
+            prompt: The prompt to send
+            system_instruction: System instruction, defaults to the configured system prompt
+            use_cache: Set to False to bypass the response cache
+            task: Task name used for model routing
+            response_schema: Optional schema for a JSON response
+            context: Optional large, stable prefix (e.g. file contents)
+            sources: Files the context comes from
+        """
+        if system_instruction is None:
+            system_instruction = self.system_prompt
+        full_prompt = self._full_prompt(prompt, context)
+        model = self.select_model(task, full_prompt, system_instruction)
+        request_key = ResponseCache.make_key(
+            model, system_instruction, full_prompt, self.generation_config, response_schema
+        )
+        return TextRequest(
+            prompt, full_prompt, system_instruction, context, sources, model, response_schema,
+            request_key=request_key,
+            cache_key=request_key if use_cache and self.cache_enabled else None,
+            tokens=self.estimate_request_tokens(full_prompt, system_instruction)
+        )
+    
+    def _request_args(self, request: TextRequest, target_model: str,
+                      cached_context: Optional[str]) -> Dict[str, Any]:
+        """Keyword arguments of generate_content(_stream) for a request sent to target_model."""
+        # A cached context belongs to one model; a hedged fallback gets the full prompt
+        if target_model != request.model:
+            cached_context = None
+        return {
+            "model": target_model,
+            "contents": request.prompt if cached_context else request.full_prompt,
+            "config": self._build_config(request.system_instruction, request.response_schema, cached_context)
+        }
+    
+    def _cached_context(self, request: TextRequest) -> Tuple[Optional[str], int]:
+        """Get the provider-side cached context for a request, registering it if worthwhile.
+        
+        Args:
+            request: The request; its context and system instruction are cached together
+        
+        Returns:
+            Tuple of (cached_content_name_or_None, input tokens still sent with the request)
+        """
+        if not request.context:
+            return None, request.tokens
+        context_tokens = self.context_builder.estimate_tokens(request.context, request.model)
+        name = self.context_cache.get(
+            request.model, request.system_instruction, request.context, context_tokens, request.sources
+        )
+        if name:
+            return name, max(request.tokens - context_tokens, 0)
+        return None, request.tokens
+    
+    def select_model(self, task: Optional[str], prompt: str,
+                     system_instruction: Optional[str] = None) -> str:
+        """Choose the model for a request.
+        
+        Returns self.model unless routing is enabled, in which case the
+        router picks one from the task, the prompt size and recent latency.
+        
+        Args:
+            task: Task name, e.g. "explain" or "generate_files"
+            prompt: The prompt to send
+            system_instruction: System instruction sent with the prompt
             
-            return True, response.text
-        except Exception as e:
-            return False, f"Error in AI processing: {e}"
+        Returns:
+            Model name
+        """
+        if not self.routing_enabled:
+            return self.model
+        tokens = self.estimate_request_tokens(prompt, system_instruction)
+        return self.router.route(task, tokens, self.available_text_models, self.model)
     
-    def explain_code(self, code: str) -> Tuple[bool, str]:
-        """Have the model explain code."""
-        try:
-            prompt = f"Explain this code in detail, breaking down its functionality and purpose:\n\n```\n{code}\n```"
-            
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    temperature=self.generation_config["temperature"],
-                    max_output_tokens=self.generation_config["max_output_tokens"],
-                    top_p=self.generation_config["top_p"],
-                    top_k=self.generation_config["top_k"]
-                )
-            )
+    def estimate_request_tokens(self, prompt: str, system_instruction: Optional[str] = None) -> int:
+        """Estimate the input tokens of a text request without calling the API."""
+        tokens = self.context_builder.estimate_tokens(prompt, self.model)
+        if system_instruction:
+            tokens += self.context_builder.estimate_tokens(system_instruction, self.model)
+        return tokens
+    
+    def hedge_target(self, model: str) -> Optional[str]:
+        """Get the fallback model for hedging requests to `model`, or None if hedging is off."""
+        if not self.hedging_enabled:
+            return None
+        if self.hedge_model:
+            candidates = [self.hedge_model]
+        else:
+            candidates = [m for m in self.available_text_models if "flash" in m]
+        for candidate in candidates:
+            if candidate != model and self.model_health.is_healthy(candidate) is not False:
+                return candidate
+        return None
+    
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait for `model` before sending a hedged duplicate request."""
+        if self.router.sample_count(model) >= MIN_HEDGE_SAMPLES:
+            return self.router.percentile(model, 95)
+        return DEFAULT_HEDGE_DELAY
+    
+    def _limited_call(self, model: str, tokens: int, request: Callable[[], T]) -> T:
+        """Wait for a scheduler slot and the rate limiter, then run request() with retries.
+        
+        Every attempt takes its own slot, so backoff sleeps don't hold one, and
+        its own reservation, since retries count against quota too. Quota is
+        reserved only once the slot is granted, so queued background work
+        can't reserve it ahead of interactive requests.
+        
+        Args:
+            model: Model the request is sent to
+            tokens: Estimated input tokens, charged to the rate limiter
+            request: Function performing the SDK call
+        """
+        def limited():
+            with self.scheduler.slot():
+                self.rate_limiter.acquire(model, tokens)
+                return request()
+        return call_with_retry(limited, self.retry_policy)
+    
+    def _open_stream(self, model: str, tokens: int, open_stream: Callable[[], T]) -> Tuple[ExitStack, T]:
+        """Open a stream like _limited_call, returning it with the scheduler slot it holds.
+        
+        An attempt that fails gives its slot back before the backoff sleep.
+        The caller exits the returned ExitStack, releasing the slot, once the
+        stream is consumed or closed.
+        
+        Args:
+            model: Model the request is sent to
+            tokens: Estimated input tokens, charged to the rate limiter
+            open_stream: Function opening the stream
+        
+        Returns:
+            Tuple of (slot, open_stream() result)
+        """
+        def limited():
+            with ExitStack() as slot:
+                slot.enter_context(self.scheduler.slot())
+                self.rate_limiter.acquire(model, tokens)
+                stream = open_stream()
+                return slot.pop_all(), stream
+        return call_with_retry(limited, self.retry_policy)
+    
+    def _resilient_call(self, model: str, request: Callable[[str], T], tokens: int = 0) -> T:
+        """Run request(model) with rate limiting and retries, hedged against a fallback model when enabled.
+        
+        Args:
+            model: Primary model
+            request: Function performing the SDK call for a given model
+            tokens: Estimated input tokens, charged to the rate limiter
             
-            return True, response.text
-        except Exception as e:
-            return False, f"Error in AI processing: {e}"
+        Returns:
+            The first successful response
+        """
+        def attempt(target):
+            return lambda: self._limited_call(target, tokens, lambda: request(target))
+        
+        fallback = self.hedge_target(model)
+        if fallback is None:
+            return attempt(model)()
+        return hedged_call(attempt(model), attempt(fallback), self.hedge_delay(model))
     
-    def refactor_code(self, code: str, instruction: str) -> Tuple[bool, str]:
-        """Have the model refactor code according to instructions."""
+    def _generate_text(self, prompt: str, system_instruction: Optional[str] = None,
+                       use_cache: bool = True, task: Optional[str] = None,
+                       context: Optional[str] = None, sources: Optional[List[str]] = None,
+                       response_schema: Optional[Dict[str, Any]] = None) -> Tuple[bool, str]:
+        """Send a text request, answering from the response cache when possible.
+        
+        Args:
+            prompt: The prompt to send
+            system_instruction: System instruction, defaults to the configured system prompt
+            use_cache: Set to False to bypass the response cache for this call
+            task: Task name used for model routing
+            context: Optional large, stable prefix (e.g. file contents), sent from
+                the provider-side context cache when it is big enough
+            sources: Files the context comes from
+            response_schema: Optional schema for a JSON response
+        
+        Returns:
+            Tuple of (success, response_text_or_error)
+        """
         try:
-            prompt = (
-                f"Refactor this code according to the following instructions. "
-                f"Return only the refactored code, no explanations:\n\n"
-                f"Instructions: {instruction}\n\n"
-                f"Code:\n```\n{code}\n```"
-            )
+            request = self._text_request(prompt, system_instruction, use_cache, task, response_schema, context, sources)
+            if request.cache_key:
+                cached = self.response_cache.get(request.cache_key)
+                if cached is not None:
+                    return True, cached
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    temperature=self.generation_config["temperature"],
-                    max_output_tokens=self.generation_config["max_output_tokens"],
-                    top_p=self.generation_config["top_p"],
-                    top_k=self.generation_config["top_k"]
-                )
-            )
+            def send():
+                cached_context, tokens = self._cached_context(request)
             
-            return True, response.text
+                def call(target_model):
+                    start = time.perf_counter()
+                    response = self.client.models.generate_content(
+                        **self._request_args(request, target_model, cached_context)
+                    )
+                    self.router.record_latency(target_model, time.perf_counter() - start)
+                    return response
+                
+                text = self._resilient_call(request.model, call, tokens).text
+                if request.cache_key and text:
+                    self.response_cache.put(request.cache_key, text)
+                return text
+            
+            # A double-clicked button or menu + tab firing together share one request
+            text = self.single_flight.do(request.request_key, send)
+            return True, text
         except Exception as e:
             return False, f"Error in AI processing: {e}"
     
-    def generate_documentation(self, code: str) -> Tuple[bool, str]:
-        """Have the model generate documentation for code."""
-        try:
-            prompt = (
-                f"Generate comprehensive documentation for this code. "
-                f"Include docstrings, function/class descriptions, and parameter details:\n\n"
-                f"```\n{code}\n```"
-            )
+    def _stream_text(self, prompt: str, system_instruction: Optional[str] = None,
+                     use_cache: bool = True, task: Optional[str] = None,
+                     response_schema: Optional[Dict[str, Any]] = None,
+                     context: Optional[str] = None, sources: Optional[List[str]] = None) -> Iterator[str]:
+        """Stream a text request, yielding chunks as the model produces them.
+        
+        A cached response is yielded as a single chunk. The full response is
+        cached only if the stream is consumed to the end. Opening the stream
+        is retried on transient errors; once chunks flow it is not.
+        
+        Args:
+            prompt: The prompt to send
+            system_instruction: System instruction, defaults to the configured system prompt
+            use_cache: Set to False to bypass the response cache for this call
+            task: Task name used for model routing
+            response_schema: Optional schema for a JSON response
+            context: Optional large, stable prefix, see _generate_text
+            sources: Files the context comes from
+        
+        Yields:
+            Text chunks of the response
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    temperature=self.generation_config["temperature"],
-                    max_output_tokens=self.generation_config["max_output_tokens"],
-                    top_p=self.generation_config["top_p"],
-                    top_k=self.generation_config["top_k"]
-                )
-            )
+        Raises:
+            Exception: Errors from the SDK are propagated to the consumer
+        """
+        request = self._text_request(prompt, system_instruction, use_cache, task, response_schema, context, sources)
+        if request.cache_key:
+            cached = self.response_cache.get(request.cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        cached_context, tokens = self._cached_context(request)
+        
+        def open_stream():
+            # Errors usually surface with the first chunk, so fetch it inside the retry
+            started = time.perf_counter()
+            iterator = iter(self.client.models.generate_content_stream(
+                **self._request_args(request, request.model, cached_context)
+            ))
+            first = next(iterator, None)
+            return started, itertools.chain([first] if first is not None else [], iterator)
+        
+        chunks = []
+        slot, (start, responses) = self._open_stream(request.model, tokens, open_stream)
+        # The slot is held until the stream ends or the consumer closes it
+        with slot:
+            for response in responses:
+                text = response.text
+                if text:
+                    chunks.append(text)
+                    yield text
+            self.router.record_latency(request.model, time.perf_counter() - start)
+        
+        if request.cache_key and chunks:
+            self.response_cache.put(request.cache_key, "".join(chunks))
+    
+    def _ask_question_prompt(self, question: str,
+                             context: Optional[str]) -> Tuple[str, Optional[str], Optional[str]]:
+        """Build the (prompt, system_instruction, context) triple for ask_question.
+        
+        The context is sent ahead of the prompt and may be served from the
+        provider-side context cache.
+        """
+        if context:
+            return f"Question: {question}", None, f"Context:\n{context}"
+        return question, None, None
+    
+    def _explain_code_prompt(self, code: str) -> Tuple[str, Optional[str], Optional[str]]:
+        """Build the (prompt, system_instruction, context) triple for explain_code."""
+        prompt = "Explain the code above in detail, breaking down its functionality and purpose."
+        return prompt, None, f"```\n{code}\n```"
+    
+    def _refactor_code_prompt(self, code: str, instruction: str) -> Tuple[str, Optional[str]]:
+        """Build the (prompt, system_instruction) pair for refactor_code."""
+        prompt = (
+            f"Refactor this code according to the following instructions. "
+            f"Return only the refactored code, no explanations:\n\n"
+            f"Instructions: {instruction}\n\n"
+            f"Code:\n```\n{code}\n```"
+        )
+        return prompt, None
+    
+    def _documentation_prompt(self, code: str) -> Tuple[str, Optional[str], Optional[str]]:
+        """Build the (prompt, system_instruction, context) triple for generate_documentation."""
+        prompt = (
+            "Generate comprehensive documentation for the code above. "
+            "Include docstrings, function/class descriptions, and parameter details."
+        )
+        return prompt, None, f"```\n{code}\n```"
+    
+    def _improvements_prompt(self, code: str) -> Tuple[str, Optional[str], Optional[str]]:
+        """Build the (prompt, system_instruction, context) triple for suggest_improvements."""
+        prompt = (
+            "Analyze the code above and suggest improvements for readability, "
+            "performance, and best practices."
+        )
+        return prompt, None, f"```\n{code}\n```"
+    
+    def _modify_prompt(self, code: str, instruction: str) -> Tuple[str, Optional[str]]:
+        """Build the (prompt, system_instruction) pair for modify_with_instruction."""
+        prompt = (
+            f"Modify this code according to the following instruction. "
+            f"Return only the modified code, no explanations:\n\n"
+            f"Instruction: {instruction}\n\n"
+            f"Code:\n```\n{code}\n```"
+        )
+    
+        system_instruction = (
+            "You are a code editor assistant. Your task is to modify the provided code "
+            "according to the user's instructions. Only return the modified code, "
+            "do not include any explanations or markdown formatting."
+        )
             
-            return True, response.text
-        except Exception as e:
-            return False, f"Error in AI processing: {e}"
+        if self.system_prompt:
+            system_instruction = f"{self.system_prompt}\n\n{system_instruction}"
+        
+        return prompt, system_instruction
     
-    def suggest_improvements(self, code: str) -> Tuple[bool, str]:
-        """Have the model suggest improvements for code."""
-        try:
-            prompt = (
-                f"Analyze this code and suggest improvements for readability, "
-                f"performance, and best practices:\n\n"
-                f"```\n{code}\n```"
-            )
+    def _patch_prompt(self, code: str, instruction: str) -> Tuple[str, Optional[str]]:
+        """Build the (prompt, system_instruction) pair for a diff-based edit."""
+        prompt = (
+            f"Change this code according to the following instruction. "
+            f"Return only a unified diff against the code:\n\n"
+            f"Instruction: {instruction}\n\n"
+            f"Code:\n```\n{code}\n```"
+        )
+        
+        system_instruction = PATCH_SYSTEM_INSTRUCTION
+        if self.system_prompt:
+            system_instruction = f"{self.system_prompt}\n\n{system_instruction}"
+        
+        return prompt, system_instruction
+    
+    def _edit_via_patch(self, code: str, instruction: str, task: str,
+                        rewrite_prompt: Tuple[str, Optional[str]], use_cache: bool) -> Tuple[bool, str]:
+        """Ask for a diff and apply it locally, falling back to a full rewrite on conflict.
+        
+        Args:
+            code: The code to change
+            instruction: What to change
+            task: Task name used for model routing
+            rewrite_prompt: (prompt, system_instruction) of the full-rewrite request
+            use_cache: Set to False to bypass the response cache
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    temperature=self.generation_config["temperature"],
-                    max_output_tokens=self.generation_config["max_output_tokens"],
-                    top_p=self.generation_config["top_p"],
-                    top_k=self.generation_config["top_k"]
-                )
-            )
+        Returns:
+            Tuple of (success, changed_code_or_error)
+        """
+        success, diff = self._generate_text(*self._patch_prompt(code, instruction), use_cache=use_cache, task=task)
+        if success:
+            applied, result = apply_patch(code, diff)
+            if applied:
+                return True, result
+        return self._generate_text(*rewrite_prompt, use_cache=use_cache, task=task)
+    
+    def ask_question(self, question: str, context: Optional[str] = None, use_cache: bool = True,
+                     sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Ask a question to the model.
+        
+        Args:
+            question: The question
+            context: Optional context, e.g. file contents; large contexts are cached provider-side
+            use_cache: Set to False to bypass the response cache for this call
+            sources: Files the context comes from; writing one drops the cached context
+        """
+        prompt, system_instruction, context = self._ask_question_prompt(question, context)
+        return self._generate_text(prompt, system_instruction, use_cache, "ask", context, sources)
+    
+    def explain_code(self, code: str, use_cache: bool = True, sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Have the model explain code (sources as in ask_question)."""
+        prompt, system_instruction, context = self._explain_code_prompt(code)
+        return self._generate_text(prompt, system_instruction, use_cache, "explain", context, sources)
+    
+    def refactor_code(self, code: str, instruction: str, use_cache: bool = True,
+                      as_patch: bool = False) -> Tuple[bool, str]:
+        """Have the model refactor code according to instructions.
             
-            return True, response.text
-        except Exception as e:
-            return False, f"Error in AI processing: {e}"
+        With as_patch the model only returns a diff, so output size follows
+        the size of the change rather than of the file.
+        """
+        rewrite_prompt = self._refactor_code_prompt(code, instruction)
+        if as_patch:
+            return self._edit_via_patch(code, instruction, "refactor", rewrite_prompt, use_cache)
+        return self._generate_text(*rewrite_prompt, use_cache=use_cache, task="refactor")
     
-    def modify_with_instruction(self, code: str, instruction: str) -> Tuple[bool, str]:
-        """Modify code based on user instruction."""
-        try:
+    def generate_documentation(self, code: str, use_cache: bool = True,
+                               sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Have the model generate documentation for code."""
+        prompt, system_instruction, context = self._documentation_prompt(code)
+        return self._generate_text(prompt, system_instruction, use_cache, "docs", context, sources)
+    
+    def suggest_improvements(self, code: str, use_cache: bool = True,
+                             sources: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """Have the model suggest improvements for code."""
+        prompt, system_instruction, context = self._improvements_prompt(code)
+        return self._generate_text(prompt, system_instruction, use_cache, "improve", context, sources)
+    
+    def modify_with_instruction(self, code: str, instruction: str, use_cache: bool = True,
+                                as_patch: bool = False) -> Tuple[bool, str]:
+        """Modify code based on user instruction, optionally via a diff (see refactor_code)."""
+        rewrite_prompt = self._modify_prompt(code, instruction)
+        if as_patch:
+            return self._edit_via_patch(code, instruction, "modify", rewrite_prompt, use_cache)
+        return self._generate_text(*rewrite_prompt, use_cache=use_cache, task="modify")
+    
+    def ask_question_stream(self, question: str, context: Optional[str] = None, use_cache: bool = True,
+                            sources: Optional[List[str]] = None) -> Iterator[str]:
+        """Streaming variant of ask_question that yields text chunks."""
+        prompt, system_instruction, context = self._ask_question_prompt(question, context)
+        return self._stream_text(prompt, system_instruction, use_cache, "ask", context=context, sources=sources)
+    
+    def explain_code_stream(self, code: str, use_cache: bool = True,
+                            sources: Optional[List[str]] = None) -> Iterator[str]:
+        """Streaming variant of explain_code that yields text chunks."""
+        prompt, system_instruction, context = self._explain_code_prompt(code)
+        return self._stream_text(prompt, system_instruction, use_cache, "explain", context=context, sources=sources)
+    
+    def refactor_code_stream(self, code: str, instruction: str, use_cache: bool = True) -> Iterator[str]:
+        """Streaming variant of refactor_code that yields text chunks."""
+        return self._stream_text(*self._refactor_code_prompt(code, instruction), use_cache=use_cache, task="refactor")
+    
+    def generate_documentation_stream(self, code: str, use_cache: bool = True,
+                                      sources: Optional[List[str]] = None) -> Iterator[str]:
+        """Streaming variant of generate_documentation that yields text chunks."""
+        prompt, system_instruction, context = self._documentation_prompt(code)
+        return self._stream_text(prompt, system_instruction, use_cache, "docs", context=context, sources=sources)
+    
+    def suggest_improvements_stream(self, code: str, use_cache: bool = True,
+                                    sources: Optional[List[str]] = None) -> Iterator[str]:
+        """Streaming variant of suggest_improvements that yields text chunks."""
+        prompt, system_instruction, context = self._improvements_prompt(code)
+        return self._stream_text(prompt, system_instruction, use_cache, "improve", context=context, sources=sources)
+    
+    def modify_with_instruction_stream(self, code: str, instruction: str, use_cache: bool = True) -> Iterator[str]:
+        """Streaming variant of modify_with_instruction that yields text chunks."""
+        return self._stream_text(*self._modify_prompt(code, instruction), use_cache=use_cache, task="modify")
+    
+    def edit_patch_stream(self, code: str, instruction: str, use_cache: bool = True,
+                          task: str = "refactor") -> Iterator[str]:
+        """Stream a unified diff that applies an instruction to code.
+            
+        The caller applies it with code_patch.apply_patch and falls back to
+        refactor_code_stream / modify_with_instruction_stream on conflict.
+        """
+        return self._stream_text(*self._patch_prompt(code, instruction), use_cache=use_cache, task=task)
+    
+    def start_chat(self, filename: str, content: str) -> ChatSession:
+        """Start a multi-turn conversation about a file.
+        
+        Args:
+            filename: File the conversation is about
+            content: Current content of the file
+        
+        Returns:
+            A ChatSession; start a new one when matches() no longer holds
+        """
+        context = f"Context:\n{content}"
+        model = self.select_model("ask", context, self.system_prompt)
+        return ChatSession(self, filename, content, model)
+    
+    def chat_stream(self, session: ChatSession, message: str) -> Iterator[str]:
+        """Send a follow-up in a chat session, yielding the answer's text chunks.
+        
+        Only the new message and the kept history are sent on top of the
+        file's provider-side cached context; when the file can't be cached
+        it is sent in front of the first user turn instead (see ChatSession).
+        The turn is added to the session's history once the stream has been
+        consumed to the end.
+        
+        Args:
+            session: Session from start_chat
+            message: The user's message
+        
+        Yields:
+            Text chunks of the answer
+        
+        Raises:
+            Exception: Errors from the SDK are propagated to the consumer
+        """
+        cached_content = session.cached_content()
+        tokens = session.request_tokens(message, cached=bool(cached_content))
+        chat = session.create_chat(self.client.chats, cached_content)
+        turn = session.turn_message(message, cached_content)
+        
+        def open_stream():
+            # Errors usually surface with the first chunk, so fetch it inside the retry
+            started = time.perf_counter()
+            iterator = iter(chat.send_message_stream(turn))
+            first = next(iterator, None)
+            return started, itertools.chain([first] if first is not None else [], iterator)
+        
+        slot, (start, responses) = self._open_stream(session.model, tokens, open_stream)
+        with slot:
+            for response in responses:
+                text = response.text
+                if text:
+                    yield text
+            self.router.record_latency(session.model, time.perf_counter() - start)
+        
+        session.record(chat.get_history(curated=True))
+    
+    def _existing_files_context(self, instruction: str, existing_files: Optional[Dict[str, str]]) -> str:
+        """Existing files ranked and fitted to the model's token budget, as prompt context."""
+        if not existing_files:
+            return ""
+        built = self.context_builder.build(existing_files, instruction, self.model, calibrate=True)
+        return f"Existing files in the project:\n\n{built.text}"
+    
+    def _plan_project_prompt(self, instruction: str,
+                             existing_files: Optional[Dict[str, str]]) -> Tuple[str, Optional[str]]:
+        """Build the (prompt, system_instruction) pair for the manifest call of generate_project."""
+        context = self._existing_files_context(instruction, existing_files)
+        prompt = (
+            f"{context}\n"
+            f"Plan all the files needed for the following instruction. Do not write their "
+            f"content yet.\n\n"
+            f"Instruction: {instruction}"
+        )
+        system_instruction = (
+            "You are a software architect. List every file the project needs as a JSON array. "
+            "For each file give its path, a one-sentence responsibility, and the interfaces it "
+            "provides to or uses from the other files (function and class signatures, exports, "
+            "endpoints, data formats), so each file can be written independently. Include "
+            "existing files only if they must change."
+        )
+        if self.system_prompt:
+            system_instruction = f"{self.system_prompt}\n\n{system_instruction}"
+        return prompt, system_instruction
+    
+    def _project_file_prompt(self, instruction: str, manifest: List[Dict[str, str]], filename: str,
+                             current_content: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """Build the (prompt, system_instruction) pair for one file of generate_project.
+        
+        Args:
+            instruction: The project instruction
+            manifest: The plan from the manifest call, shared by every file
+            filename: The file to write
+            current_content: Current content if the file already exists
+        """
+        existing = ""
+        if current_content is not None:
+            existing = f"Current content of {filename}:\n```\n{current_content}\n```\n\n"
+        prompt = (
+            f"Project instruction: {instruction}\n\n"
+            f"Project plan:\n{format_manifest(manifest)}\n\n"
+            f"{existing}"
+            f"Write the complete content of the file '{filename}'. Use exactly the interfaces "
+            f"in the plan so it works with the other files."
+        )
+        system_instruction = (
+            "You are a helpful programming assistant writing one file of a larger project. "
+            "Reply with only the file content, without code fences or explanations."
+        )
+        if self.system_prompt:
+            system_instruction = f"{self.system_prompt}\n\n{system_instruction}"
+        return prompt, system_instruction
+    
+    def _generate_files_prompt(self, instruction: str, existing_files: Optional[Dict[str, str]],
+                               structured: bool = False) -> Tuple[str, Optional[str]]:
+        """Build the (prompt, system_instruction) pair for generate_files.
+        
+        Args:
+            instruction: The instruction for file generation
+            existing_files: Optional dictionary of existing files {filename: content}
+            structured: Ask for a JSON array matching FILES_SCHEMA instead of FILENAME blocks
+        """
+        context = self._existing_files_context(instruction, existing_files)
+        
+        if structured:
             prompt = (
-                f"Modify this code according to the following instruction. "
-                f"Return only the modified code, no explanations:\n\n"
-                f"Instruction: {instruction}\n\n"
-                f"Code:\n```\n{code}\n```"
+                f"{context}\n"
+                f"Based on the following instruction, generate all the necessary files for the task.\n\n"
+                f"Instruction: {instruction}"
             )
-            
             system_instruction = (
-                "You are a code editor assistant. Your task is to modify the provided code "
-                "according to the user's instructions. Only return the modified code, "
-                "do not include any explanations or markdown formatting."
+                "You are a helpful programming assistant. Your task is to generate multiple files "
+                "based on the user's instructions. Reply with a JSON array containing one object per "
+                "file with its filename, language and complete content. Ensure the files work "
+                "together as a coherent solution."
             )
-            
             if self.system_prompt:
                 system_instruction = f"{self.system_prompt}\n\n{system_instruction}"
+            return prompt, system_instruction
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    temperature=self.generation_config["temperature"],
-                    max_output_tokens=self.generation_config["max_output_tokens"],
-                    top_p=self.generation_config["top_p"],
-                    top_k=self.generation_config["top_k"]
-                )
-            )
+        prompt = (
+            f"{context}\n"
+            f"Based on the following instruction, generate all the necessary files for the task. "
+            f"For each file, include the filename and the complete file content.\n\n"
+            f"Instruction: {instruction}\n\n"
+            f"Format your response like this:\n"
+            f"FILENAME: example.py\n"
+            f"```python\n"
+            f"# File content goes here\n"
+            f"```\n\n"
+            f"FILENAME: another_file.js\n"
+            f"```javascript\n"
+            f"// Another file content\n"
+            f"```\n"
+        )
             
-            return True, response.text
-        except Exception as e:
-            return False, f"Error in AI processing: {e}"
+        system_instruction = (
+            "You are a helpful programming assistant. Your task is to generate multiple files "
+            "based on the user's instructions. For each file, include the complete filename and "
+            "the full file content. Use the format 'FILENAME: [filename]' followed by the content "
+            "in a code block. Ensure the files work together as a coherent solution."
+        )
+            
+        if self.system_prompt:
+            system_instruction = f"{self.system_prompt}\n\n{system_instruction}"
+            
+        return prompt, system_instruction
+    
+    def _generate_files_request(self, instruction: str, existing_files: Optional[Dict[str, str]],
+                                structured: bool) -> TextRequest:
+        """Resolve the request for generate_files; its responses are never cached."""
+        prompt, system_instruction = self._generate_files_prompt(instruction, existing_files, structured)
+        return self._text_request(
+            prompt, system_instruction, use_cache=False, task="generate_files",
+            response_schema=FILES_SCHEMA if structured else None
+        )
+    
+    def _parse_generated_files(self, response_text: Optional[str], structured: bool) -> Dict[str, str]:
+        """Extract {filename: content} from a generate_files response."""
+        if structured:
+            return parse_files_json(response_text or "")
+        return self._parse_files_response(response_text)
     
-    def generate_files(self, instruction: str, existing_files: Optional[Dict[str, str]] = None) -> Tuple[bool, Dict[str, str]]:
+    def generate_files(self, instruction: str, existing_files: Optional[Dict[str, str]] = None,
+                       structured: bool = False) -> Tuple[bool, Dict[str, str]]:
         """Generate multiple files based on an instruction.
         
         Args:
             instruction: The instruction for file generation
             existing_files: Optional dictionary of existing files {filename: content}
+            structured: Request JSON output (FILES_SCHEMA) instead of FILENAME blocks;
+                only for models with structured output support
             
         Returns:
             Tuple of (success, files_dict) where files_dict is {filename: content}
         """
         try:
-            # Prepare context from existing files
-            context = ""
-            if existing_files:
-                context = "Existing files in the project:\n\n"
-                for filename, content in existing_files.items():
-                    context += f"File: {filename}\n```\n{content}\n```\n\n"
-            
-            prompt = (
-                f"{context}\n"
-                f"Based on the following instruction, generate all the necessary files for the task. "
-                f"For each file, include the filename and the complete file content.\n\n"
-                f"Instruction: {instruction}\n\n"
-                f"Format your response like this:\n"
-                f"FILENAME: example.py\n"
-                f"```python\n"
-                f"# File content goes here\n"
-                f"```\n\n"
-                f"FILENAME: another_file.js\n"
-                f"```javascript\n"
-                f"// Another file content\n"
-                f"```\n"
-            )
+            request = self._generate_files_request(instruction, existing_files, structured)
             
-            system_instruction = (
-                "You are a helpful programming assistant. Your task is to generate multiple files "
-                "based on the user's instructions. For each file, include the complete filename and "
-                "the full file content. Use the format 'FILENAME: [filename]' followed by the content "
-                "in a code block. Ensure the files work together as a coherent solution."
-            )
+            def call(target_model):
+                start = time.perf_counter()
+                response = self.client.models.generate_content(
+                    **self._request_args(request, target_model, None)
+                )
+                self.router.record_latency(target_model, time.perf_counter() - start)
+                return response
             
-            if self.system_prompt:
-                system_instruction = f"{self.system_prompt}\n\n{system_instruction}"
+            def send():
+                return self._resilient_call(request.model, call, request.tokens)
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_instruction,
-                    temperature=self.generation_config["temperature"],
-                    max_output_tokens=self.generation_config["max_output_tokens"],
-                    top_p=self.generation_config["top_p"],
-                    top_k=self.generation_config["top_k"]
-                )
-            )
+            response = self.single_flight.do(request.request_key, send)
             
             # Parse the response to extract files
-            files_dict = self._parse_files_response(response.text)
-            
-            return True, files_dict
+            return True, self._parse_generated_files(response.text, structured)
         except Exception as e:
             return False, {"error": f"Error in AI processing: {e}"}
     
+    def generate_files_stream(self, instruction: str, existing_files: Optional[Dict[str, str]] = None,
+                              use_cache: bool = True) -> Iterator[Dict[str, str]]:
+        """Stream generated files, yielding each one as soon as it is complete.
+        
+        The model replies with JSON matching FILES_SCHEMA, which is parsed
+        incrementally while it streams.
+        
+        Args:
+            instruction: The instruction for file generation
+            existing_files: Optional dictionary of existing files {filename: content}
+            use_cache: Set to False to bypass the response cache for this call
+        
+        Yields:
+            File objects {"filename", "language", "content"}
+        
+        Raises:
+            Exception: SDK errors, or ValueError if the JSON is invalid or truncated
+        """
+        prompt, system_instruction = self._generate_files_prompt(instruction, existing_files, structured=True)
+        parser = FileStreamParser()
+        chunks = self._stream_text(prompt, system_instruction, use_cache, task="generate_files",
+                                   response_schema=FILES_SCHEMA)
+        # Close the stream right away if parsing fails or the consumer stops early
+        with closing(chunks):
+            for chunk in chunks:
+                yield from parser.feed(chunk)
+        parser.close()
+    
     def _parse_files_response(self, response_text: str) -> Dict[str, str]:
         """Parse the response text to extract filename and contents."""
         files_dict = {}
@@ -465,19 +1237,15 @@ class GenAIWrapper:
             if len(prompt.strip()) < 3:
                 return False, None, "Prompt is too short. Please provide a more detailed description."
                 
-            # Prepare configuration
-            generation_config = types.GenerateImagesConfig(
-                number_of_images=1,
-                output_mime_type='image/jpeg',
-                guidance_scale=9.0  # Higher values adhere more closely to prompt
-            )
-            
             # Generate image with error handling
             try:
-                response = self.client.models.generate_images(
-                    model=model,
-                    prompt=prompt,
-                    config=generation_config
+                response = self._limited_call(
+                    model, 0,
+                    lambda: self.client.models.generate_images(
+                        model=model,
+                        prompt=prompt,
+                        config=self._image_config()
+                    )
                 )
             except genai.ModelError as model_err:
                 return False, None, f"Model Error: {str(model_err)}"
@@ -486,72 +1254,76 @@ class GenAIWrapper:
             except genai.QuotaExceededError as quota_err:
                 return False, None, f"Quota exceeded: {str(quota_err)}"
             
-            # Process response
-            if not hasattr(response, 'generated_images') or not response.generated_images:
-                return False, None, "No images were generated in the response"
-            
-            # First image from the response
-            if len(response.generated_images) > 0 and hasattr(response.generated_images[0], 'image'):
-                image_data = response.generated_images[0].image
-                
-                # Handle different image return types
-                if isinstance(image_data, Image.Image):
-                    # Already a PIL Image
-                    return True, image_data, "Image generated successfully"
-                elif isinstance(image_data, str) and image_data.startswith('data:image'):
-                    # Base64 data
-                    image_data = image_data.split(',')[1]
-                    image = Image.open(io.BytesIO(base64.b64decode(image_data)))
-                    return True, image, "Image generated successfully"
-                elif isinstance(image_data, bytes):
-                    # Raw image bytes
-                    image = Image.open(io.BytesIO(image_data))
-                    return True, image, "Image generated successfully"
-                elif hasattr(image_data, 'data') and isinstance(image_data.data, bytes):
-                    # Google API image type with binary data
-                    image = Image.open(io.BytesIO(image_data.data))
-                    return True, image, "Image generated successfully"
-                elif hasattr(image_data, 'data') and isinstance(image_data.data, str):
-                    # Google API image type with base64 data
-                    image = Image.open(io.BytesIO(base64.b64decode(image_data.data)))
-                    return True, image, "Image generated successfully"
-                elif hasattr(image_data, '__dict__'):
-                    # Google genai types.Image - handle this explicitly 
-                    try:
-                        # Try to access binary data via an attribute
-                        if hasattr(image_data, 'data'):
-                            image_bytes = image_data.data
-                        elif hasattr(image_data, 'image_bytes'):
-                            image_bytes = image_data.image_bytes
-                        elif hasattr(image_data, 'bytes'):
-                            image_bytes = image_data.bytes
-                        else:
-                            # Try to get data from the dict
-                            dict_data = image_data.__dict__
-                            for attr in dict_data:
-                                if isinstance(dict_data[attr], bytes):
-                                    image_bytes = dict_data[attr]
-                                    break
-                                elif isinstance(dict_data[attr], str) and dict_data[attr].startswith('data:image'):
-                                    data = dict_data[attr].split(',')[1]
-                                    image_bytes = base64.b64decode(data)
-                                    break
-                            else:
-                                return False, None, f"Couldn't extract image data from {type(image_data)}"
-                        
-                        # Convert to PIL Image
-                        image = Image.open(io.BytesIO(image_bytes))
-                        return True, image, "Image generated successfully"
-                    except Exception as e:
-                        return False, None, f"Error processing image data: {str(e)}"
-                else:
-                    return False, None, f"Unsupported image format returned: {type(image_data)}"
-            else:
-                return False, None, "Generated image data is invalid"
+            return self._image_from_response(response)
                 
         except Exception as e:
             return False, None, f"Error generating image: {str(e)}"
     
+    def _image_from_response(self, response) -> Tuple[bool, Optional[Image.Image], str]:
+        """Extract the first generated image from a generate_images response."""
+        # Process response
+        if not hasattr(response, 'generated_images') or not response.generated_images:
+            return False, None, "No images were generated in the response"
+        
+        # First image from the response
+        if len(response.generated_images) > 0 and hasattr(response.generated_images[0], 'image'):
+            image_data = response.generated_images[0].image
+            
+            # Handle different image return types
+            if isinstance(image_data, Image.Image):
+                # Already a PIL Image
+                return True, image_data, "Image generated successfully"
+            elif isinstance(image_data, str) and image_data.startswith('data:image'):
+                # Base64 data
+                image_data = image_data.split(',')[1]
+                image = Image.open(io.BytesIO(base64.b64decode(image_data)))
+                return True, image, "Image generated successfully"
+            elif isinstance(image_data, bytes):
+                # Raw image bytes
+                image = Image.open(io.BytesIO(image_data))
+                return True, image, "Image generated successfully"
+            elif hasattr(image_data, 'data') and isinstance(image_data.data, bytes):
+                # Google API image type with binary data
+                image = Image.open(io.BytesIO(image_data.data))
+                return True, image, "Image generated successfully"
+            elif hasattr(image_data, 'data') and isinstance(image_data.data, str):
+                # Google API image type with base64 data
+                image = Image.open(io.BytesIO(base64.b64decode(image_data.data)))
+                return True, image, "Image generated successfully"
+            elif hasattr(image_data, '__dict__'):
+                # Google genai types.Image - handle this explicitly 
+                try:
+                    # Try to access binary data via an attribute
+                    if hasattr(image_data, 'data'):
+                        image_bytes = image_data.data
+                    elif hasattr(image_data, 'image_bytes'):
+                        image_bytes = image_data.image_bytes
+                    elif hasattr(image_data, 'bytes'):
+                        image_bytes = image_data.bytes
+                    else:
+                        # Try to get data from the dict
+                        dict_data = image_data.__dict__
+                        for attr in dict_data:
+                            if isinstance(dict_data[attr], bytes):
+                                image_bytes = dict_data[attr]
+                                break
+                            elif isinstance(dict_data[attr], str) and dict_data[attr].startswith('data:image'):
+                                data = dict_data[attr].split(',')[1]
+                                image_bytes = base64.b64decode(data)
+                                break
+                        else:
+                            return False, None, f"Couldn't extract image data from {type(image_data)}"
+                    
+                    # Convert to PIL Image
+                    image = Image.open(io.BytesIO(image_bytes))
+                    return True, image, "Image generated successfully"
+                except Exception as e:
+                    return False, None, f"Error processing image data: {str(e)}"
+            else:
+                return False, None, f"Unsupported image format returned: {type(image_data)}"
+        else:
+            return False, None, "Generated image data is invalid"
+    
     def save_image(self, image: Image.Image, path: str) -> Tuple[bool, str]:
         """Save an image to disk.
         
@@ -580,17 +1352,17 @@ class GenAIWrapper:
         """
         try:
             # Use specified model or default to first available embedding model
-            embedding_model = model
-            if not embedding_model and self.available_embedding_models:
-                embedding_model = self.available_embedding_models[0]
-                
+            embedding_model = self.embedding_model(model)
             if not embedding_model:
                 return False, None, "No embedding model available"
                 
             # Generate embedding
-            response = self.client.models.embed_content(
-                model=embedding_model,
-                contents=text
+            response = self._limited_call(
+                embedding_model, self.context_builder.estimate_tokens(text),
+                lambda: self.client.models.embed_content(
+                    model=embedding_model,
+                    contents=text
+                )
             )
             
             # Extract embedding vector
@@ -601,3 +1373,57 @@ class GenAIWrapper:
                 
         except Exception as e:
             return False, None, f"Error generating embedding: {str(e)}"
+    
+    def generate_embeddings(self, texts: List[str],
+                            model: Optional[str] = None) -> Tuple[bool, Optional[List[List[float]]], str]:
+        """Generate embedding vectors for many texts.
+        
+        Cached vectors are reused; the remaining unique texts are sent in
+        batches of EMBEDDING_BATCH_SIZE and stored as each batch completes.
+        
+        Args:
+            texts: The texts to embed
+            model: Optional specific embedding model to use
+            
+        Returns:
+            Tuple of (success, vectors_in_input_order, message)
+        """
+        embedding_model = self.embedding_model(model)
+        if not embedding_model:
+            return False, None, "No embedding model available"
+        
+        hashes = [EmbeddingCache.text_hash(text) for text in texts]
+        vectors = self.embedding_cache.get_many(embedding_model, hashes)
+        
+        # Embed each missing text once, however often it occurs in the input
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors and text_hash not in missing:
+                missing[text_hash] = text
+        missing_items = list(missing.items())
+        
+        try:
+            for start in range(0, len(missing_items), EMBEDDING_BATCH_SIZE):
+                batch = missing_items[start:start + EMBEDDING_BATCH_SIZE]
+                tokens = sum(self.context_builder.estimate_tokens(text) for _, text in batch)
+                response = self._limited_call(
+                    embedding_model, tokens,
+                    lambda: self.client.models.embed_content(
+                        model=embedding_model,
+                        contents=[text for _, text in batch]
+                    )
+                )
+                batch_vectors = {
+                    text_hash: list(embedding.values)
+                    for (text_hash, _), embedding in zip(batch, response.embeddings)
+                }
+                if len(batch_vectors) != len(batch):
+                    return False, None, "Embedding response did not match the request size"
+                self.embedding_cache.put_many(embedding_model, batch_vectors)
+                vectors.update(batch_vectors)
+        except Exception as e:
+            return False, None, f"Error generating embeddings: {str(e)}"
+        
+        return True, [vectors[text_hash] for text_hash in hashes], (
+            f"Embedded {len(missing_items)} new text(s), reused {len(texts) - len(missing_items)}"
+        )
@@ -2,18 +2,38 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import scrolledtext
 import threading
+import asyncio
 import os
+import re
+
+from scheduler import INTERACTIVE, BACKGROUND
+from code_patch import plan_patch, edit_stats
+
+# Interval (ms) between flushes of streamed AI output into the text widgets
+STREAM_FLUSH_INTERVAL = 50
+
+# Maximum number of files modified concurrently by per-file "Apply Suggested Changes"
+APPLY_CONCURRENCY = 4
+
+# Number of semantic index chunks used when analyzing "relevant chunks only"
+RETRIEVAL_TOP_K = 12
 
 class AIToolsPanel(ttk.Frame):
     """AI tools panel for interacting with GenAI."""
     
-    def __init__(self, parent, genai_wrapper, editor_panel, status_bar=None, sandbox_manager=None):
+    def __init__(self, parent, genai_wrapper, editor_panel, status_bar=None, sandbox_manager=None,
+                 semantic_index=None):
         super().__init__(parent)
         self.parent = parent
         self.genai = genai_wrapper
         self.editor = editor_panel
         self.status_bar = status_bar
         self.sandbox = sandbox_manager
+        self.semantic_index = semantic_index
+        self.async_genai = genai_wrapper.get_async_wrapper()
+        self.refactor_patch = None  # validated diff waiting to be applied
+        self.chat_session = None  # conversation of the Ask tab
+        self.chat_transcript = []  # (question, answer) turns shown in the Ask tab
         
         # Configure the frame
         self.configure(padding=(5, 5))
@@ -47,13 +67,31 @@ class AIToolsPanel(ttk.Frame):
         self.question_input = tk.Text(ask_frame, height=3, width=40, wrap=tk.WORD)
         self.question_input.pack(fill=tk.X, expand=False, pady=(0, 10))
         
-        # Submit button
+        # Submit and new chat buttons
+        ask_buttons = ttk.Frame(ask_frame)
+        ask_buttons.pack(fill=tk.X, pady=(0, 10))
+        
         ask_btn = ttk.Button(
-            ask_frame, 
+            ask_buttons, 
             text="Ask Question", 
             command=self.ask_question
         )
-        ask_btn.pack(anchor=tk.W, pady=(0, 10))
+        ask_btn.pack(side=tk.LEFT)
+        
+        new_chat_btn = ttk.Button(
+            ask_buttons, 
+            text="New Chat", 
+            command=self.new_chat
+        )
+        new_chat_btn.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Follow-up questions continue a chat about the file instead of starting over
+        self.chat_mode_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            ask_buttons,
+            text="Continue conversation",
+            variable=self.chat_mode_var
+        ).pack(side=tk.LEFT, padx=(10, 0))
         
         # Response output
         ttk.Label(ask_frame, text="Response:").pack(anchor=tk.W, pady=(5, 0))
@@ -138,7 +176,15 @@ class AIToolsPanel(ttk.Frame):
             text="Refactor Code", 
             command=self.refactor_code
         )
-        refactor_btn.pack(anchor=tk.W, pady=(0, 10))
+        refactor_btn.pack(anchor=tk.W, pady=(0, 5))
+        
+        # Diff mode only transfers the changed lines, which is much faster for big files
+        self.patch_mode_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            refactor_frame,
+            text="Request a diff instead of the whole file",
+            variable=self.patch_mode_var
+        ).pack(anchor=tk.W, pady=(0, 10))
         
         # Response output
         ttk.Label(refactor_frame, text="Refactored code:").pack(anchor=tk.W, pady=(5, 0))
@@ -366,6 +412,17 @@ class AIToolsPanel(ttk.Frame):
         )
         analyze_btn.grid(row=3, column=0, columnspan=2, sticky=tk.EW, pady=(5, 0))
         
+        # Retrieval option - send only the most relevant chunks of the selected files
+        self.use_index_var = tk.BooleanVar(value=False)
+        index_check = ttk.Checkbutton(
+            prompt_frame,
+            text="Relevant chunks only (semantic index)",
+            variable=self.use_index_var
+        )
+        index_check.grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        if not self.semantic_index or not self.semantic_index.available:
+            index_check.config(state=tk.DISABLED)
+        
         # Response output
         ttk.Label(multi_file_frame, text="Analysis:").pack(anchor=tk.W, pady=(5, 0))
         self.multi_file_output = scrolledtext.ScrolledText(
@@ -399,6 +456,19 @@ class AIToolsPanel(ttk.Frame):
         )
         self.apply_analysis_btn.pack(side=tk.RIGHT)
         
+        # Per-file mode issues one modify request per selected file in parallel
+        self.parallel_apply_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            action_buttons,
+            text="One request per file (parallel)",
+            variable=self.parallel_apply_var
+        ).pack(side=tk.RIGHT, padx=(0, 5))
+        ttk.Checkbutton(
+            action_buttons,
+            text="Diff-based edits",
+            variable=self.patch_mode_var
+        ).pack(side=tk.RIGHT, padx=(0, 5))
+        
         # Initialize file lists
         self._refresh_file_lists()
     
@@ -451,10 +521,10 @@ class AIToolsPanel(ttk.Frame):
                 self.status_bar.show_error("Please enter a prompt")
             return
         
-        # Get contents of all selected files
+        # Get contents of all selected files; large data files only contribute their head and tail
         file_contents = {}
         for filename in selected_files:
-            success, content = self.sandbox.read_file(filename)
+            success, content = self.sandbox.read_excerpt(filename)
             if success:
                 file_contents[filename] = content
             else:
@@ -462,64 +532,68 @@ class AIToolsPanel(ttk.Frame):
                     self.status_bar.show_error(f"Failed to read {filename}")
                 return
         
-        # Start progress indicator
-        if self.status_bar:
-            self.status_bar.start_progress("Analyzing files...")
-        
-        def get_analysis():
-            try:
-                # Format the prompt with file contents
-                context = "I'll analyze the following files:\n\n"
-                for filename, content in file_contents.items():
-                    context += f"## File: {filename}\n```\n{content}\n```\n\n"
-                
-                context += f"Based on these files, please: {prompt}"
+        use_index = self.use_index_var.get() and self.semantic_index is not None
+        
+        async def analysis_stream():
+            context_files = file_contents
+            if use_index:
+                # Replace whole files with their most relevant chunks
+                found, excerpts = await asyncio.to_thread(
+                    self.semantic_index.relevant_files, prompt, RETRIEVAL_TOP_K, list(selected_files)
+                )
+                if found and excerpts:
+                    context_files = excerpts
+                elif not found and self.status_bar:
+                    self.after(0, lambda: self.status_bar.set_status(f"Using whole files: {excerpts}"))
                 
-                # Call the AI
-                success, analysis = self.genai.ask_question(context, "")
+            # Fit the files into the model's token budget off the Tk thread,
+            # then stream the answer
+            built = await asyncio.to_thread(
+                self.genai.context_builder.build,
+                context_files, prompt, self.genai.model,
+                heading_format="## File: {filename}", calibrate=True
+            )
+            if self.status_bar and (built.truncated or built.summarized or built.omitted):
+                self.after(0, lambda: self.status_bar.set_status(f"Context: {built.describe()}"))
                 
-                # Update UI in main thread
-                def update_ui():
-                    if self.status_bar:
-                        self.status_bar.stop_progress()
-                        
-                    if success:
-                        self.set_text_widget(self.multi_file_output, analysis)
-                        self.save_analysis_btn.config(state=tk.NORMAL)
-                        
-                        # Enable apply button if the prompt is about improvements
-                        prompt_lower = prompt.lower()
-                        if any(kw in prompt_lower for kw in ["improve", "refactor", "fix", "change", "update", "edit"]):
-                            self.apply_analysis_btn.config(state=tk.NORMAL)
-                        else:
-                            self.apply_analysis_btn.config(state=tk.DISABLED)
-                            
-                        if self.status_bar:
-                            self.status_bar.show_message("Analysis complete")
-                    else:
-                        self.set_text_widget(self.multi_file_output, f"Error: {analysis}")
-                        self.save_analysis_btn.config(state=tk.DISABLED)
-                        self.apply_analysis_btn.config(state=tk.DISABLED)
-                        if self.status_bar:
-                            self.status_bar.show_error("Failed to analyze files")
+            # The files are the (cacheable) context, the prompt is the question
+            context = f"I'll analyze the following files:\n\n{built.text}"
+            question = f"Based on these files, please: {prompt}"
+            async for chunk in self.async_genai.ask_question_stream(
+                question, context, sources=list(context_files)
+            ):
+                yield chunk
                 
-                self.after(0, update_ui)
+        def update_ui(success, analysis):
+            if success:
+                self.save_analysis_btn.config(state=tk.NORMAL)
                 
-            except Exception as e:
-                def show_error():
-                    if self.status_bar:
-                        self.status_bar.stop_progress()
-                        self.status_bar.show_error(f"Error analyzing files: {str(e)}")
-                    self.set_text_widget(self.multi_file_output, f"Error analyzing files: {str(e)}")
-                    self.save_analysis_btn.config(state=tk.DISABLED)
+                # Enable apply button if the prompt is about improvements
+                prompt_lower = prompt.lower()
+                if any(kw in prompt_lower for kw in ["improve", "refactor", "fix", "change", "update", "edit"]):
+                    self.apply_analysis_btn.config(state=tk.NORMAL)
+                else:
                     self.apply_analysis_btn.config(state=tk.DISABLED)
                     
-                self.after(0, show_error)
+                if self.status_bar:
+                    self.status_bar.show_message("Analysis complete")
+            else:
+                self.set_text_widget(self.multi_file_output, f"Error: {analysis}")
+                self.save_analysis_btn.config(state=tk.DISABLED)
+                self.apply_analysis_btn.config(state=tk.DISABLED)
+                if self.status_bar:
+                    self.status_bar.show_error("Failed to analyze files")
         
-        # Run in thread to avoid UI freeze
-        thread = threading.Thread(target=get_analysis)
-        thread.daemon = True
-        thread.start()
+        self.save_analysis_btn.config(state=tk.DISABLED)
+        self.apply_analysis_btn.config(state=tk.DISABLED)
+        
+        # Stream the analysis into the output widget
+        self.stream_to_widget(
+            self.multi_file_output,
+            analysis_stream,
+            update_ui,
+            name="Analyze files"
+        )
     
     def save_analysis_to_markdown(self):
         """Save the multi-file analysis to a markdown file."""
@@ -577,24 +651,107 @@ class AIToolsPanel(ttk.Frame):
             return False
         return True
     
-    def run_in_thread(self, task_func, *args, **kwargs):
-        """Run a function in a separate thread to avoid UI freezing."""
+    def run_async(self, coro, name="AI request", channel=None, priority=INTERACTIVE):
+        """Run a coroutine as a cancellable job on the shared GenAI event loop.
+        
+        Args:
+            coro: The coroutine to run
+            name: Description shown in the status bar's jobs view
+            channel: Result slot; a newer job in the same channel cancels this one
+            priority: Scheduler priority class of the job's AI requests
+        
+        Returns:
+            The Job running the coroutine
+        """
         if self.status_bar:
             self.status_bar.start_progress("Working...")
         
-        def threaded_task():
+        def on_done(future):
+            # Keep the progress indicator while other jobs are still running
+            if self.status_bar and not self.async_genai.jobs.running():
+                self.after(100, lambda: self.status_bar.stop_progress())
+        
+        job = self.async_genai.jobs.submit(name, coro, channel, priority=priority)
+        job.future.add_done_callback(on_done)
+        return job
+    
+    def stream_to_widget(self, widget, stream_func, on_complete, name="AI request", prefix=""):
+        """Stream AI output into a read-only text widget.
+        
+        Chunks are collected on the GenAI event loop and flushed into the widget
+        in batches with after(), so the Tk main loop is never flooded with updates.
+        The stream runs as a job on the widget's channel: starting another
+        stream into the same widget cancels it, and output of a superseded or
+        cancelled job is dropped.
+        
+        Args:
+            widget: The text widget to fill
+            stream_func: Callable returning an async iterator of text chunks
+            on_complete: Called on the main thread with (success, full_text_or_error)
+            name: Description shown in the status bar's jobs view
+            prefix: Text shown ahead of the streamed output (not passed to on_complete)
+        """
+        pending = []
+        received = []
+        state = {"done": False, "error": None}
+        lock = threading.Lock()
+        
+        self.set_text_widget(widget, prefix)
+        
+        async def consume():
             try:
-                task_func(*args, **kwargs)
+                async for chunk in stream_func():
+                    with lock:
+                        pending.append(chunk)
+            except asyncio.TimeoutError:
+                state["error"] = "Error in AI processing: request timed out"
+            except Exception as e:
+                state["error"] = f"Error in AI processing: {e}"
             finally:
+                state["done"] = True
+        
+        def flush():
+            # A newer request owns the widget now
+            if not self.async_genai.jobs.is_current(job):
+                return
+            if job.future.cancelled():
+                widget.config(state=tk.NORMAL)
+                widget.insert(tk.END, "\n\n[Cancelled]")
+                widget.config(state=tk.DISABLED)
                 if self.status_bar:
-                    self.after(100, lambda: self.status_bar.stop_progress())
+                    self.status_bar.show_message(f"Cancelled {name}")
+                return
         
-        thread = threading.Thread(target=threaded_task)
-        thread.daemon = True
-        thread.start()
+            with lock:
+                text = "".join(pending)
+                pending.clear()
+                done = state["done"]
+            
+            if text:
+                received.append(text)
+                widget.config(state=tk.NORMAL)
+                widget.insert(tk.END, text)
+                widget.see(tk.END)
+                widget.config(state=tk.DISABLED)
+            
+            if not done:
+                self.after(STREAM_FLUSH_INTERVAL, flush)
+            elif state["error"]:
+                on_complete(False, state["error"])
+            else:
+                on_complete(True, "".join(received))
+        
+        job = self.run_async(consume(), name, channel=str(widget))
+        self.after(STREAM_FLUSH_INTERVAL, flush)
     
     def ask_question(self):
-        """Ask a question about the current file."""
+        """Ask a question about the current file.
+        
+        With "Continue conversation" on, the question is a turn of a chat
+        session bound to the file: the file is sent as context once per
+        session and follow-ups only add the new question. The session is
+        restarted when another file is opened or the file has changed.
+        """
         if not self.check_file_opened():
             return
         
@@ -605,13 +762,14 @@ class AIToolsPanel(ttk.Frame):
             return
         
         content = self.editor.get_content()
+        sources = [self.editor.current_file]
         
-        def get_answer():
-            success, answer = self.genai.ask_question(question, content)
+        if not self.chat_mode_var.get():
+            self.chat_session = None
+            self.chat_transcript = []
             
-            def update_ui():
+            def update_ui(success, answer):
                 if success:
-                    self.set_text_widget(self.ask_output, answer)
                     self.save_ask_btn.config(state=tk.NORMAL)
                 else:
                     self.set_text_widget(self.ask_output, f"Error: {answer}")
@@ -619,9 +777,60 @@ class AIToolsPanel(ttk.Frame):
                     if self.status_bar:
                         self.status_bar.show_error("Failed to get answer from AI.")
             
-            self.after(0, update_ui)
+            self.save_ask_btn.config(state=tk.DISABLED)
+            self.stream_to_widget(
+                self.ask_output,
+                lambda: self.async_genai.ask_question_stream(question, content, sources=sources),
+                update_ui,
+                name="Ask AI"
+            )
+            return
+        
+        session = self.chat_session
+        if session is None or not session.matches(self.editor.current_file, content):
+            if session is not None and self.status_bar:
+                self.status_bar.show_message("The file changed; starting a new chat about it.")
+            session = self.genai.start_chat(self.editor.current_file, content)
+            self.chat_session = session
+            self.chat_transcript = []
+        
+        transcript = self.format_chat_transcript()
         
-        self.run_in_thread(get_answer)
+        def update_chat(success, answer):
+            if self.chat_session is not session:
+                return
+            if success:
+                self.chat_transcript.append((question, answer))
+                self.question_input.delete(1.0, tk.END)
+                self.save_ask_btn.config(state=tk.NORMAL)
+            else:
+                self.set_text_widget(self.ask_output, f"{transcript}Error: {answer}")
+                if self.status_bar:
+                    self.status_bar.show_error("Failed to get answer from AI.")
+            
+        self.save_ask_btn.config(state=tk.DISABLED)
+        self.stream_to_widget(
+            self.ask_output,
+            lambda: self.async_genai.chat_stream(session, question),
+            update_chat,
+            name="Ask AI",
+            prefix=f"{transcript}You: {question}\n\nAI: "
+        )
+    
+    def format_chat_transcript(self):
+        """Render the finished turns of the Ask tab's chat."""
+        return "".join(
+            f"You: {question}\n\nAI: {answer}\n\n" for question, answer in self.chat_transcript
+        )
+    
+    def new_chat(self):
+        """Forget the Ask tab's conversation."""
+        self.chat_session = None
+        self.chat_transcript = []
+        self.set_text_widget(self.ask_output, "")
+        self.save_ask_btn.config(state=tk.DISABLED)
+        if self.status_bar:
+            self.status_bar.show_message("Started a new chat.")
     
     def explain_code(self):
         """Get an explanation of the current file."""
@@ -629,23 +838,24 @@ class AIToolsPanel(ttk.Frame):
             return
         
         content = self.editor.get_content()
+        sources = [self.editor.current_file]
         
-        def get_explanation():
-            success, explanation = self.genai.explain_code(content)
-            
-            def update_ui():
-                if success:
-                    self.set_text_widget(self.explain_output, explanation)
-                    self.save_explain_btn.config(state=tk.NORMAL)
-                else:
-                    self.set_text_widget(self.explain_output, f"Error: {explanation}")
-                    self.save_explain_btn.config(state=tk.DISABLED)
-                    if self.status_bar:
-                        self.status_bar.show_error("Failed to get explanation from AI.")
+        def update_ui(success, explanation):
+            if success:
+                self.save_explain_btn.config(state=tk.NORMAL)
+            else:
+                self.set_text_widget(self.explain_output, f"Error: {explanation}")
+                self.save_explain_btn.config(state=tk.DISABLED)
+                if self.status_bar:
+                    self.status_bar.show_error("Failed to get explanation from AI.")
             
-            self.after(0, update_ui)
-        
-        self.run_in_thread(get_explanation)
+        self.save_explain_btn.config(state=tk.DISABLED)
+        self.stream_to_widget(
+            self.explain_output,
+            lambda: self.async_genai.explain_code_stream(content, sources=sources),
+            update_ui,
+            name="Explain code"
+        )
     
     def refactor_code(self):
         """Refactor the current file."""
@@ -659,28 +869,81 @@ class AIToolsPanel(ttk.Frame):
             return
         
         content = self.editor.get_content()
+        self.refactor_patch = None
+        self.apply_refactor_btn.config(state=tk.DISABLED)
         
-        def get_refactored_code():
-            success, refactored = self.genai.refactor_code(content, instruction)
+        if self.patch_mode_var.get():
+            self._refactor_as_patch(content, instruction)
+        else:
+            self._refactor_full(content, instruction)
             
-            def update_ui():
-                if success:
-                    self.set_text_widget(self.refactor_output, refactored)
-                    self.apply_refactor_btn.config(state=tk.NORMAL)
-                    if self.status_bar:
-                        self.status_bar.show_message("Code refactored. You can apply the changes.")
-                else:
-                    self.set_text_widget(self.refactor_output, f"Error: {refactored}")
-                    self.apply_refactor_btn.config(state=tk.DISABLED)
-                    if self.status_bar:
-                        self.status_bar.show_error("Failed to refactor code.")
+    def _refactor_as_patch(self, content, instruction):
+        """Ask for a diff; fall back to a full rewrite if it doesn't apply."""
+        def update_ui(success, diff):
+            if not success:
+                self.set_text_widget(self.refactor_output, f"Error: {diff}")
+                if self.status_bar:
+                    self.status_bar.show_error("Failed to refactor code.")
+                return
             
-            self.after(0, update_ui)
-        
-        self.run_in_thread(get_refactored_code)
+            # Validate the diff against the code it was made for
+            applies, edits = plan_patch(content, diff)
+            if applies:
+                self.refactor_patch = diff
+                self.apply_refactor_btn.config(state=tk.NORMAL)
+                added, removed = edit_stats(edits)
+                if self.status_bar:
+                    self.status_bar.show_message(
+                        f"Diff ready (+{added} -{removed} lines). You can apply the changes."
+                    )
+            else:
+                if self.status_bar:
+                    self.status_bar.show_message(f"{edits}; requesting the whole file instead...")
+                self._refactor_full(content, instruction)
+        
+        self.stream_to_widget(
+            self.refactor_output,
+            lambda: self.async_genai.edit_patch_stream(content, instruction),
+            update_ui,
+            name="Refactor code (diff)"
+        )
+    
+    def _refactor_full(self, content, instruction):
+        """Ask for the complete refactored file."""
+        def update_ui(success, refactored):
+            if success:
+                self.apply_refactor_btn.config(state=tk.NORMAL)
+                if self.status_bar:
+                    self.status_bar.show_message("Code refactored. You can apply the changes.")
+            else:
+                self.set_text_widget(self.refactor_output, f"Error: {refactored}")
+                self.apply_refactor_btn.config(state=tk.DISABLED)
+                if self.status_bar:
+                    self.status_bar.show_error("Failed to refactor code.")
+            
+        self.stream_to_widget(
+            self.refactor_output,
+            lambda: self.async_genai.refactor_code_stream(content, instruction),
+            update_ui,
+            name="Refactor code"
+        )
     
     def apply_refactored_code(self):
         """Apply the refactored code to the editor."""
+        if self.refactor_patch:
+            # Only the changed lines are replaced; the diff is re-checked in
+            # case the file was edited since it was requested
+            success, message = self.editor.apply_patch(self.refactor_patch)
+            if not success:
+                if self.status_bar:
+                    self.status_bar.show_error(f"The diff no longer applies: {message}")
+                return
+            self.refactor_patch = None
+            self.apply_refactor_btn.config(state=tk.DISABLED)
+            if self.status_bar:
+                self.status_bar.show_message(f"{message} Don't forget to save.")
+            return
+        
         refactored_code = self.refactor_output.get(1.0, tk.END)
         self.editor.set_content(refactored_code)
         self.apply_refactor_btn.config(state=tk.DISABLED)
@@ -693,25 +956,26 @@ class AIToolsPanel(ttk.Frame):
             return
         
         content = self.editor.get_content()
+        sources = [self.editor.current_file]
         
-        def get_suggestions():
-            success, suggestions = self.genai.suggest_improvements(content)
-            
-            def update_ui():
-                if success:
-                    self.set_text_widget(self.improve_output, suggestions)
-                    self.apply_improve_btn.config(state=tk.NORMAL)
-                    if self.status_bar:
-                        self.status_bar.show_message("Improvements suggested. You can apply them.")
-                else:
-                    self.set_text_widget(self.improve_output, f"Error: {suggestions}")
-                    self.apply_improve_btn.config(state=tk.DISABLED)
-                    if self.status_bar:
-                        self.status_bar.show_error("Failed to get improvement suggestions.")
+        def update_ui(success, suggestions):
+            if success:
+                self.apply_improve_btn.config(state=tk.NORMAL)
+                if self.status_bar:
+                    self.status_bar.show_message("Improvements suggested. You can apply them.")
+            else:
+                self.set_text_widget(self.improve_output, f"Error: {suggestions}")
+                self.apply_improve_btn.config(state=tk.DISABLED)
+                if self.status_bar:
+                    self.status_bar.show_error("Failed to get improvement suggestions.")
             
-            self.after(0, update_ui)
-        
-        self.run_in_thread(get_suggestions)
+        self.apply_improve_btn.config(state=tk.DISABLED)
+        self.stream_to_widget(
+            self.improve_output,
+            lambda: self.async_genai.suggest_improvements_stream(content, sources=sources),
+            update_ui,
+            name="Suggest improvements"
+        )
     
     def apply_improvements(self):
         """Apply the improved code to the editor."""
@@ -727,25 +991,26 @@ class AIToolsPanel(ttk.Frame):
             return
         
         content = self.editor.get_content()
+        sources = [self.editor.current_file]
         
-        def get_docs():
-            success, docs = self.genai.generate_documentation(content)
-            
-            def update_ui():
-                if success:
-                    self.set_text_widget(self.docs_output, docs)
-                    self.apply_docs_btn.config(state=tk.NORMAL)
-                    if self.status_bar:
-                        self.status_bar.show_message("Documentation generated. You can apply it.")
-                else:
-                    self.set_text_widget(self.docs_output, f"Error: {docs}")
-                    self.apply_docs_btn.config(state=tk.DISABLED)
-                    if self.status_bar:
-                        self.status_bar.show_error("Failed to generate documentation.")
+        def update_ui(success, docs):
+            if success:
+                self.apply_docs_btn.config(state=tk.NORMAL)
+                if self.status_bar:
+                    self.status_bar.show_message("Documentation generated. You can apply it.")
+            else:
+                self.set_text_widget(self.docs_output, f"Error: {docs}")
+                self.apply_docs_btn.config(state=tk.DISABLED)
+                if self.status_bar:
+                    self.status_bar.show_error("Failed to generate documentation.")
             
-            self.after(0, update_ui)
-        
-        self.run_in_thread(get_docs)
+        self.apply_docs_btn.config(state=tk.DISABLED)
+        self.stream_to_widget(
+            self.docs_output,
+            lambda: self.async_genai.generate_documentation_stream(content, sources=sources),
+            update_ui,
+            name="Generate docs"
+        )
     
     def apply_docs(self):
         """Apply the generated documentation to the editor."""
@@ -781,9 +1046,15 @@ class AIToolsPanel(ttk.Frame):
         if not filename.endswith('.md'):
             filename += '.md'
             
-        # Format the content
-        question = self.question_input.get(1.0, tk.END).strip()
-        markdown_content = f"# Question and Answer\n\n## Question\n\n{question}\n\n## Answer\n\n{content}"
+        # Format the content; a chat is saved turn by turn
+        if self.chat_transcript:
+            markdown_content = "# Questions and Answers\n\n" + "\n\n".join(
+                f"## Question\n\n{question}\n\n## Answer\n\n{answer}"
+                for question, answer in self.chat_transcript
+            )
+        else:
+            question = self.question_input.get(1.0, tk.END).strip()
+            markdown_content = f"# Question and Answer\n\n## Question\n\n{question}\n\n## Answer\n\n{content}"
         
         # Save the file
         success, message = self.sandbox.write_file(filename, markdown_content)
@@ -871,6 +1142,12 @@ class AIToolsPanel(ttk.Frame):
         if not confirm:
             return
             
+        if self.parallel_apply_var.get():
+            self._apply_changes_per_file(
+                selected_files, self.multi_file_input.get(1.0, tk.END).strip(), analysis
+            )
+            return
+        
         # Start progress indicator
         if self.status_bar:
             self.status_bar.start_progress("Applying changes...")
@@ -894,18 +1171,9 @@ class AIToolsPanel(ttk.Frame):
                         continue
                         
                     # Try to find suggestions specifically for this file in the analysis
-                    file_marker = f"### {filename}" 
-                    file_sections = analysis.split(file_marker)
-                    
-                    if len(file_sections) > 1:
-                        # Found specific section for this file
-                        file_analysis = file_sections[1].split("###")[0]  # Get content until next file section
-                    else:
-                        # No specific section, use general analysis
-                        file_analysis = analysis
+                    file_analysis = self._analysis_for_file(analysis, filename)
                     
                     # Detect code blocks
-                    import re
                     code_blocks = re.findall(r"```[a-z]*\n(.*?)```", file_analysis, re.DOTALL)
                     
                     # If we found complete code blocks, use the last one as the new content
@@ -939,14 +1207,134 @@ class AIToolsPanel(ttk.Frame):
                 self.after(0, update_ui)
                 
             except Exception as e:
+                error = str(e)
                 def show_error():
                     if self.status_bar:
                         self.status_bar.stop_progress()
-                        self.status_bar.show_error(f"Error applying changes: {str(e)}")
+                        self.status_bar.show_error(f"Error applying changes: {error}")
                     
                 self.after(0, show_error)
         
         # Run in thread to avoid UI freeze
         thread = threading.Thread(target=apply_changes)
         thread.daemon = True
-        thread.start() 
\ No newline at end of file
+        thread.start()
+    
+    def _analysis_for_file(self, analysis, filename):
+        """Return the section of the analysis about a file, or the whole analysis."""
+        file_sections = analysis.split(f"### {filename}")
+        if len(file_sections) > 1:
+            # Found specific section for this file - content until next file section
+            return file_sections[1].split("###")[0]
+        return analysis
+    
+    def _strip_code_fences(self, text):
+        """Remove a surrounding markdown code fence from model output, if present."""
+        match = re.match(r"^\s*```[\w+-]*\n(.*?)\n?```\s*$", text, re.DOTALL)
+        if match:
+            return match.group(1)
+        return text
+    
+    def _apply_changes_per_file(self, selected_files, prompt, analysis):
+        """Apply the analysis by sending one modify request per file concurrently.
+        
+        Each file is written as soon as its response arrives, so total time is
+        roughly that of the slowest file rather than the sum of all of them.
+        """
+        total = len(selected_files)
+        results = {"applied": [], "skipped": [], "failed": []}
+        patch_mode = self.patch_mode_var.get()
+        
+        if self.status_bar:
+            self.status_bar.start_progress(f"Applying changes to {total} file(s)...")
+        
+        def report_progress(filename, outcome):
+            done = sum(len(names) for names in results.values())
+            if self.status_bar:
+                self.status_bar.set_status(f"Applying changes: {done}/{total} done ({filename}: {outcome})")
+        
+        async def apply_one(filename, limiter):
+            # File I/O runs off the shared event loop so it doesn't stall other requests
+            success, original_content = await asyncio.to_thread(self.sandbox.read_file, filename)
+            if not success:
+                return filename, "failed", original_content
+            if not original_content.strip():
+                return filename, "skipped", "empty file"
+            
+            instruction = (
+                f"Apply the changes relevant to the file '{filename}' from the analysis below. "
+                f"The analysis was produced for this request: {prompt}\n\n"
+                f"Analysis:\n{self._analysis_for_file(analysis, filename)}"
+            )
+            
+            async with limiter:
+                success, modified = await self.async_genai.modify_with_instruction(
+                    original_content, instruction, as_patch=patch_mode
+                )
+            if not success:
+                return filename, "failed", modified
+            
+            new_content = self._strip_code_fences(modified)
+            if new_content.strip() == original_content.strip():
+                return filename, "skipped", "no changes"
+            
+            success, message = await asyncio.to_thread(self.sandbox.write_file, filename, new_content)
+            return filename, ("applied" if success else "failed"), message
+        
+        async def apply_all():
+            limiter = asyncio.Semaphore(APPLY_CONCURRENCY)
+            tasks = [asyncio.ensure_future(apply_one(filename, limiter)) for filename in selected_files]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        filename, outcome, message = await next_done
+                    except Exception as e:
+                        filename, outcome, message = "?", "failed", str(e)
+                    results[outcome].append((filename, message))
+                    self.after(0, lambda f=filename, o=outcome: report_progress(f, o))
+            finally:
+                # Cancelling the job stops the per-file requests still running
+                for task in tasks:
+                    task.cancel()
+        
+        def on_done(future):
+            error = None
+            if future.cancelled():
+                error = "Cancelled"
+            else:
+                try:
+                    future.result()
+                except Exception as e:
+                    error = str(e)
+            
+            def update_ui():
+                if self.status_bar:
+                    self.status_bar.stop_progress()
+                
+                applied = len(results["applied"])
+                failed = results["failed"]
+                summary = (
+                    f"Applied changes to {applied} of {total} file(s)"
+                    + (f", {len(results['skipped'])} unchanged" if results["skipped"] else "")
+                    + (f", {len(failed)} failed" if failed else "")
+                )
+                
+                if applied > 0:
+                    # Trigger file refresh
+                    self.event_generate("<<FilesGenerated>>")
+                    if self.status_bar:
+                        self.status_bar.show_message(summary)
+                elif self.status_bar:
+                    self.status_bar.show_error(error or "No changes were applied")
+                
+                if failed:
+                    from tkinter import messagebox
+                    details = "\n".join(f"{name}: {message}" for name, message in failed)
+                    messagebox.showwarning("Apply Suggested Changes", f"{summary}\n\n{details}")
+            
+            self.after(0, update_ui)
+        
+        job = self.async_genai.jobs.submit(
+            "Apply changes", apply_all(), channel="apply_changes", priority=BACKGROUND
+        )
+        job.future.add_done_callback(on_done)
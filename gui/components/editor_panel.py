@@ -4,6 +4,8 @@ from tkinter import ttk
 from tkinter import scrolledtext
 import re
 
+from code_patch import plan_patch, apply_edits, edit_stats
+
 class EditorPanel(ttk.Frame):
     """Editor panel for viewing and editing files."""
     
@@ -179,6 +181,44 @@ class EditorPanel(ttk.Frame):
         self.editor.edit_modified(True)
         self.on_text_modified(None)
     
+    def apply_patch(self, diff_text):
+        """Apply a unified diff to the editor content, touching only the changed lines.
+        
+        The edit is a single undo step and keeps the cursor and scroll
+        position outside the changed lines.
+        
+        Returns:
+            Tuple of (success, message)
+        """
+        original = self.editor.get("1.0", "end-1c")
+        success, edits = plan_patch(original, diff_text)
+        if not success:
+            return False, edits
+        if not edits:
+            return True, "No changes to apply."
+        expected = apply_edits(original, edits)
+        
+        self.editor.configure(autoseparators=False)
+        self.editor.edit_separator()
+        try:
+            # Apply from the bottom up so earlier line numbers stay valid
+            for start, end, new_lines in reversed(edits):
+                self.editor.delete(f"{start + 1}.0", f"{end + 1}.0")
+                self.editor.insert(f"{start + 1}.0", "".join(line + "\n" for line in new_lines))
+            
+            # Edits touching the last line can differ in the final newline
+            if self.editor.get("1.0", "end-1c") != expected:
+                self.editor.delete("1.0", tk.END)
+                self.editor.insert("1.0", expected)
+        finally:
+            self.editor.edit_separator()
+            self.editor.configure(autoseparators=True)
+        
+        self.editor.edit_modified(True)
+        self.on_text_modified(None)
+        added, removed = edit_stats(edits)
+        return True, f"Applied {len(edits)} change(s): +{added} -{removed} lines."
+    
     def apply_syntax_highlighting(self, filename):
         """Apply syntax highlighting based on file extension."""
         ext = os.path.splitext(filename)[1].lower()
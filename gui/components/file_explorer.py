@@ -7,6 +7,10 @@ import json
 import subprocess
 import platform
 
+# Child item standing in for the contents of a directory that hasn't been opened;
+# ":" can't occur in sandbox paths, so it never clashes with a real entry
+PLACEHOLDER_SUFFIX = "/::placeholder"
+
 class FileExplorer(ttk.Frame):
     """File explorer component for viewing and managing sandbox files."""
     
@@ -16,6 +20,7 @@ class FileExplorer(ttk.Frame):
         self.sandbox = sandbox_manager
         self.status_bar = status_bar
         self.selected_file = None
+        self.selected_dir = ""  # directory new files and folders go into
         self.on_file_select_callback = None
         self.sort_by = "name"  # Default sort by name
         self.sort_reverse = False  # Default ascending order
@@ -44,13 +49,16 @@ class FileExplorer(ttk.Frame):
         self.new_btn = ttk.Button(toolbar, text="New", width=6, command=self.create_file)
         self.new_btn.pack(side=tk.LEFT, padx=2)
         
+        self.new_dir_btn = ttk.Button(toolbar, text="Folder", width=6, command=self.create_folder)
+        self.new_dir_btn.pack(side=tk.LEFT, padx=2)
+        
         self.rename_btn = ttk.Button(toolbar, text="Rename", width=6, command=self.rename_file)
         self.rename_btn.pack(side=tk.LEFT, padx=2)
         
         self.delete_btn = ttk.Button(toolbar, text="Delete", width=6, command=self.delete_file)
         self.delete_btn.pack(side=tk.LEFT, padx=2)
         
-        self.refresh_btn = ttk.Button(toolbar, text="Refresh", width=6, command=self.refresh_files)
+        self.refresh_btn = ttk.Button(toolbar, text="Refresh", width=6, command=lambda: self.refresh_files(force=True))
         self.refresh_btn.pack(side=tk.LEFT, padx=2)
         
         # Sort options
@@ -110,6 +118,7 @@ class FileExplorer(ttk.Frame):
         # Bind events
         self.tree.bind("<<TreeviewSelect>>", self.on_file_select)
         self.tree.bind("<Double-1>", self.on_file_double_click)
+        self.tree.bind("<<TreeviewOpen>>", self.on_dir_open)
         
         # Initialize
         self.refresh_files()
@@ -160,8 +169,15 @@ class FileExplorer(ttk.Frame):
             self.selected_file = None
             return
         
-        item = self.tree.item(selection[0])
-        self.selected_file = item["text"]
+        # Items are identified by their sandbox path
+        path = selection[0]
+        if self.tree.tag_has("dir", path):
+            self.selected_file = None
+            self.selected_dir = path
+            return
+        
+        self.selected_file = path
+        self.selected_dir = path.rpartition("/")[0]
         
         # Call the external callback if set
         if self.on_file_select_callback:
@@ -172,6 +188,10 @@ class FileExplorer(ttk.Frame):
         if self.selected_file and self.on_file_select_callback:
             self.on_file_select_callback(self.selected_file, open_file=True)
     
+    def on_dir_open(self, event):
+        """List a directory the first time it is expanded."""
+        self._populate(self.tree.focus())
+    
     def on_sort_change(self, value):
         """Handle sort method change."""
         self.sort_by = value
@@ -197,70 +217,124 @@ class FileExplorer(ttk.Frame):
         
         self.refresh_files()
     
-    def refresh_files(self):
-        """Refresh the file list."""
+    def refresh_files(self, force=False):
+        """Refresh the file tree.
+        
+        Only the top level and the directories that were expanded are
+        listed again; the others are listed when they are opened.
+        
+        Args:
+            force: Rescan the sandbox even if its directories look unchanged
+        """
+        opened = self._open_dirs("")
+        
         # Clear the tree
         for item in self.tree.get_children():
             self.tree.delete(item)
         
-        # Get file list and file info
-        files = self.sandbox.list_files()
-        file_info = []
+        entries = self.sandbox.list_entries(refresh=force)
+        self._insert_entries("", entries)
         
-        root_path = self.sandbox.sandbox_dir
-        for filename in files:
-            file_path = os.path.join(root_path, filename)
-            file_stats = os.stat(file_path)
+        # Reopen expanded directories, parents first
+        for path in sorted(opened, key=lambda p: p.count("/")):
+            if self.tree.exists(path):
+                self._populate(path, force)
+                self.tree.item(path, open=True)
             
-            size = file_stats.st_size
-            size_str = self._format_size(size)
-            modified = file_stats.st_mtime
-            modified_str = self._format_time(modified)
-            
-            file_info.append({
-                'name': filename,
-                'size': size,
-                'size_str': size_str,
-                'modified': modified,
-                'modified_str': modified_str
-            })
-        
-        # Sort the files based on current settings
-        if self.sort_by == "name":
-            file_info.sort(key=lambda x: x['name'].lower(), reverse=self.sort_reverse)
-        elif self.sort_by == "size":
-            file_info.sort(key=lambda x: x['size'], reverse=self.sort_reverse)
-        elif self.sort_by == "modified":
-            file_info.sort(key=lambda x: x['modified'], reverse=self.sort_reverse)
-        
-        # Display files in tree
-        for file in file_info:
-            self.tree.insert("", "end", text=file['name'], values=(file['size_str'], file['modified_str']))
+        if self.selected_file and self.tree.exists(self.selected_file):
+            self.tree.selection_set(self.selected_file)
         
         # Update status
         if self.status_bar:
+            files = sum(1 for entry in entries if not entry.is_dir)
+            folders = len(entries) - files
             sort_info = f"sorted by {self.sort_by} ({'desc' if self.sort_reverse else 'asc'})"
-            self.status_bar.set_status(f"{len(files)} files in sandbox, {sort_info}")
+            self.status_bar.set_status(f"{files} files and {folders} folders in sandbox, {sort_info}")
+    
+    def _open_dirs(self, parent):
+        """Paths of the expanded directories below a tree item."""
+        opened = []
+        for item in self.tree.get_children(parent):
+            if self.tree.tag_has("dir", item) and self.tree.item(item, "open"):
+                opened.append(item)
+                opened.extend(self._open_dirs(item))
+        return opened
+    
+    def _populate(self, path, force=False):
+        """List a directory into its tree item if that hasn't happened yet."""
+        placeholder = path + PLACEHOLDER_SUFFIX
+        if not self.tree.exists(placeholder):
+            return
+        self.tree.delete(placeholder)
+        self._insert_entries(path, self.sandbox.list_entries(path, refresh=force))
+    
+    def _insert_entries(self, parent, entries):
+        """Insert sorted entries under a tree item, directories first."""
+        # File metadata comes from the sandbox's scandir index, no per-file stat calls
+        if self.sort_by == "size":
+            key = lambda entry: entry.size
+        elif self.sort_by == "modified":
+            key = lambda entry: entry.mtime_ns
+        else:
+            key = lambda entry: entry.name.lower()
+        
+        dirs = sorted((entry for entry in entries if entry.is_dir), key=key, reverse=self.sort_reverse)
+        files = sorted((entry for entry in entries if not entry.is_dir), key=key, reverse=self.sort_reverse)
+        
+        for entry in dirs:
+            self.tree.insert(
+                parent, "end", iid=entry.path, text=entry.name,
+                values=("", self._format_time(entry.mtime)), tags=("dir",)
+            )
+            # Makes the directory expandable; replaced by its entries when opened
+            self.tree.insert(entry.path, "end", iid=entry.path + PLACEHOLDER_SUFFIX, text="")
+        
+        for entry in files:
+            self.tree.insert(
+                parent, "end", iid=entry.path, text=entry.name,
+                values=(self._format_size(entry.size), self._format_time(entry.mtime))
+            )
+    
+    def _reveal(self, path):
+        """Expand the directories leading to a path and select it."""
+        parts = path.split("/")
+        for depth in range(1, len(parts)):
+            ancestor = "/".join(parts[:depth])
+            if not self.tree.exists(ancestor):
+                return
+            self._populate(ancestor)
+            self.tree.item(ancestor, open=True)
+        if self.tree.exists(path):
+            self.tree.selection_set(path)
+            self.tree.see(path)
+    
+    def _new_path_prefix(self):
+        """Initial value for new names: the selected directory."""
+        return f"{self.selected_dir}/" if self.selected_dir else ""
     
     def create_file(self):
         """Create a new file."""
-        filename = simpledialog.askstring("New File", "Enter filename:")
+        filename = simpledialog.askstring(
+            "New File",
+            "Enter filename (use / for folders):",
+            initialvalue=self._new_path_prefix()
+        )
         if not filename:
             return
             
-        success, message = self.sandbox.write_file(filename, "")
+        is_valid, filename = self.sandbox.normalize_path(filename)
+        if is_valid:
+            success, message = self.sandbox.write_file(filename, "")
+        else:
+            success, message = False, filename
         
         if success:
+            self.selected_file = filename
             self.refresh_files()
             # Select the new file
-            for item in self.tree.get_children():
-                if self.tree.item(item, "text") == filename:
-                    self.tree.selection_set(item)
-                    self.tree.see(item)
-                    self.selected_file = filename
-                    if self.on_file_select_callback:
-                        self.on_file_select_callback(filename, open_file=True)
-                    break
+            self._reveal(filename)
+            if self.on_file_select_callback:
+                self.on_file_select_callback(filename, open_file=True)
             if self.status_bar:
                 self.status_bar.show_message(f"Created file: {filename}")
         else:
@@ -269,6 +343,31 @@ class FileExplorer(ttk.Frame):
             else:
                 messagebox.showerror("Error", message)
     
+    def create_folder(self):
+        """Create a new folder."""
+        dirname = simpledialog.askstring(
+            "New Folder",
+            "Enter folder name:",
+            initialvalue=self._new_path_prefix()
+        )
+        if not dirname:
+            return
+        
+        success, message = self.sandbox.make_dir(dirname)
+        
+        if success:
+            _, dirname = self.sandbox.normalize_path(dirname)
+            self.selected_dir = dirname
+            self.refresh_files()
+            self._reveal(dirname)
+            if self.status_bar:
+                self.status_bar.show_message(f"Created folder: {dirname}")
+        else:
+            if self.status_bar:
+                self.status_bar.show_error(message)
+            else:
+                messagebox.showerror("Error", message)
+    
     def rename_file(self):
         """Rename the selected file."""
         if not self.selected_file:
@@ -291,14 +390,11 @@ class FileExplorer(ttk.Frame):
         
         if success:
             old_name = self.selected_file
+            _, new_name = self.sandbox.normalize_path(new_name)
             self.selected_file = new_name
             self.refresh_files()
             # Select the renamed file
-            for item in self.tree.get_children():
-                if self.tree.item(item, "text") == new_name:
-                    self.tree.selection_set(item)
-                    self.tree.see(item)
-                    break
+            self._reveal(new_name)
             if self.status_bar:
                 self.status_bar.show_message(f"Renamed: {old_name} → {new_name}")
         else:
@@ -308,7 +404,10 @@ class FileExplorer(ttk.Frame):
                 messagebox.showerror("Error", message)
     
     def delete_file(self):
-        """Delete the selected file."""
+        """Delete the selected file, or the selected folder if it is empty."""
+        if not self.selected_file and self.selected_dir:
+            self.delete_folder()
+            return
         if not self.selected_file:
             if self.status_bar:
                 self.status_bar.show_error("No file selected")
@@ -338,6 +437,30 @@ class FileExplorer(ttk.Frame):
             else:
                 messagebox.showerror("Error", message)
     
+    def delete_folder(self):
+        """Delete the selected folder; only empty folders can be deleted."""
+        dirname = self.selected_dir
+        confirm = messagebox.askyesno(
+            "Confirm Delete", 
+            f"Are you sure you want to delete the folder {dirname}?"
+        )
+        
+        if not confirm:
+            return
+        
+        success, message = self.sandbox.remove_dir(dirname)
+        
+        if success:
+            self.selected_dir = dirname.rpartition("/")[0]
+            self.refresh_files()
+            if self.status_bar:
+                self.status_bar.show_message(f"Deleted folder: {dirname}")
+        else:
+            if self.status_bar:
+                self.status_bar.show_error(message)
+            else:
+                messagebox.showerror("Error", message)
+    
     def _format_size(self, size_bytes):
         """Format file size in human-readable format."""
         for unit in ['B', 'KB', 'MB']:
@@ -1,10 +1,11 @@
 import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-from PIL import Image, ImageTk
-import threading
+from PIL import Image, ImageFile, ImageTk
 import io
 
+from scheduler import BACKGROUND
+
 class ImageGenPanel(ttk.Frame):
     """Panel for generating and managing images using GenAI."""
     
@@ -14,6 +15,7 @@ class ImageGenPanel(ttk.Frame):
         self.genai = genai_wrapper
         self.sandbox = sandbox_manager
         self.status_bar = status_bar
+        self.async_genai = genai_wrapper.get_async_wrapper()
         self.current_image = None
         
         # Configure the frame
@@ -141,23 +143,32 @@ class ImageGenPanel(ttk.Frame):
         if self.status_bar:
             self.status_bar.start_progress("Generating image...")
         
-        def generate_in_thread():
+        def on_done(future):
+            # Drop the result of an image superseded by a newer request
+            if not self.async_genai.jobs.is_current(job):
+                return
+            if future.cancelled():
+                self.after(0, lambda: self._handle_image_error("Cancelled"))
+                return
             try:
-                # Use only imagen-3.0-generate-002 model
-                success, image, message = self.genai.generate_image(
-                    prompt=prompt,
-                    model="imagen-3.0-generate-002"
-                )
-                
-                # Update UI in main thread
-                self.after(0, lambda: self._handle_image_result(success, image, message))
+                success, image, message = future.result()
             except Exception as e:
-                self.after(0, lambda: self._handle_image_error(str(e)))
-        
-        # Run in thread to avoid UI freeze
-        thread = threading.Thread(target=generate_in_thread)
-        thread.daemon = True
-        thread.start()
+                error = str(e)
+                self.after(0, lambda: self._handle_image_error(error))
+                return
+                
+            # Update UI in main thread
+            self.after(0, lambda: self._handle_image_result(success, image, message))
+        
+        # Run as a cancellable job on the shared GenAI event loop to avoid UI freeze
+        # Use only imagen-3.0-generate-002 model
+        job = self.async_genai.jobs.submit(
+            "Generate image",
+            self.async_genai.generate_image(prompt=prompt, model="imagen-3.0-generate-002"),
+            channel="image_gen",
+            priority=BACKGROUND
+        )
+        job.future.add_done_callback(on_done)
     
     def _handle_image_result(self, success, image, message):
         """Handle the image generation result."""
@@ -231,6 +242,38 @@ class ImageGenPanel(ttk.Frame):
         # Display on canvas
         self.canvas.create_image(x, y, anchor=tk.NW, image=self.photo_image)
     
+    def show_image_file(self, filename):
+        """Display an image file from the sandbox.
+        
+        The file is fed to PIL's incremental parser chunk by chunk, so the
+        encoded image is never held in memory as one copy.
+        
+        Returns:
+            True if the image was loaded
+        """
+        success, chunks = self.sandbox.open_stream(filename, binary_mode=True)
+        if not success:
+            if self.status_bar:
+                self.status_bar.show_error(chunks)
+            return False
+        
+        try:
+            parser = ImageFile.Parser()
+            for chunk in chunks:
+                parser.feed(chunk)
+            image = parser.close()
+        except Exception as e:
+            if self.status_bar:
+                self.status_bar.show_error(f"Error loading image {filename}: {e}")
+            return False
+        
+        self.current_image = image
+        self._display_image(image)
+        self.save_btn.config(state=tk.NORMAL)
+        if self.status_bar:
+            self.status_bar.set_status(f"Opened: {filename} ({image.size[0]}x{image.size[1]})")
+        return True
+    
     def _clear_canvas(self):
         """Clear the canvas and display placeholder text."""
         self.canvas.delete("all")
@@ -1,18 +1,26 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import threading
+import asyncio
+
+from scheduler import BACKGROUND
+
+# Number of semantic index chunks used when generating with "relevant context only"
+RETRIEVAL_TOP_K = 12
 
 class MultiFileGenPanel(ttk.Frame):
     """Panel for generating multiple files from a single prompt."""
     
-    def __init__(self, parent, genai_wrapper, sandbox_manager, status_bar=None):
+    def __init__(self, parent, genai_wrapper, sandbox_manager, status_bar=None, semantic_index=None):
         super().__init__(parent)
         self.parent = parent
         self.genai = genai_wrapper
         self.sandbox = sandbox_manager
         self.status_bar = status_bar
+        self.semantic_index = semantic_index
+        self.async_genai = genai_wrapper.get_async_wrapper()
         self.generated_files = {}
         self.unsaved_files = set()  # Track which files haven't been saved yet
+        self.file_notes = {}  # Planned purpose or error of files without content
         
         # Configure the frame
         self.configure(padding=(10, 5))
@@ -71,6 +79,25 @@ class MultiFileGenPanel(ttk.Frame):
             command=self.clear_interface
         ).pack(side=tk.LEFT, padx=5)
         
+        # Retrieval option - use only the most relevant chunks of existing files
+        self.use_index_var = tk.BooleanVar(value=False)
+        index_check = ttk.Checkbutton(
+            btn_frame,
+            text="Relevant context only (semantic index)",
+            variable=self.use_index_var
+        )
+        index_check.pack(side=tk.LEFT, padx=5)
+        if not self.semantic_index or not self.semantic_index.available:
+            index_check.config(state=tk.DISABLED)
+        
+        # Plan mode: one call for the file list, then one request per file in parallel
+        self.plan_mode_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            btn_frame,
+            text="Plan first, then generate files in parallel",
+            variable=self.plan_mode_var
+        ).pack(side=tk.LEFT, padx=5)
+        
         self.save_all_btn = ttk.Button(
             btn_frame, 
             text="Save All Files", 
@@ -147,30 +174,123 @@ class MultiFileGenPanel(ttk.Frame):
         # Clear previous results
         self.clear_results()
         
-        # Get existing files to provide as context
-        existing_files = {}
-        for filename in self.sandbox.list_files():
-            success, content = self.sandbox.read_file(filename)
-            if success:
-                existing_files[filename] = content
+        use_index = self.use_index_var.get() and self.semantic_index is not None
+        plan_mode = self.plan_mode_var.get()
         
         # Start progress indicator
         if self.status_bar:
             self.status_bar.start_progress("Generating files...")
         
-        def generate_in_thread():
+        def on_done(future):
+            # Drop the result of a generation superseded by a newer one
+            if not self.async_genai.jobs.is_current(job):
+                return
+            if future.cancelled():
+                self.after(0, lambda: self._handle_generation_error("Cancelled"))
+                return
             try:
-                success, files_dict = self.genai.generate_files(instruction, existing_files)
+                success, files_dict = future.result()
+            except Exception as e:
+                error = str(e)
+                self.after(0, lambda: self._handle_generation_error(error))
+                return
                 
-                # Update UI in main thread
-                self.after(0, lambda: self._handle_generation_result(success, files_dict))
+            # Update UI in main thread
+            self.after(0, lambda: self._handle_generation_result(success, files_dict))
+        
+        async def generate():
+            # Get existing text files to provide as context; the prompt builder
+            # ranks and trims them to the model's token budget
+            existing_files = None
+            if use_index:
+                found, excerpts = await asyncio.to_thread(
+                    self.semantic_index.relevant_files, instruction, RETRIEVAL_TOP_K
+                )
+                if found:
+                    existing_files = excerpts
+            if existing_files is None:
+                existing_files = await asyncio.to_thread(self._read_text_files)
+            
+            if plan_mode:
+                def on_progress(filename, status, detail):
+                    self.after(0, lambda: self._on_project_progress(job, filename, status, detail))
+                return await self.async_genai.generate_project(
+                    instruction, existing_files, on_progress=on_progress
+                )
+            
+            # Files are listed as soon as each one is complete in the streamed JSON
+            files_dict = {}
+            try:
+                async for file in self.async_genai.generate_files_stream(instruction, existing_files):
+                    files_dict[file["filename"]] = file["content"]
+                    self.after(0, lambda f=file: self._add_generated_file(job, f["filename"], f["content"]))
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                self.after(0, lambda: self._handle_generation_error(str(e)))
+                if files_dict:
+                    return False, {"error": f"Generation stopped after {len(files_dict)} file(s): {e}"}
+                # Models without structured output support get the text format instead
+                return await self.async_genai.generate_files(instruction, existing_files, structured=False)
+            return True, files_dict
+        
+        # Run as a cancellable job on the shared GenAI event loop to avoid UI freeze
+        job = self.async_genai.jobs.submit(
+            "Generate files", generate(), channel="multi_file_gen", priority=BACKGROUND
+        )
+        job.future.add_done_callback(on_done)
+    
+    def _read_text_files(self):
+        """Read all text files in the sandbox as {filename: content}.
         
-        # Run in thread to avoid UI freeze
-        thread = threading.Thread(target=generate_in_thread)
-        thread.daemon = True
-        thread.start()
+        Large data files contribute only their head and tail.
+        """
+        existing_files = {}
+        for filename in self.sandbox.list_text_files():
+            success, content = self.sandbox.read_excerpt(filename)
+            if success:
+                existing_files[filename] = content
+        return existing_files
+    
+    def _set_file_status(self, filename, status):
+        """Show a file in the list with the given status, adding it if needed."""
+        for item_id in self.file_list.get_children():
+            if self.file_list.item(item_id)["text"] == filename:
+                self.file_list.item(item_id, values=(status,))
+                return
+        self.file_list.insert("", "end", text=filename, values=(status,))
+    
+    def _add_generated_file(self, job, filename, content):
+        """List a generated file while the rest are still being generated."""
+        if not self.async_genai.jobs.is_current(job) or filename == "error":
+            return
+        if filename not in self.generated_files:
+            self._set_file_status(filename, "Unsaved")
+            self.unsaved_files.add(filename)
+        self.generated_files[filename] = content
+        self.save_all_btn.config(state=tk.NORMAL)
+        if self.status_bar:
+            self.status_bar.set_status(f"Generating files... {len(self.generated_files)} received")
+    
+    def _on_project_progress(self, job, filename, status, detail):
+        """Update the per-file status of a planned project generation."""
+        if not self.async_genai.jobs.is_current(job):
+            return
+        if status == "done":
+            self.file_notes.pop(filename, None)
+            self._add_generated_file(job, filename, detail)
+            return
+        
+        self._set_file_status(filename, status.capitalize())
+        if status == "planned":
+            self.file_notes[filename] = f"Planned: {detail}"
+        elif status == "failed":
+            self.file_notes[filename] = f"Generation failed: {detail}"
+        
+        total = len(self.file_list.get_children())
+        if self.status_bar:
+            self.status_bar.set_status(
+                f"Generating files... {len(self.generated_files)}/{total} done"
+            )
     
     def _handle_generation_result(self, success, files_dict):
         """Handle the file generation result."""
@@ -184,19 +304,13 @@ class MultiFileGenPanel(ttk.Frame):
                     self.status_bar.show_error("No files were generated")
                 return
             
-            # Store generated files
-            self.generated_files = files_dict
-            self.unsaved_files = set(files_dict.keys())
-            
-            # Remove 'error' key from unsaved files if it exists
-            if 'error' in self.unsaved_files:
-                self.unsaved_files.remove('error')
-            
-            # Populate file list
+            # Streamed files are already listed (and may be saved); add the rest
             for filename in sorted(files_dict.keys()):
-                if filename == "error":  # Skip error messages
+                if filename == "error" or filename in self.generated_files:  # Skip error messages
                     continue
-                self.file_list.insert("", "end", text=filename, values=("Unsaved",))
+                self.generated_files[filename] = files_dict[filename]
+                self.unsaved_files.add(filename)
+                self._set_file_status(filename, "Unsaved")
             
             # Enable Save All button if there are files to save
             if self.unsaved_files:
@@ -204,8 +318,14 @@ class MultiFileGenPanel(ttk.Frame):
             
             # Display success message
             file_count = len(files_dict)
+            failed = [name for name, note in self.file_notes.items() if note.startswith("Generation failed")]
             if self.status_bar:
-                self.status_bar.show_message(f"Generated {file_count} file(s)")
+                if failed:
+                    self.status_bar.show_message(
+                        f"Generated {file_count} file(s), {len(failed)} failed: {', '.join(failed)}"
+                    )
+                else:
+                    self.status_bar.show_message(f"Generated {file_count} file(s)")
         else:
             # Show error
             error_msg = files_dict.get("error", "Unknown error during file generation")
@@ -231,6 +351,14 @@ class MultiFileGenPanel(ttk.Frame):
         item = self.file_list.item(selection[0])
         filename = item["text"]
         
+        if filename in self.file_notes and filename not in self.generated_files:
+            # Not generated (yet): show what the plan says about it, or the error
+            self.preview_text.config(state=tk.NORMAL)
+            self.preview_text.delete("1.0", tk.END)
+            self.preview_text.insert(tk.END, self.file_notes[filename])
+            self.preview_text.config(state=tk.DISABLED)
+            self.save_file_btn.config(state=tk.DISABLED)
+        
         if filename in self.generated_files:
             # Display file content in preview
             self.preview_text.config(state=tk.NORMAL)
@@ -289,56 +417,49 @@ class MultiFileGenPanel(ttk.Frame):
                 messagebox.showerror("Error", message)
     
     def save_all_files(self):
-        """Save all generated files to sandbox."""
-        saved_count = 0
-        error_count = 0
-        
-        # Make a copy of unsaved_files to iterate over while modifying the original
-        files_to_save = list(self.unsaved_files)
-        
-        for filename in files_to_save:
+        """Save all generated files to sandbox as one transaction."""
+        # Collect everything first so the batch is written (and flushed) together
+        files_to_save = {}
+        for filename in self.unsaved_files:
             if filename == "error":  # Skip error messages
                 continue
                 
             content = self.generated_files.get(filename, "")
-            if not content:
-                continue
+            if content:
+                files_to_save[filename] = content
                 
-            success, message = self.sandbox.write_file(filename, content)
+        if not files_to_save:
+            return
             
-            if success:
-                saved_count += 1
-                
-                # Remove from unsaved files
-                self.unsaved_files.remove(filename)
+        # Either every file is saved or, on a failure, none of them is changed
+        success, message = self.sandbox.write_many(files_to_save)
                 
-                # Find tree item and update status
-                for item_id in self.file_list.get_children():
-                    item = self.file_list.item(item_id)
-                    if item["text"] == filename:
-                        self.file_list.item(item_id, values=("Saved",))
-                        break
+        if not success:
+            if self.status_bar:
+                self.status_bar.show_error(message)
             else:
-                error_count += 1
+                messagebox.showerror("Error", message)
+            return
+                
+        for filename in files_to_save:
+            self.unsaved_files.discard(filename)
         
-        # Update UI status
-        if saved_count > 0:
-            # Disable save buttons if all files are saved
-            if not self.unsaved_files:
-                self.save_all_btn.config(state=tk.DISABLED)
-                self.save_file_btn.config(state=tk.DISABLED)
+        # Update tree item statuses
+        for item_id in self.file_list.get_children():
+            if self.file_list.item(item_id)["text"] in files_to_save:
+                self.file_list.item(item_id, values=("Saved",))
             
-            # Show success message
-            if self.status_bar:
-                if error_count > 0:
-                    self.status_bar.show_message(
-                        f"Saved {saved_count} file(s), {error_count} failed"
-                    )
-                else:
-                    self.status_bar.show_message(f"Saved all {saved_count} file(s)")
+        # Disable save buttons if all files are saved
+        if not self.unsaved_files:
+            self.save_all_btn.config(state=tk.DISABLED)
+            self.save_file_btn.config(state=tk.DISABLED)
             
-            # Refresh file list in parent application
-            self.event_generate("<<FilesGenerated>>")
+        # Show success message
+        if self.status_bar:
+            self.status_bar.show_message(f"Saved all {len(files_to_save)} file(s)")
+        
+        # Refresh file list in parent application
+        self.event_generate("<<FilesGenerated>>")
     
     def clear_results(self):
         """Clear the results area."""
@@ -354,6 +475,7 @@ class MultiFileGenPanel(ttk.Frame):
         # Clear generated files
         self.generated_files = {}
         self.unsaved_files = set()
+        self.file_notes = {}
         
         # Disable buttons
         self.save_file_btn.config(state=tk.DISABLED)
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, simpledialog
 import json
 import os
+import time
 
 class SettingsPanel(ttk.Frame):
     """Settings panel for configuring models and system prompts."""
@@ -25,7 +26,9 @@ class SettingsPanel(ttk.Frame):
             "max_output_tokens": 8192,
             "top_p": 0.95,
             "top_k": 40,
-            "dark_mode": False
+            "dark_mode": False,
+            "auto_route": False,
+            "hedge_requests": False
         }
         
         # Fetch available models from the GenAI wrapper
@@ -39,6 +42,8 @@ class SettingsPanel(ttk.Frame):
         self.top_p_var = tk.DoubleVar(value=self.settings["top_p"])
         self.top_k_var = tk.IntVar(value=self.settings["top_k"])
         self.dark_mode_var = tk.BooleanVar(value=self.settings.get("dark_mode", False))
+        self.auto_route_var = tk.BooleanVar(value=self.settings.get("auto_route", False))
+        self.hedge_var = tk.BooleanVar(value=self.settings.get("hedge_requests", False))
         
         # Load existing settings
         self.load_settings()
@@ -51,6 +56,8 @@ class SettingsPanel(ttk.Frame):
         self.top_p_var.set(self.settings["top_p"])
         self.top_k_var.set(self.settings["top_k"])
         self.dark_mode_var.set(self.settings.get("dark_mode", False))
+        self.auto_route_var.set(self.settings.get("auto_route", False))
+        self.hedge_var.set(self.settings.get("hedge_requests", False))
         
         # Update the genai wrapper with current settings
         self.apply_settings_to_genai()
@@ -60,6 +67,25 @@ class SettingsPanel(ttk.Frame):
         
         # Create layout
         self._create_layout()
+        
+        # Model lists are refreshed in the background after startup
+        self.genai.add_models_listener(self._on_models_changed)
+    
+    def _on_models_changed(self):
+        """Called from the model catalogue refresh thread when the lists change."""
+        try:
+            self.after(0, self._refresh_model_lists)
+        except (tk.TclError, RuntimeError):
+            # Panel already destroyed
+            self.genai.remove_models_listener(self._on_models_changed)
+    
+    def _refresh_model_lists(self):
+        """Update the model choices after a catalogue refresh."""
+        self.available_models = self._get_available_models()
+        self.model_combo.config(values=self.genai.get_available_text_models())
+        self._refresh_health_table()
+        if self.status_bar:
+            self.status_bar.set_status("Model list updated")
     
     def _get_available_models(self):
         """Get available models from the GenAI wrapper."""
@@ -132,6 +158,21 @@ class SettingsPanel(ttk.Frame):
         )
         self.test_model_btn.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
         
+        # Per-request model routing and hedging
+        request_options = ttk.Frame(self.model_frame)
+        request_options.grid(row=1, column=2, padx=5, pady=5, sticky=tk.W)
+        ttk.Checkbutton(
+            request_options,
+            text="Route requests automatically (faster models for small tasks, "
+                 "stronger ones for multi-file generation)",
+            variable=self.auto_route_var
+        ).pack(anchor=tk.W)
+        ttk.Checkbutton(
+            request_options,
+            text="Hedge slow requests (also ask a fast fallback model, use the first answer)",
+            variable=self.hedge_var
+        ).pack(anchor=tk.W)
+        
         # Fix combobox style for dark mode
         if self.settings.get("dark_mode", False):
             self.model_combo.config(foreground="black")
@@ -270,6 +311,9 @@ class SettingsPanel(ttk.Frame):
         )
         top_k_desc.grid(row=8, column=2, sticky=tk.W, padx=5, pady=5)
         
+        # Model Health tab
+        self._create_health_tab()
+        
         # System Prompt tab
         self.prompt_frame = ttk.Frame(self.notebook, padding=10)
         self.notebook.add(self.prompt_frame, text="System Prompt")
@@ -357,6 +401,117 @@ class SettingsPanel(ttk.Frame):
             command=self.reset_to_defaults
         ).pack(side=tk.RIGHT, padx=5)
     
+    def _create_health_tab(self):
+        """Create the tab showing probe results for all text models."""
+        self.health_frame = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(self.health_frame, text="Model Health")
+        
+        ttk.Label(
+            self.health_frame,
+            text="Probe all text models with a tiny request to see which ones work and how fast they answer.",
+            wraplength=500,
+            font=("Default", 9)
+        ).pack(anchor=tk.W, pady=(0, 5))
+        
+        # Results table
+        table_frame = ttk.Frame(self.health_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.health_table = ttk.Treeview(
+            table_frame,
+            columns=("status", "latency", "checked"),
+            selectmode="browse"
+        )
+        self.health_table.heading("#0", text="Model")
+        self.health_table.heading("status", text="Status")
+        self.health_table.heading("latency", text="Latency")
+        self.health_table.heading("checked", text="Checked")
+        self.health_table.column("#0", width=240)
+        self.health_table.column("status", width=100, anchor=tk.CENTER)
+        self.health_table.column("latency", width=80, anchor=tk.E)
+        self.health_table.column("checked", width=80, anchor=tk.CENTER)
+        
+        health_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.health_table.yview)
+        self.health_table.configure(yscrollcommand=health_scrollbar.set)
+        self.health_table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        health_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Buttons
+        health_btn_frame = ttk.Frame(self.health_frame)
+        health_btn_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        self.check_models_btn = ttk.Button(
+            health_btn_frame,
+            text="Check All Models",
+            command=self.check_all_models
+        )
+        self.check_models_btn.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(
+            health_btn_frame,
+            text="Use Fastest",
+            command=self.use_fastest_model
+        ).pack(side=tk.LEFT, padx=5)
+        
+        self._refresh_health_table()
+    
+    def _refresh_health_table(self):
+        """Fill the health table from the recorded probe results."""
+        self.health_table.delete(*self.health_table.get_children())
+        for model in self.genai.get_available_text_models():
+            entry = self.genai.model_health.get(model)
+            if entry is None:
+                values = ("unknown", "", "")
+            else:
+                status = "OK" if entry["ok"] else "unavailable"
+                latency = f"{entry['latency'] * 1000:.0f} ms" if entry["latency"] is not None else ""
+                checked = time.strftime("%H:%M", time.localtime(entry["checked_at"]))
+                values = (status, latency, checked)
+            self.health_table.insert("", tk.END, text=model, values=values)
+    
+    def check_all_models(self):
+        """Probe all text models concurrently and show the results."""
+        models = self.genai.get_available_text_models()
+        self.check_models_btn.config(state=tk.DISABLED)
+        if self.status_bar:
+            self.status_bar.start_progress(f"Checking {len(models)} models...")
+        
+        def on_done(future):
+            if future.cancelled():
+                message = "Model check cancelled"
+            else:
+                try:
+                    results = future.result()
+                    working = sum(1 for entry in results.values() if entry and entry["ok"])
+                    message = f"{working} of {len(models)} models available"
+                except Exception as e:
+                    message = f"Model check failed: {e}"
+            
+            def update_ui():
+                self.check_models_btn.config(state=tk.NORMAL)
+                self._refresh_health_table()
+                if self.status_bar:
+                    self.status_bar.stop_progress()
+                    self.status_bar.show_message(message)
+            
+            self.after(0, update_ui)
+        
+        # Run as a cancellable job on the shared GenAI event loop to avoid UI freeze
+        async_genai = self.genai.get_async_wrapper()
+        job = async_genai.jobs.submit("Check models", async_genai.probe_models(models), channel="model_check")
+        job.future.add_done_callback(on_done)
+    
+    def use_fastest_model(self):
+        """Select the fastest working model from the last health check."""
+        success, message = self.genai.select_fastest_model()
+        if success:
+            self.model_var.set(self.genai.model)
+            self.model_description.config(text=self._get_model_description(self.genai.model))
+            if self.status_bar:
+                self.status_bar.show_message(message)
+        elif self.status_bar:
+            self.status_bar.show_error(message)
+    
     def _get_model_description(self, model_name):
         """Get a description for the specified text model."""
         model_name = model_name.lower()
@@ -413,6 +568,8 @@ class SettingsPanel(ttk.Frame):
         self.settings["top_k"] = self.top_k_var.get()
         self.settings["system_prompt"] = self.system_prompt.get("1.0", tk.END).strip()
         self.settings["dark_mode"] = self.dark_mode_var.get()
+        self.settings["auto_route"] = self.auto_route_var.get()
+        self.settings["hedge_requests"] = self.hedge_var.get()
         
         # Always use imagen-3.0-generate-002 for image generation
         self.settings["image_model"] = "imagen-3.0-generate-002"
@@ -438,6 +595,8 @@ class SettingsPanel(ttk.Frame):
             "top_p": self.settings["top_p"],
             "top_k": self.settings["top_k"]
         }
+        self.genai.routing_enabled = self.settings.get("auto_route", False)
+        self.genai.hedging_enabled = self.settings.get("hedge_requests", False)
     
     def reset_to_defaults(self):
         """Reset settings to defaults."""
@@ -449,7 +608,9 @@ class SettingsPanel(ttk.Frame):
             "max_output_tokens": 8192,
             "top_p": 0.95,
             "top_k": 40,
-            "dark_mode": False
+            "dark_mode": False,
+            "auto_route": False,
+            "hedge_requests": False
         }
         
         # Update UI
@@ -462,6 +623,8 @@ class SettingsPanel(ttk.Frame):
         self._update_top_p_label(default_settings["top_p"])
         self.top_k_var.set(default_settings["top_k"])
         self.dark_mode_var.set(default_settings["dark_mode"])
+        self.auto_route_var.set(default_settings["auto_route"])
+        self.hedge_var.set(default_settings["hedge_requests"])
         
         self.system_prompt.delete("1.0", tk.END)
         self.system_prompt.insert("1.0", default_settings["system_prompt"])
@@ -505,11 +668,18 @@ class SettingsPanel(ttk.Frame):
         if self.status_bar:
             self.status_bar.start_progress(f"Testing model {selected_model}...")
         
-        def test_in_thread():
-            success, message = self.genai.test_model_availability(selected_model)
+        def on_done(future):
+            if future.cancelled():
+                success, message = False, f"Test of {selected_model} cancelled"
+            else:
+                try:
+                    success, message = future.result()
+                except Exception as e:
+                    success, message = False, f"Model {selected_model} is not available: {e}"
             
             # Update UI in the main thread
             def update_ui():
+                self._refresh_health_table()
                 if self.status_bar:
                     self.status_bar.stop_progress()
                     
@@ -522,8 +692,9 @@ class SettingsPanel(ttk.Frame):
             
             self.after(0, update_ui)
         
-        # Run in thread to avoid UI freeze
-        import threading
-        thread = threading.Thread(target=test_in_thread)
-        thread.daemon = True
-        thread.start() 
\ No newline at end of file
+        # Run on the shared GenAI event loop to avoid UI freeze
+        async_genai = self.genai.get_async_wrapper()
+        job = async_genai.jobs.submit(
+            f"Test {selected_model}", async_genai.test_model_availability(selected_model)
+        )
+        job.future.add_done_callback(on_done)
@@ -34,6 +34,19 @@ class StatusBar(ttk.Frame):
         self.progress.grid(row=0, column=1, padx=5, pady=2)
         self.progress.grid_remove()  # Hide by default
         
+        # Running jobs view, shown once attach_jobs() is called and jobs are running
+        self.jobs = None
+        self.jobs_var = tk.StringVar()
+        self.jobs_button = ttk.Menubutton(self, textvariable=self.jobs_var, direction="above")
+        self.jobs_menu = tk.Menu(self.jobs_button, tearoff=0, postcommand=self._build_jobs_menu)
+        self.jobs_button["menu"] = self.jobs_menu
+        self.jobs_button.grid(row=0, column=2, padx=5, pady=2)
+        self.jobs_button.grid_remove()
+        
+        # Rate-limit waits in progress and the message they replaced
+        self._rate_waits = 0
+        self._status_before_wait = None
+        
         # Set initial status
         self.set_status("Ready")
         
@@ -83,4 +96,55 @@ class StatusBar(ttk.Frame):
             self.status_label.configure(style=original_style)
             self.set_status(previous_message)
             
-        self.after(duration, reset) 
\ No newline at end of file
+        self.after(duration, reset) 
+    
+    def show_rate_limit_wait(self, model, seconds):
+        """Show (seconds > 0) or clear (seconds == 0) a rate-limit wait notice.
+        
+        Registered as a RateLimiter wait listener, so it is called from worker
+        threads and the async loop; the update is scheduled on the Tk thread.
+        """
+        def update():
+            if seconds > 0:
+                if self._rate_waits == 0:
+                    self._status_before_wait = self.status_var.get()
+                self._rate_waits += 1
+                self.set_status(f"Rate limit: waiting {seconds:.0f}s for {model}...")
+            elif self._rate_waits > 0:
+                self._rate_waits -= 1
+                if self._rate_waits == 0:
+                    self.set_status(self._status_before_wait or "Ready")
+                    self._status_before_wait = None
+        
+        self.after(0, update)
+    
+    def attach_jobs(self, job_manager):
+        """Show the running jobs of a JobManager, with a menu to cancel them."""
+        self.jobs = job_manager
+        # Job listeners run on the GenAI event loop; update on the Tk thread
+        job_manager.add_listener(lambda: self.after(0, self._update_jobs))
+        self._update_jobs()
+    
+    def _update_jobs(self):
+        """Refresh the running jobs indicator."""
+        count = len(self.jobs.running()) if self.jobs else 0
+        if count:
+            self.jobs_var.set(f"{count} job{'s' if count != 1 else ''} running")
+            self.jobs_button.grid()
+        else:
+            self.jobs_button.grid_remove()
+    
+    def _build_jobs_menu(self):
+        """Fill the jobs menu with the running jobs when it is opened."""
+        self.jobs_menu.delete(0, tk.END)
+        running = self.jobs.running() if self.jobs else []
+        for job in running:
+            self.jobs_menu.add_command(
+                label=f"Cancel {job.name} ({job.elapsed():.0f}s)",
+                command=lambda job_id=job.id: self.jobs.cancel(job_id)
+            )
+        if len(running) > 1:
+            self.jobs_menu.add_separator()
+            self.jobs_menu.add_command(label="Cancel All", command=self.jobs.cancel_all)
+        if not running:
+            self.jobs_menu.add_command(label="No running jobs", state=tk.DISABLED)
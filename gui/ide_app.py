@@ -11,6 +11,7 @@ from gui.components.status_bar import StatusBar
 from gui.components.settings_panel import SettingsPanel
 from gui.components.image_gen_panel import ImageGenPanel
 from gui.components.multi_file_gen_panel import MultiFileGenPanel
+from semantic_index import SemanticIndex
 
 class IDEApp:
     """Main application class for the GUI version of Sandbox IDE."""
@@ -18,6 +19,7 @@ class IDEApp:
     def __init__(self, sandbox_manager, genai_wrapper):
         self.sandbox = sandbox_manager
         self.genai = genai_wrapper
+        self.semantic_index = SemanticIndex(sandbox_manager, genai_wrapper)
         self.root = None
         self.file_explorer_visible = True
         self.dark_mode = self._load_dark_mode_setting()
@@ -129,6 +131,15 @@ class IDEApp:
         self.status_bar = StatusBar(self.root)
         self.status_bar.grid(row=2, column=0, sticky="ew")
         
+        # Show when AI requests are queued by the client-side rate limiter
+        self.genai.rate_limiter.add_wait_listener(self.status_bar.show_rate_limit_wait)
+        
+        # Cached file contexts are dropped as soon as the file is written
+        self.sandbox.add_change_listener(self.genai.context_cache.invalidate_file)
+        
+        # Running AI jobs, with a menu to cancel them
+        self.status_bar.attach_jobs(self.genai.get_async_wrapper().jobs)
+        
         # Create menu
         self._create_menu()
         
@@ -179,7 +190,10 @@ class IDEApp:
         self.editor_pane.add(self.editor, weight=2)
         
         # Create AI tools panel
-        self.ai_tools = AIToolsPanel(self.editor_pane, self.genai, self.editor, self.status_bar, self.sandbox)
+        self.ai_tools = AIToolsPanel(
+            self.editor_pane, self.genai, self.editor, self.status_bar, self.sandbox,
+            semantic_index=self.semantic_index
+        )
         self.editor_pane.add(self.ai_tools, weight=1)
         
         # Create multi-file generator tab
@@ -187,7 +201,8 @@ class IDEApp:
             self.workspace_notebook, 
             self.genai, 
             self.sandbox, 
-            self.status_bar
+            self.status_bar,
+            semantic_index=self.semantic_index
         )
         self.workspace_notebook.add(self.multi_file_gen, text="Multi-File Generator")
         
@@ -286,6 +301,11 @@ class IDEApp:
     def _on_file_selected(self, filename, open_file=False):
         """Handle file selection in the file explorer."""
         if open_file:
+            if self.sandbox.is_binary_file(filename):
+                # Images open in the image tab instead of the text editor
+                self.workspace_notebook.select(2)
+                self.image_gen.show_image_file(filename)
+                return
             # Switch to editor tab if not already there
             self.workspace_notebook.select(0)
             self.editor.open_file(filename)
@@ -330,7 +350,7 @@ class IDEApp:
     
     def _on_refresh_files(self):
         """Refresh the file list."""
-        self.file_explorer.refresh_files()
+        self.file_explorer.refresh_files(force=True)
     
     def _on_exit(self):
         """Exit the application."""
@@ -340,6 +360,9 @@ class IDEApp:
                 return
         
         # Destroy the main window
+        self.genai.get_async_wrapper().jobs.cancel_all()
+        self.genai.rate_limiter.remove_wait_listener(self.status_bar.show_rate_limit_wait)
+        self.sandbox.remove_change_listener(self.genai.context_cache.invalidate_file)
         self.root.destroy()
     
     def _on_undo(self):
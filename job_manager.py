@@ -0,0 +1,170 @@
+import time
+import itertools
+import threading
+import concurrent.futures
+from typing import Optional, List, Callable, Awaitable, Any
+
+from scheduler import with_priority
+
+# Job states
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """A submitted AI request with an id, a status and a cancel handle."""
+    
+    def __init__(self, job_id: int, name: str, channel: Optional[str], seq: int,
+                 future: concurrent.futures.Future):
+        """Initialize the job.
+        
+        Args:
+            job_id: Unique id of the job
+            name: Short description shown to the user
+            channel: Result slot the job writes to, e.g. an output widget
+            seq: Sequence number of the job within its channel
+            future: Future of the coroutine running on the event loop
+        """
+        self.id = job_id
+        self.name = name
+        self.channel = channel
+        self.seq = seq
+        self.future = future
+        self.status = RUNNING
+        self.error = ""
+        self.started_at = time.time()
+        self.finished_at = None
+    
+    @property
+    def cancelled(self) -> bool:
+        """Whether the job was cancelled."""
+        return self.status == CANCELLED
+    
+    def elapsed(self) -> float:
+        """Seconds since the job started, or its total run time once finished."""
+        return (self.finished_at or time.time()) - self.started_at
+    
+    def cancel(self) -> bool:
+        """Cancel the job; the coroutine is interrupted at its next await.
+        
+        Returns:
+            True if the job was still running
+        """
+        return self.future.cancel()
+
+
+class JobManager:
+    """Registry of running AI jobs.
+    
+    Every job gets an id and, if it writes to a channel (such as an output
+    widget), a sequence number within that channel. Starting a new job in a
+    channel cancels the older one, and is_current() lets result handlers
+    drop anything that finishes after a newer job was started.
+    """
+    
+    def __init__(self, submit: Callable[[Awaitable[Any]], concurrent.futures.Future]):
+        """Initialize the manager.
+        
+        Args:
+            submit: Function scheduling a coroutine on the event loop, e.g.
+                AsyncGenAIWrapper.submit
+        """
+        self._submit = submit
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = {}  # id -> Job, running jobs only
+        self._latest = {}  # channel -> latest sequence number
+        self._listeners = []
+    
+    def submit(self, name: str, coro: Awaitable[Any], channel: Optional[str] = None,
+               supersede: bool = True, priority: Optional[int] = None) -> Job:
+        """Start a coroutine as a job.
+        
+        Args:
+            name: Short description shown in the jobs view
+            coro: The coroutine to run
+            channel: Optional result slot; newer jobs in a channel make older ones stale
+            supersede: Cancel older running jobs in the same channel
+            priority: Optional scheduler priority class for the job's requests
+        
+        Returns:
+            The new job
+        """
+        if priority is not None:
+            coro = with_priority(coro, priority)
+        with self._lock:
+            seq = self._latest.get(channel, 0) + 1
+            if channel is not None:
+                self._latest[channel] = seq
+            stale = [job for job in self._jobs.values() if supersede and channel is not None
+                     and job.channel == channel]
+            job = Job(next(self._ids), name, channel, seq, self._submit(coro))
+            self._jobs[job.id] = job
+        
+        for old in stale:
+            old.cancel()
+        job.future.add_done_callback(lambda future: self._finished(job))
+        self._notify()
+        return job
+    
+    def _finished(self, job: Job) -> None:
+        """Record the outcome of a job when its future completes."""
+        if job.future.cancelled():
+            job.status = CANCELLED
+        elif job.future.exception() is not None:
+            job.status = FAILED
+            job.error = str(job.future.exception())
+        else:
+            job.status = DONE
+        job.finished_at = time.time()
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        self._notify()
+    
+    def is_current(self, job: Job) -> bool:
+        """Whether no newer job has been started in the job's channel."""
+        if job.channel is None:
+            return True
+        with self._lock:
+            return self._latest.get(job.channel) == job.seq
+    
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a running job by id.
+        
+        Returns:
+            True if the job was found and cancelled
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job is not None and job.cancel()
+    
+    def cancel_all(self) -> int:
+        """Cancel every running job.
+        
+        Returns:
+            Number of jobs cancelled
+        """
+        return sum(1 for job in self.running() if job.cancel())
+    
+    def running(self) -> List[Job]:
+        """Get the running jobs, oldest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.id)
+    
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Register a callback run (on any thread) whenever a job starts or finishes."""
+        self._listeners.append(callback)
+    
+    def remove_listener(self, callback: Callable[[], None]) -> None:
+        """Unregister a callback added with add_listener."""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+    
+    def _notify(self) -> None:
+        for callback in list(self._listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in job listener: {e}")
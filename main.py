@@ -21,6 +21,8 @@ def main():
                         help="Google GenAI API key (defaults to GOOGLE_API_KEY env var)")
     parser.add_argument("--gui", action="store_true", 
                         help="Launch graphical interface instead of CLI")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disable the AI response cache")
     
     args = parser.parse_args()
     
@@ -39,6 +41,7 @@ def main():
             return 1
         
         genai_wrapper = GenAIWrapper(api_key)
+        genai_wrapper.cache_enabled = not args.no_cache
     except Exception as e:
         print(f"Error setting up GenAI: {e}")
         return 1
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from typing import Optional, Dict, Any, List
+
+
+class ModelHealth:
+    """Persisted table of per-model availability and probe latency.
+    
+    Each entry records whether the last probe of a model succeeded, how long
+    it took and when it ran. Entries older than the TTL are ignored.
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None, ttl_seconds: float = 30 * 60):
+        """Initialize the health table.
+        
+        Args:
+            cache_dir: Directory for model_health.json, or None to keep results in memory
+            ttl_seconds: Age after which a probe result is considered stale
+        """
+        self.ttl_seconds = ttl_seconds
+        self.path = os.path.join(cache_dir, "model_health.json") if cache_dir else None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time, newest snapshot last
+        self._entries = {}  # model -> {"ok", "latency", "checked_at", "error"}
+        self._load()
+    
+    def _load(self) -> None:
+        """Load persisted results, if any."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            print(f"Error loading model health: {e}")
+    
+    def save(self) -> None:
+        """Write the results to disk.
+        
+        Safe to call from concurrent probe threads: saves are serialized and
+        each writes its own temp file before replacing the table.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                entries = dict(self._entries)
+            temp_path = None
+            try:
+                directory = os.path.dirname(self.path)
+                os.makedirs(directory, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(prefix=".model_health.", suffix=".tmp", dir=directory)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, indent=2)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                print(f"Error saving model health: {e}")
+                if temp_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
+    
+    def record(self, model: str, ok: bool, latency: Optional[float], error: str = "",
+               save: bool = True) -> None:
+        """Record the outcome of a probe.
+        
+        Args:
+            model: Model name
+            ok: Whether the model answered
+            latency: Round-trip time in seconds, or None if unknown
+            error: Error message for failed probes
+            save: Write the table to disk immediately
+        """
+        with self._lock:
+            self._entries[model] = {
+                "ok": ok,
+                "latency": latency,
+                "checked_at": time.time(),
+                "error": error
+            }
+        if save:
+            self.save()
+    
+    def get(self, model: str) -> Optional[Dict[str, Any]]:
+        """Get the fresh probe result for a model, or None if unknown or stale."""
+        with self._lock:
+            entry = self._entries.get(model)
+        if entry is None or time.time() - entry["checked_at"] > self.ttl_seconds:
+            return None
+        return entry
+    
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """Get all fresh probe results keyed by model name."""
+        with self._lock:
+            models = list(self._entries)
+        results = {}
+        for model in models:
+            entry = self.get(model)
+            if entry is not None:
+                results[model] = entry
+        return results
+    
+    def is_healthy(self, model: str) -> Optional[bool]:
+        """Whether the last fresh probe of a model succeeded, or None if unknown."""
+        entry = self.get(model)
+        return None if entry is None else entry["ok"]
+    
+    def fastest(self, models: Optional[List[str]] = None) -> Optional[str]:
+        """Get the working model with the lowest probe latency.
+        
+        Args:
+            models: Optional list of candidate models, defaults to all probed models
+        
+        Returns:
+            Model name, or None if no candidate has a fresh successful probe
+        """
+        best, best_latency = None, None
+        for model, entry in self.results().items():
+            if models is not None and model not in models:
+                continue
+            if not entry["ok"] or entry["latency"] is None:
+                continue
+            if best_latency is None or entry["latency"] < best_latency:
+                best, best_latency = model, entry["latency"]
+        return best
+    
+    def clear(self) -> None:
+        """Forget all probe results."""
+        with self._lock:
+            self._entries = {}
+        self.save()
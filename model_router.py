@@ -0,0 +1,192 @@
+import os
+import json
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, List, Callable
+
+
+# Task names passed by GenAIWrapper
+TASKS = ["ask", "explain", "refactor", "docs", "improve", "modify", "generate_files",
+         "plan_project", "generate_file"]
+
+# Default routing rules, checked in order. A rule matches when the task is in
+# "tasks" (or "tasks" is omitted) and the prompt size is within min/max_tokens.
+# "prefer" lists model name fragments in order of preference; the first
+# available, healthy model whose p95 latency is within "max_p95" wins.
+DEFAULT_RULES = [
+    {
+        "name": "long context",
+        "min_tokens": 100000,
+        "prefer": ["2.5-pro", "1.5-pro", "2.5-flash", "2.0-flash"]
+    },
+    {
+        "name": "multi-file generation",
+        "tasks": ["generate_files", "generate_file"],
+        "prefer": ["2.5-pro", "2.0-pro", "1.5-pro"]
+    },
+    {
+        "name": "project planning",
+        "tasks": ["plan_project"],
+        "prefer": ["2.5-flash", "2.0-flash", "1.5-flash"],
+        "max_p95": 20.0
+    },
+    {
+        "name": "short explanations",
+        "tasks": ["ask", "explain", "docs"],
+        "max_tokens": 2000,
+        "prefer": ["flash-lite", "2.0-flash", "2.5-flash", "1.5-flash"],
+        "max_p95": 8.0
+    },
+    {
+        "name": "small edits",
+        "tasks": ["refactor", "modify", "improve"],
+        "max_tokens": 8000,
+        "prefer": ["2.5-flash", "2.0-flash", "1.5-flash"],
+        "max_p95": 20.0
+    }
+]
+
+
+class ModelRouter:
+    """Chooses a model per request from rules and observed latency.
+    
+    Latencies of recent calls are kept per model so rules can skip models
+    that are currently slow, and probe results from ModelHealth are used to
+    skip models that are known not to work.
+    """
+    
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, window: int = 50,
+                 health_check: Optional[Callable[[str], Optional[bool]]] = None):
+        """Initialize the router.
+        
+        Args:
+            rules: Routing rules, defaults to DEFAULT_RULES
+            window: Number of recent latencies kept per model
+            health_check: Optional function returning False for models known to be down
+        """
+        self.rules = list(rules) if rules is not None else list(DEFAULT_RULES)
+        self.window = window
+        self.health_check = health_check
+        self._lock = threading.Lock()
+        self._latencies = {}  # model -> deque of seconds
+    
+    def load_rules(self, path: str) -> bool:
+        """Replace the rules with a JSON list from a file, if it exists.
+        
+        Args:
+            path: Path of the rules file
+        
+        Returns:
+            True if rules were loaded
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rules = json.load(f)
+            if not isinstance(rules, list):
+                raise ValueError("rules file must contain a JSON list")
+            self.rules = rules
+            return True
+        except Exception as e:
+            print(f"Error loading routing rules: {e}")
+            return False
+    
+    def record_latency(self, model: str, seconds: float) -> None:
+        """Record the duration of a completed call."""
+        with self._lock:
+            samples = self._latencies.setdefault(model, deque(maxlen=self.window))
+            samples.append(seconds)
+    
+    def sample_count(self, model: str) -> int:
+        """Number of recorded latencies for a model."""
+        with self._lock:
+            return len(self._latencies.get(model, ()))
+    
+    def percentile(self, model: str, percent: float) -> Optional[float]:
+        """Get a latency percentile for a model, or None without samples.
+        
+        Args:
+            model: Model name
+            percent: Percentile between 0 and 100
+        
+        Returns:
+            Latency in seconds
+        """
+        with self._lock:
+            samples = list(self._latencies.get(model, ()))
+        return self._percentile(samples, percent)
+    
+    @staticmethod
+    def _percentile(samples: List[float], percent: float) -> Optional[float]:
+        """Percentile of a list of latencies, or None if it is empty."""
+        if not samples:
+            return None
+        samples = sorted(samples)
+        index = min(len(samples) - 1, int(round(percent / 100.0 * (len(samples) - 1))))
+        return samples[index]
+    
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get p50/p95 latency and sample count for every model with samples."""
+        # Copy the samples under the lock; record() appends to them concurrently
+        with self._lock:
+            latencies = {model: list(samples) for model, samples in self._latencies.items()}
+        stats = {}
+        for model, samples in latencies.items():
+            stats[model] = {
+                "p50": self._percentile(samples, 50),
+                "p95": self._percentile(samples, 95),
+                "samples": len(samples)
+            }
+        return stats
+    
+    def _matches(self, rule: Dict[str, Any], task: Optional[str], tokens: int) -> bool:
+        """Check whether a rule applies to a request."""
+        tasks = rule.get("tasks")
+        if tasks is not None and task not in tasks:
+            return False
+        if tokens < rule.get("min_tokens", 0):
+            return False
+        max_tokens = rule.get("max_tokens")
+        return max_tokens is None or tokens <= max_tokens
+    
+    def route(self, task: Optional[str], tokens: int, available_models: List[str],
+              default_model: str) -> str:
+        """Choose the model for a request.
+        
+        Args:
+            task: Task name (see TASKS), or None
+            tokens: Estimated prompt size in tokens
+            available_models: Models that may be chosen
+            default_model: Model used when no rule yields a candidate
+        
+        Returns:
+            Model name
+        """
+        for rule in self.rules:
+            if not self._matches(rule, task, tokens):
+                continue
+            
+            # Candidates in preference order, skipping models known to be down
+            candidates = []
+            for fragment in rule.get("prefer", []):
+                for model in available_models:
+                    if fragment in model and model not in candidates:
+                        if self.health_check and self.health_check(model) is False:
+                            continue
+                        candidates.append(model)
+            if not candidates:
+                continue
+            
+            # Take the most preferred model that isn't currently too slow
+            max_p95 = rule.get("max_p95")
+            if max_p95 is not None:
+                for model in candidates:
+                    p95 = self.percentile(model, 95)
+                    if p95 is None or p95 <= max_p95:
+                        return model
+                # All slow - fall back to the fastest by median
+                return min(candidates, key=lambda model: self.percentile(model, 50))
+            return candidates[0]
+        
+        return default_model
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import Optional, Dict, Callable
+
+# Limits used for models without a more specific entry
+DEFAULT_RPM = 60
+DEFAULT_TPM = 1000000
+
+# Bucket capacity as a fraction of the per-minute limit. Keeping bursts small
+# holds throughput just under quota instead of spending a minute's allowance at once.
+BURST_FRACTION = 0.25
+
+# Waits shorter than this are not reported to listeners
+REPORT_THRESHOLD = 0.25
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations.
+    
+    A reservation takes tokens immediately, letting the balance go negative,
+    and returns how long the caller has to wait. Later callers queue behind
+    earlier ones because the debt has to be refilled first. A request larger
+    than the bucket is charged in full, so big prompts can't exceed the
+    per-minute rate.
+    """
+    
+    def __init__(self, per_minute: float, burst_fraction: float = BURST_FRACTION):
+        """Initialize the bucket.
+        
+        Args:
+            per_minute: Sustained rate in tokens per minute
+            burst_fraction: Capacity as a fraction of per_minute
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute * burst_fraction)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def reserve(self, amount: float) -> float:
+        """Take `amount` tokens and return the seconds to wait before using them."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        
+        # Requests bigger than the bucket are charged in full as debt
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """Per-model client-side limiter for requests and tokens per minute.
+    
+    Calls wait for their reservation instead of failing with quota errors.
+    Reservations are first come, first served; the wrappers reserve only
+    once the priority scheduler has granted a slot, so quota is handed out
+    in priority order. Listeners are told about noticeable waits so the UI
+    can show them.
+    """
+    
+    def __init__(self, limits: Optional[Dict[str, Dict[str, int]]] = None):
+        """Initialize the limiter.
+        
+        Args:
+            limits: Optional {model_prefix: {"rpm": n, "tpm": n}}; the longest
+                matching prefix applies, "default" applies to everything else
+        """
+        self.limits = {"default": {"rpm": DEFAULT_RPM, "tpm": DEFAULT_TPM}}
+        if limits:
+            self.limits.update(limits)
+        self._lock = threading.Lock()
+        self._buckets = {}  # model -> (requests bucket, tokens bucket)
+        self._listeners = []
+    
+    def load_limits(self, path: str) -> bool:
+        """Merge limits from a JSON file, if it exists.
+        
+        Args:
+            path: Path of a {model_prefix: {"rpm": n, "tpm": n}} file
+        
+        Returns:
+            True if limits were loaded
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                limits = json.load(f)
+            for prefix, limit in limits.items():
+                self.set_limits(prefix, limit.get("rpm"), limit.get("tpm"))
+            return True
+        except Exception as e:
+            print(f"Error loading rate limits: {e}")
+            return False
+    
+    def set_limits(self, model_prefix: str, rpm: Optional[int] = None, tpm: Optional[int] = None) -> None:
+        """Set the limits for models starting with model_prefix ("default" for all others)."""
+        with self._lock:
+            current = dict(self.limits.get(model_prefix, self.limits["default"]))
+            if rpm:
+                current["rpm"] = rpm
+            if tpm:
+                current["tpm"] = tpm
+            self.limits[model_prefix] = current
+            # Buckets are recreated with the new limits on next use
+            self._buckets = {}
+    
+    def limits_for(self, model: str) -> Dict[str, int]:
+        """Get the limits that apply to a model."""
+        name = model.split("/")[-1]
+        matches = [prefix for prefix in self.limits if prefix != "default" and name.startswith(prefix)]
+        if not matches:
+            return self.limits["default"]
+        return self.limits[max(matches, key=len)]
+    
+    def add_wait_listener(self, callback: Callable[[str, float], None]) -> None:
+        """Register callback(model, seconds) called when a request has to wait.
+        
+        The callback runs on the waiting thread (or event loop) with the wait
+        time, and again with 0 when the wait is over.
+        """
+        self._listeners.append(callback)
+    
+    def remove_wait_listener(self, callback: Callable[[str, float], None]) -> None:
+        """Unregister a callback added with add_wait_listener."""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+    
+    def _notify(self, model: str, seconds: float) -> None:
+        for callback in list(self._listeners):
+            try:
+                callback(model, seconds)
+            except Exception as e:
+                print(f"Error in rate limit listener: {e}")
+    
+    def reserve(self, model: str, tokens: int = 0) -> float:
+        """Reserve one request and `tokens` tokens for a model.
+        
+        Args:
+            model: Model the request is sent to
+            tokens: Estimated tokens of the request
+        
+        Returns:
+            Seconds to wait before sending the request
+        """
+        with self._lock:
+            buckets = self._buckets.get(model)
+            if buckets is None:
+                limits = self.limits_for(model)
+                buckets = (TokenBucket(limits["rpm"]), TokenBucket(limits["tpm"]))
+                self._buckets[model] = buckets
+            requests_bucket, tokens_bucket = buckets
+            return max(requests_bucket.reserve(1), tokens_bucket.reserve(tokens))
+    
+    def acquire(self, model: str, tokens: int = 0) -> float:
+        """Block until a request to `model` may be sent.
+        
+        Args:
+            model: Model the request is sent to
+            tokens: Estimated tokens of the request
+        
+        Returns:
+            Seconds waited
+        """
+        wait = self.reserve(model, tokens)
+        if wait > 0:
+            if wait >= REPORT_THRESHOLD:
+                self._notify(model, wait)
+            time.sleep(wait)
+            if wait >= REPORT_THRESHOLD:
+                self._notify(model, 0.0)
+        return wait
+    
+    async def acquire_async(self, model: str, tokens: int = 0) -> float:
+        """Async variant of acquire that sleeps without blocking the event loop."""
+        wait = self.reserve(model, tokens)
+        if wait > 0:
+            if wait >= REPORT_THRESHOLD:
+                self._notify(model, wait)
+            await asyncio.sleep(wait)
+            if wait >= REPORT_THRESHOLD:
+                self._notify(model, 0.0)
+        return wait
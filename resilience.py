@@ -0,0 +1,229 @@
+import re
+import time
+import random
+import asyncio
+import threading
+import contextvars
+import concurrent.futures
+from typing import Optional, Callable, Awaitable, Any, TypeVar
+
+from google.genai import errors
+
+# httpx is installed with google-genai; its transport errors are worth retrying
+try:
+    import httpx
+    TRANSPORT_ERRORS = (ConnectionError, httpx.TransportError)
+except ImportError:
+    TRANSPORT_ERRORS = (ConnectionError,)
+
+T = TypeVar("T")
+
+# HTTP status codes that indicate a transient failure
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for transient errors."""
+    
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 multiplier: float = 2.0, max_hint: float = 60.0):
+        """Initialize the policy.
+        
+        Args:
+            max_attempts: Total attempts, including the first one
+            base_delay: Backoff before the first retry, in seconds
+            max_delay: Upper bound of the computed backoff
+            multiplier: Backoff growth factor per attempt
+            max_hint: Longest server-requested retry delay that is honoured
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.max_hint = max_hint
+    
+    def backoff(self, attempt: int) -> float:
+        """Jittered delay before retry number `attempt` (1-based)."""
+        ceiling = min(self.max_delay, self.base_delay * (self.multiplier ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+    
+    def delay_for(self, error: Exception, attempt: int) -> float:
+        """Delay before retrying after `error`, honouring the server's hint if it asks for longer."""
+        delay = self.backoff(attempt)
+        hint = retry_hint(error)
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_hint))
+        return delay
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether an error is transient and the request can be repeated."""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, TRANSPORT_ERRORS)
+
+
+def _parse_duration(value: Any) -> Optional[float]:
+    """Parse "34s", "1.5s" or a number of seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = re.fullmatch(r"\s*([\d.]+)\s*s?\s*", value)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def retry_hint(error: Exception) -> Optional[float]:
+    """Get the server-requested retry delay from an API error, if any.
+    
+    Looks at the Retry-After header and at google.rpc.RetryInfo in the
+    error details.
+    """
+    if not isinstance(error, errors.APIError):
+        return None
+    
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            hint = _parse_duration(headers.get("retry-after"))
+            if hint is not None:
+                return hint
+        except Exception:
+            pass
+    
+    def find_retry_delay(node):
+        if isinstance(node, dict):
+            if "retryDelay" in node:
+                return _parse_duration(node["retryDelay"])
+            values = node.values()
+        elif isinstance(node, list):
+            values = node
+        else:
+            return None
+        for value in values:
+            found = find_retry_delay(value)
+            if found is not None:
+                return found
+        return None
+    
+    return find_retry_delay(getattr(error, "details", None))
+
+
+def call_with_retry(func: Callable[[], T], policy: RetryPolicy) -> T:
+    """Call func, retrying transient errors according to the policy.
+    
+    Args:
+        func: Function performing one attempt
+        policy: Retry policy
+    
+    Returns:
+        The result of the first successful attempt
+    
+    Raises:
+        Exception: The last error if all attempts fail or the error is not retryable
+    """
+    attempt = 1
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= policy.max_attempts or not is_retryable(e):
+                raise
+            time.sleep(policy.delay_for(e, attempt))
+            attempt += 1
+
+
+async def async_call_with_retry(factory: Callable[[], Awaitable[T]], policy: RetryPolicy) -> T:
+    """Async variant of call_with_retry; factory creates a new awaitable per attempt."""
+    attempt = 1
+    while True:
+        try:
+            return await factory()
+        except Exception as e:
+            if attempt >= policy.max_attempts or not is_retryable(e):
+                raise
+            await asyncio.sleep(policy.delay_for(e, attempt))
+            attempt += 1
+
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Get the thread pool used by hedged_call, creating it on first use."""
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=8, thread_name_prefix="genai-hedge"
+            )
+        return _hedge_executor
+
+
+def hedged_call(primary: Callable[[], T], fallback: Callable[[], T], delay: float) -> T:
+    """Run primary; if it hasn't finished after `delay` seconds, also run fallback.
+    
+    The first successful result wins. Blocking SDK calls can't be cancelled,
+    so the losing request finishes in the background and is discarded.
+    
+    Args:
+        primary: Function performing the primary request
+        fallback: Function performing the duplicate request
+        delay: Seconds to wait for primary before sending the duplicate
+    
+    Returns:
+        The first successful result
+    
+    Raises:
+        Exception: The primary's error if both requests fail
+    """
+    executor = _get_hedge_executor()
+    # Run in copies of the caller's context so settings such as the priority class carry over
+    first = executor.submit(contextvars.copy_context().run, primary)
+    try:
+        return first.result(timeout=delay)
+    except concurrent.futures.TimeoutError:
+        pass
+    
+    second = executor.submit(contextvars.copy_context().run, fallback)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            if error is None or future is first:
+                error = future.exception()
+    raise error
+
+
+async def async_hedged_call(primary: Callable[[], Awaitable[T]], fallback: Callable[[], Awaitable[T]],
+                            delay: float) -> T:
+    """Async variant of hedged_call; the losing request is cancelled."""
+    first = asyncio.ensure_future(primary())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        
+        second = asyncio.ensure_future(fallback())
+        tasks.append(second)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                if error is None or task is first:
+                    error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+
+class ResponseCache:
+    """Two-tier (memory + SQLite) cache for model text responses.
+    
+    Entries are content-addressed: the key is a hash of everything that
+    influences the model output, so an unchanged request is answered locally.
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None,
+                 max_memory_bytes: int = 8 * 1024 * 1024,
+                 max_disk_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 24 * 60 * 60):
+        """Initialize the cache.
+        
+        Args:
+            cache_dir: Directory for the on-disk tier, or None for memory only
+            max_memory_bytes: Size limit of the in-memory LRU tier
+            max_disk_bytes: Size limit of the on-disk tier
+            ttl_seconds: Age after which an entry is treated as a miss
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (value, created_at, size)
+        self._memory_bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "evictions": 0}
+        
+        # On-disk tier is optional - fall back to memory only if it can't be opened
+        self._db = None
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                self._db = sqlite3.connect(
+                    os.path.join(cache_dir, "responses.sqlite3"),
+                    check_same_thread=False
+                )
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"Response cache disk tier disabled: {e}")
+                self._db = None
+    
+    @staticmethod
+    def make_key(model: str, system_instruction: Optional[str], prompt: str,
+                 generation_config: Dict[str, Any],
+                 response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Build the content-addressed key for a request.
+        
+        Args:
+            model: Model name
+            system_instruction: System instruction sent with the request
+            prompt: Prompt text
+            generation_config: Generation parameters
+            response_schema: Schema of a JSON response, if one was requested
+        
+        Returns:
+            Hex digest identifying the request
+        """
+        parts = [model, system_instruction or "", prompt, generation_config]
+        if response_schema is not None:
+            # A schema switches the reply to JSON; keys without one stay as they were
+            parts.append(response_schema)
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Look up a response, checking memory first and then disk.
+        
+        Args:
+            key: Key produced by make_key
+        
+        Returns:
+            The cached response text, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at, size = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return value
+                # Expired
+                self._drop_memory_entry(key)
+            
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        value, created_at = row
+                        if now - created_at <= self.ttl_seconds:
+                            self._db.execute(
+                                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                            )
+                            self._db.commit()
+                            self._store_memory_entry(key, value, created_at)
+                            self._stats["hits"] += 1
+                            self._stats["disk_hits"] += 1
+                            return value
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Response cache read error: {e}")
+            
+            self._stats["misses"] += 1
+            return None
+    
+    def put(self, key: str, value: str) -> None:
+        """Store a response in both tiers.
+        
+        Args:
+            key: Key produced by make_key
+            value: Response text
+        """
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._store_memory_entry(key, value, now)
+            
+            if self._db is not None and size <= self.max_disk_bytes:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, value, size, now, now)
+                    )
+                    self._evict_disk()
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Response cache write error: {e}")
+    
+    def clear(self) -> None:
+        """Remove all entries from both tiers and reset the counters."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for name in self._stats:
+                self._stats[name] = 0
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM responses")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Response cache clear error: {e}")
+    
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and tier sizes.
+        
+        Returns:
+            Dictionary of statistics
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            stats["disk_entries"], stats["disk_bytes"] = self._disk_usage()
+            return stats
+    
+    def _store_memory_entry(self, key: str, value: str, created_at: float) -> None:
+        """Insert an entry into the memory tier, evicting LRU entries as needed."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._drop_memory_entry(key)
+        self._memory[key] = (value, created_at, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            oldest_key = next(iter(self._memory))
+            self._drop_memory_entry(oldest_key)
+            self._stats["evictions"] += 1
+    
+    def _drop_memory_entry(self, key: str) -> None:
+        """Remove an entry from the memory tier."""
+        _, _, size = self._memory.pop(key)
+        self._memory_bytes -= size
+    
+    def _disk_usage(self) -> Tuple[int, int]:
+        """Return (entry_count, total_bytes) of the disk tier."""
+        if self._db is None:
+            return 0, 0
+        try:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            return count, total
+        except sqlite3.Error:
+            return 0, 0
+    
+    def _evict_disk(self) -> None:
+        """Drop expired entries, then least recently used ones until under the size limit."""
+        self._db.execute(
+            "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+        )
+        _, total = self._disk_usage()
+        if total <= self.max_disk_bytes:
+            return
+        
+        rows = self._db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self._stats["evictions"] += 1
@@ -1,7 +1,11 @@
 import os
 import sys
 import cmd
-from typing import List, Optional
+from contextlib import closing
+from typing import List, Optional, Iterator, Tuple
+
+from semantic_index import SemanticIndex
+from code_patch import apply_patch
 
 class SandboxCLI(cmd.Cmd):
     """Command-line interface for the sandbox IDE assistant."""
@@ -13,12 +17,45 @@ class SandboxCLI(cmd.Cmd):
         super().__init__()
         self.sandbox = sandbox_manager
         self.genai = genai_wrapper
+        self.semantic_index = SemanticIndex(sandbox_manager, genai_wrapper)
+        self.genai.rate_limiter.add_wait_listener(self._on_rate_limit_wait)
+        # Cached file contexts are dropped as soon as the file is written
+        self.sandbox.add_change_listener(self.genai.context_cache.invalidate_file)
+    
+    def _on_rate_limit_wait(self, model: str, seconds: float) -> None:
+        """Tell the user when a request is queued by the rate limiter."""
+        if seconds > 0:
+            print(f"(rate limit: waiting {seconds:.0f}s for {model})", flush=True)
+    
+    def _print_stream(self, chunks: Iterator[str], title: str, end_title: str) -> Tuple[bool, str]:
+        """Print streamed AI output as it arrives and return the full text.
+        
+        The stream is closed on errors and Ctrl-C too, which releases the
+        scheduler slot an unfinished stream holds.
+        """
+        parts = []
+        try:
+            with closing(chunks):
+                for chunk in chunks:
+                    if not parts:
+                        print(f"\n--- {title} ---\n")
+                    print(chunk, end="", flush=True)
+                    parts.append(chunk)
+        except Exception as e:
+            if parts:
+                print()
+            return False, f"Error in AI processing: {e}"
+        
+        if not parts:
+            print(f"\n--- {title} ---\n")
+        print(f"\n\n--- End of {end_title} ---\n")
+        return True, "".join(parts)
         
     def do_list(self, arg):
-        """List all files in the sandbox."""
-        files = self.sandbox.list_files()
+        """List all files in the sandbox, or below a directory: list [directory]"""
+        files = sorted(self.sandbox.list_files(arg.strip()))
         if files:
-            print("Files in sandbox:")
+            print(f"Files in {arg.strip() or 'sandbox'}:")
             for file in files:
                 print(f"  - {file}")
         else:
@@ -30,13 +67,23 @@ class SandboxCLI(cmd.Cmd):
             print("Usage: read <filename>")
             return
         
-        success, result = self.sandbox.read_file(arg)
-        if success:
-            print(f"\n--- Content of {arg} ---\n")
-            print(result)
-            print(f"\n--- End of {arg} ---\n")
-        else:
+        if self.sandbox.is_binary_file(arg):
+            print(f"{arg} is a binary file.")
+            return
+        
+        # Print large files chunk by chunk instead of reading them whole
+        success, result = self.sandbox.open_stream(arg)
+        if not success:
             print(f"Error: {result}")
+            return
+        
+        print(f"\n--- Content of {arg} ---\n")
+        try:
+            for chunk in result:
+                print(chunk, end="")
+        except Exception as e:
+            print(f"\nError reading file: {e}")
+        print(f"\n\n--- End of {arg} ---\n")
     
     def do_write(self, arg):
         """Write to a file: write <filename>"""
@@ -99,27 +146,99 @@ class SandboxCLI(cmd.Cmd):
         success, result = self.sandbox.rename_file(old_name, new_name)
         print(result)
     
+    def do_mkdir(self, arg):
+        """Create a directory: mkdir <directory>"""
+        if not arg:
+            print("Usage: mkdir <directory>")
+            return
+        
+        success, result = self.sandbox.make_dir(arg)
+        print(result)
+    
+    def do_rmdir(self, arg):
+        """Remove an empty directory: rmdir <directory>"""
+        if not arg:
+            print("Usage: rmdir <directory>")
+            return
+        
+        success, result = self.sandbox.remove_dir(arg)
+        print(result)
+    
     def do_ask_ai(self, arg):
-        """Ask AI a question about a file: ask_ai <filename> <question>"""
+        """Ask AI a question about a file, or the whole sandbox with '*': ask_ai <filename|*> <question>"""
         parts = arg.split(maxsplit=1)
         if len(parts) != 2:
-            print("Usage: ask_ai <filename> <question>")
+            print("Usage: ask_ai <filename|*> <question>")
             return
         
         filename, question = parts
-        success, content = self.sandbox.read_file(filename)
+        if filename == "*":
+            # Retrieve only the chunks relevant to the question
+            print("Searching the sandbox index...")
+            success, excerpts = self.semantic_index.relevant_files(question)
+            if not success:
+                print(f"Error: {excerpts}")
+                return
+            if not excerpts:
+                print("No indexed text files found in the sandbox.")
+                return
+            built = self.genai.context_builder.build(
+                excerpts, question, self.genai.model, heading_format="## File: {filename}"
+            )
+            print(f"Using {len(excerpts)} file(s): {', '.join(excerpts)}")
+            content = built.text
+            sources = list(excerpts)
+        else:
+            success, content = self.sandbox.read_file(filename)
+            if not success:
+                print(f"Error: {content}")
+                return
+            sources = [filename]
+        
+        print("Asking AI, please wait...")
+        success, answer = self._print_stream(
+            self.genai.ask_question_stream(question, content, sources=sources), "AI Response", "Response"
+        )
+        if not success:
+            print(f"Error: {answer}")
+    
+    def do_chat(self, arg):
+        """Chat with AI about a file, keeping the conversation between questions: chat <filename>"""
+        if not arg:
+            print("Usage: chat <filename>")
+            return
+        
+        success, content = self.sandbox.read_file(arg)
         if not success:
             print(f"Error: {content}")
             return
         
-        print("Asking AI, please wait...")
-        success, answer = self.genai.ask_question(question, content)
-        if success:
-            print("\n--- AI Response ---\n")
-            print(answer)
-            print("\n--- End of Response ---\n")
-        else:
-            print(f"Error: {answer}")
+        session = self.genai.start_chat(arg, content)
+        print(f"Chatting about {arg}. Enter an empty line or 'exit' to leave the chat.")
+        while True:
+            try:
+                question = input("you> ").strip()
+            except EOFError:
+                print()
+                break
+            if not question or question.lower() in ("exit", "quit"):
+                break
+            
+            # Start over when the file was changed since the chat began
+            success, content = self.sandbox.read_file(arg)
+            if success and not session.matches(arg, content):
+                print(f"{arg} has changed; starting a new chat about it.")
+                session = self.genai.start_chat(arg, content)
+            
+            success, answer = self._print_stream(
+                self.genai.chat_stream(session, question), "AI Response", "Response"
+            )
+            if not success:
+                print(f"Error: {answer}")
+        
+        if session.dropped_turns:
+            print(f"(the {session.dropped_turns} oldest turn(s) were dropped to keep the history short)")
+        print(f"Chat ended after {session.turns} turn(s).")
     
     def do_explain(self, arg):
         """Have AI explain code in a file: explain <filename>"""
@@ -133,19 +252,24 @@ class SandboxCLI(cmd.Cmd):
             return
         
         print("Asking AI to explain code, please wait...")
-        success, explanation = self.genai.explain_code(content)
-        if success:
-            print("\n--- AI Explanation ---\n")
-            print(explanation)
-            print("\n--- End of Explanation ---\n")
-        else:
+        success, explanation = self._print_stream(
+            self.genai.explain_code_stream(content, sources=[arg]), "AI Explanation", "Explanation"
+        )
+        if not success:
             print(f"Error: {explanation}")
     
     def do_refactor(self, arg):
-        """Have AI refactor code: refactor <filename> <instruction>"""
+        """Have AI refactor code: refactor [-p] <filename> <instruction>
+        
+        With -p the AI returns a diff, which is checked and applied locally;
+        much faster for small changes to large files.
+        """
+        as_patch = arg.startswith("-p ")
+        if as_patch:
+            arg = arg[3:].strip()
         parts = arg.split(maxsplit=1)
         if len(parts) != 2:
-            print("Usage: refactor <filename> <instruction>")
+            print("Usage: refactor [-p] <filename> <instruction>")
             return
         
         filename, instruction = parts
@@ -155,12 +279,22 @@ class SandboxCLI(cmd.Cmd):
             return
         
         print("Asking AI to refactor code, please wait...")
-        success, refactored = self.genai.refactor_code(content, instruction)
+        if as_patch:
+            success, diff = self._print_stream(
+                self.genai.edit_patch_stream(content, instruction), "Diff", "Diff"
+            )
+            if success:
+                success, refactored = apply_patch(content, diff)
+                if not success:
+                    print(f"{refactored}; requesting the whole file instead...")
+                    as_patch = False
+            else:
+                refactored = diff
+        if not as_patch:
+            success, refactored = self._print_stream(
+                self.genai.refactor_code_stream(content, instruction), "Refactored Code", "Refactored Code"
+            )
         if success:
-            print("\n--- Refactored Code ---\n")
-            print(refactored)
-            print("\n--- End of Refactored Code ---\n")
-            
             save = input("Do you want to save the refactored code? (y/n): ")
             if save.lower() == 'y':
                 success, result = self.sandbox.write_file(filename, refactored)
@@ -180,12 +314,10 @@ class SandboxCLI(cmd.Cmd):
             return
         
         print("Asking AI for improvement suggestions, please wait...")
-        success, suggestions = self.genai.suggest_improvements(content)
-        if success:
-            print("\n--- Improvement Suggestions ---\n")
-            print(suggestions)
-            print("\n--- End of Suggestions ---\n")
-        else:
+        success, suggestions = self._print_stream(
+            self.genai.suggest_improvements_stream(content, sources=[arg]), "Improvement Suggestions", "Suggestions"
+        )
+        if not success:
             print(f"Error: {suggestions}")
     
     def do_docs(self, arg):
@@ -200,12 +332,11 @@ class SandboxCLI(cmd.Cmd):
             return
         
         print("Asking AI to generate documentation, please wait...")
-        success, docs = self.genai.generate_documentation(content)
-        if success:
-            print("\n--- Generated Documentation ---\n")
-            print(docs)
-            print("\n--- End of Documentation ---\n")
-        else:
+        success, docs = self._print_stream(
+            self.genai.generate_documentation_stream(content, sources=[arg]), "Generated Documentation",
+            "Documentation"
+        )
+        if not success:
             print(f"Error: {docs}")
     
     def do_modify(self, arg):
@@ -222,12 +353,10 @@ class SandboxCLI(cmd.Cmd):
             return
         
         print("Asking AI to modify code, please wait...")
-        success, modified = self.genai.modify_with_instruction(content, instruction)
+        success, modified = self._print_stream(
+            self.genai.modify_with_instruction_stream(content, instruction), "Modified Code", "Modified Code"
+        )
         if success:
-            print("\n--- Modified Code ---\n")
-            print(modified)
-            print("\n--- End of Modified Code ---\n")
-            
             save = input("Do you want to save the modified code? (y/n): ")
             if save.lower() == 'y':
                 success, result = self.sandbox.write_file(filename, modified)
@@ -235,6 +364,112 @@ class SandboxCLI(cmd.Cmd):
         else:
             print(f"Error: {modified}")
     
+    def do_cache(self, arg):
+        """Show or clear the AI response cache: cache [stats|clear]"""
+        action = arg.strip() or "stats"
+        if action == "clear":
+            self.genai.clear_cache()
+            self.genai.context_cache.clear()
+            self.sandbox.read_cache.clear()
+            print("Response cache, cached file contexts and file read cache cleared.")
+        elif action == "stats":
+            stats = self.genai.get_cache_stats()
+            lookups = stats["hits"] + stats["misses"]
+            hit_rate = (stats["hits"] / lookups * 100) if lookups else 0.0
+            print("Response cache:")
+            print(f"  Enabled: {'yes' if self.genai.cache_enabled else 'no'}")
+            print(f"  Hits: {stats['hits']} (memory {stats['memory_hits']}, disk {stats['disk_hits']})")
+            print(f"  Misses: {stats['misses']} ({hit_rate:.1f}% hit rate)")
+            print(f"  Memory: {stats['memory_entries']} entries, {stats['memory_bytes']} bytes")
+            print(f"  Disk: {stats['disk_entries']} entries, {stats['disk_bytes']} bytes")
+            embedding_stats = self.genai.embedding_cache.stats()
+            print(f"  Embeddings: {embedding_stats['entries']} vectors, {embedding_stats['bytes']} bytes "
+                  f"({embedding_stats['hits']} hits, {embedding_stats['misses']} misses)")
+            flight_stats = self.genai.single_flight.stats()
+            print(f"  In-flight sharing: {flight_stats['coalesced']} request(s) joined "
+                  f"{flight_stats['calls']} call(s)")
+            context_stats = self.genai.context_cache.stats()
+            print(f"  Provider context cache: {context_stats['live']} live, {context_stats['created']} created, "
+                  f"{context_stats['hits']} reused")
+            read_stats = self.sandbox.read_cache.stats()
+            print(f"  File reads: {read_stats['hits']} hits, {read_stats['misses']} misses, "
+                  f"{read_stats['entries']} files ({read_stats['bytes']} bytes) cached")
+        else:
+            print("Usage: cache [stats|clear]")
+    
+    def do_index(self, arg):
+        """Update, inspect or clear the semantic index of the sandbox: index [update|stats|clear]"""
+        action = arg.strip() or "update"
+        if action == "update":
+            print("Updating index, please wait...")
+            success, message = self.semantic_index.update()
+            print(message if success else f"Error: {message}")
+        elif action == "stats":
+            stats = self.semantic_index.stats()
+            print("Semantic index:")
+            print(f"  Model: {stats['model']}")
+            print(f"  Files: {stats['files']}")
+            print(f"  Chunks: {stats['chunks']}")
+        elif action == "clear":
+            self.semantic_index.clear()
+            print("Semantic index cleared.")
+        else:
+            print("Usage: index [update|stats|clear]")
+    
+    def do_models(self, arg):
+        """List text models with their health, probe them all, or switch to the fastest: models [check|fastest]"""
+        action = arg.strip()
+        if action == "check":
+            models = self.genai.get_available_text_models()
+            print(f"Probing {len(models)} models, please wait...")
+            self.genai.probe_models(models)
+        elif action == "fastest":
+            success, message = self.genai.select_fastest_model()
+            print(message if success else f"Error: {message}")
+            return
+        elif action:
+            print("Usage: models [check|fastest]")
+            return
+        
+        for model in self.genai.get_available_text_models():
+            entry = self.genai.model_health.get(model)
+            marker = "*" if model == self.genai.model else " "
+            if entry is None:
+                status = "not checked"
+            elif entry["ok"]:
+                status = f"OK, {entry['latency'] * 1000:.0f} ms"
+            else:
+                status = f"unavailable: {entry['error'][:60]}"
+            print(f" {marker} {model:<36} {status}")
+    
+    def do_route(self, arg):
+        """Turn per-request model routing on or off, or show latency stats: route [on|off|stats]"""
+        action = arg.strip() or "stats"
+        if action in ("on", "off"):
+            self.genai.routing_enabled = action == "on"
+            print(f"Model routing {'enabled' if self.genai.routing_enabled else 'disabled'}.")
+        elif action == "stats":
+            print(f"Model routing: {'on' if self.genai.routing_enabled else 'off'} (default model {self.genai.model})")
+            stats = self.genai.router.latency_stats()
+            if not stats:
+                print("  No calls recorded yet.")
+            for model, entry in sorted(stats.items()):
+                print(f"  {model:<36} p50 {entry['p50']:.2f}s  p95 {entry['p95']:.2f}s  ({entry['samples']} calls)")
+        else:
+            print("Usage: route [on|off|stats]")
+    
+    def do_hedge(self, arg):
+        """Turn hedging of slow requests against a fallback model on or off: hedge [on|off]"""
+        action = arg.strip()
+        if action in ("on", "off"):
+            self.genai.hedging_enabled = action == "on"
+        elif action:
+            print("Usage: hedge [on|off]")
+            return
+        fallback = self.genai.hedge_target(self.genai.model) if self.genai.hedging_enabled else None
+        print(f"Hedging: {'on' if self.genai.hedging_enabled else 'off'}"
+              + (f" (fallback {fallback} after {self.genai.hedge_delay(self.genai.model):.1f}s)" if fallback else ""))
+    
     def do_exit(self, arg):
         """Exit the program."""
         print("Goodbye!")
@@ -1,16 +1,104 @@
 import os
+import mmap
 import pathlib
 import re
 import shutil
-from typing import List, Optional, Tuple, Dict
+import threading
+import uuid
+from typing import List, Optional, Tuple, Dict, Callable, Iterator, Union
+
+from file_cache import FileContentCache
+
+# Characters allowed in each component of a sandbox path
+PATH_COMPONENT = re.compile(r'^[a-zA-Z0-9_\-\.]+$')
+
+# Maximum number of nested directories in a sandbox path
+MAX_PATH_DEPTH = 16
+
+# Default chunk size of open_stream (characters for text, bytes for binary files)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Extensions of files stored and read as bytes (images)
+BINARY_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
+
+# Files larger than this are reduced to a head and tail excerpt by read_excerpt
+EXCERPT_BYTES = 1024 * 1024
+
+
+class FileEntry:
+    """Metadata of one sandbox entry, as recorded by a directory scan."""
+    
+    __slots__ = ("path", "name", "size", "mtime_ns", "is_dir")
+    
+    def __init__(self, path: str, size: int, mtime_ns: int, is_dir: bool):
+        self.path = path  # relative to the sandbox, "/"-separated
+        self.name = path.rsplit("/", 1)[-1]
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.is_dir = is_dir
+    
+    @property
+    def mtime(self) -> float:
+        """Modification time in seconds since the epoch."""
+        return self.mtime_ns / 1e9
+
+
+class _DirNode:
+    """A directory of the in-memory path tree, scanned lazily."""
+    
+    __slots__ = ("entries", "children", "mtime_ns")
+    
+    def __init__(self):
+        self.entries = None  # name -> FileEntry, None until scanned (or after a change)
+        self.children = {}  # name -> _DirNode of subdirectories looked up so far
+        self.mtime_ns = None  # the directory's mtime at the last scan
+
 
 class SandboxManager:
-    """Manages all file operations within a sandboxed directory."""
+    """Manages all file operations within a sandboxed directory.
+    
+    Paths are relative to the sandbox and may contain nested directories
+    ("src/app.py"); "/" and "\\" are both accepted as separators.
+    """
     
     def __init__(self, sandbox_path: str = "~/.my_sandbox"):
         """Initialize the sandbox directory."""
         self.sandbox_dir = os.path.abspath(os.path.expanduser(sandbox_path))
+        self._change_listeners = []
+        
+        # Prefix tree of directory metadata from os.scandir passes. A directory is
+        # scanned when first listed and rescanned when its mtime moves or a file
+        # in it is changed through this manager; lookups walk one node per level.
+        self._index_lock = threading.Lock()
+        self._root = _DirNode()
+        
+        # Decoded contents of recently read files, validated by mtime and size
+        self.read_cache = FileContentCache()
+        
+        # fsync files written by write_file and their directories before reporting
+        # success; off by default since saves are atomic either way
+        self.durable_writes = False
+        
         self._ensure_sandbox_exists()
+    
+    def add_change_listener(self, callback: Callable[[str], None]) -> None:
+        """Register a callback run with the file path whenever a file is written, appended, deleted or renamed."""
+        self._change_listeners.append(callback)
+    
+    def remove_change_listener(self, callback: Callable[[str], None]) -> None:
+        """Unregister a callback added with add_change_listener."""
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+    
+    def _notify_change(self, filename: str) -> None:
+        # Writes to an existing file don't move the directory's mtime
+        self.invalidate_index(filename)
+        self.read_cache.invalidate(filename)
+        for callback in list(self._change_listeners):
+            try:
+                callback(filename)
+            except Exception as e:
+                print(f"Error in file change listener: {e}")
         
     def _ensure_sandbox_exists(self) -> None:
         """Create the sandbox directory if it doesn't exist."""
@@ -20,21 +108,51 @@ class SandboxManager:
         else:
             print(f"Using existing sandbox at: {self.sandbox_dir}")
     
+    def normalize_path(self, path: str) -> Tuple[bool, str]:
+        """Validate a relative sandbox path and bring it to "dir/sub/name" form.
+        
+        Every component must be a plain name: no absolute paths, "..",
+        hidden names or characters other than letters, numbers, underscore,
+        dash and dot.
+        
+        Returns:
+            Tuple of (is_valid, relative_path_or_error); "" is the sandbox root
+        """
+        parts = [part for part in path.replace("\\", "/").split("/") if part not in ("", ".")]
+        if path.startswith(("/", "\\")) or re.match(r'^[a-zA-Z]:', path):
+            return False, "Absolute paths are not allowed."
+        if len(parts) > MAX_PATH_DEPTH + 1:
+            return False, f"Paths can be at most {MAX_PATH_DEPTH} directories deep."
+        for part in parts:
+            if part == "..":
+                return False, "Path traversal attempt detected."
+            
+            # Prevent hidden files and directories
+            if part.startswith('.'):
+                return False, "Hidden files are not allowed."
+            
+            # Basic validation - only allow alphanumeric, underscore, dash, dot 
+            if not PATH_COMPONENT.match(part):
+                return False, "Invalid filename. Use only letters, numbers, underscore, dash and dot."
+        return True, "/".join(parts)
+    
+    def _full_path(self, relative: str) -> Tuple[bool, str]:
+        """Join a normalized relative path to the sandbox and check it stays inside."""
+        full_path = os.path.abspath(os.path.join(self.sandbox_dir, *relative.split("/")))
+        if not os.path.commonpath([self.sandbox_dir]) == os.path.commonpath([self.sandbox_dir, full_path]):
+            return False, "Path traversal attempt detected."
+        return True, full_path
+    
     def _validate_path(self, filepath: str) -> Tuple[bool, str]:
         """
-        Validate if path is within sandbox and sanitize filename.
+        Validate if a file path is within sandbox and has an allowed type.
         Returns (is_valid, full_path_or_error).
         """
-        # Sanitize filename
-        filename = os.path.basename(filepath)
-        
-        # Basic validation - only allow alphanumeric, underscore, dash, dot 
-        if not re.match(r'^[a-zA-Z0-9_\-\.]+$', filename):
-            return False, "Invalid filename. Use only letters, numbers, underscore, dash and dot."
-        
-        # Prevent hidden files
-        if filename.startswith('.'):
-            return False, "Hidden files are not allowed."
+        is_valid, relative = self.normalize_path(filepath)
+        if not is_valid:
+            return False, relative
+        if not relative:
+            return False, "A filename is required."
             
         # Allowed extensions
         allowed_extensions = [
@@ -45,67 +163,507 @@ class SandboxManager:
             # Images
             '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'
         ]
-        _, ext = os.path.splitext(filename)
+        _, ext = os.path.splitext(relative)
         if ext.lower() not in allowed_extensions:
             return False, f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}"
         
         # Construct full path and validate it's within sandbox
-        full_path = os.path.abspath(os.path.join(self.sandbox_dir, filename))
-        if not os.path.commonpath([self.sandbox_dir]) == os.path.commonpath([self.sandbox_dir, full_path]):
-            return False, "Path traversal attempt detected."
+        return self._full_path(relative)
             
-        return True, full_path
+    def _validate_dir(self, dirpath: str) -> Tuple[bool, str]:
+        """Validate a directory path; returns (is_valid, full_path_or_error)."""
+        is_valid, relative = self.normalize_path(dirpath)
+        if not is_valid:
+            return False, relative
+        return self._full_path(relative)
+    
+    def _relative(self, full_path: str) -> str:
+        """The "/"-separated sandbox path of a validated full path."""
+        relative = os.path.relpath(full_path, self.sandbox_dir)
+        return "" if relative == "." else relative.replace(os.sep, "/")
+    
+    def invalidate_index(self, path: Optional[str] = None) -> None:
+        """Make the next listing rescan the directory containing path (everything if None)."""
+        with self._index_lock:
+            if path is None:
+                self._root = _DirNode()
+                return
+            node = self._root
+            for part in path.split("/")[:-1]:
+                node = node.children.get(part)
+                if node is None:
+                    return  # not scanned yet
+            node.entries = None
+    
+    def _scan(self, relative: str) -> Dict[str, FileEntry]:
+        """Read the metadata of every entry of a directory in one os.scandir pass."""
+        index = {}
+        prefix = f"{relative}/" if relative else ""
+        with os.scandir(os.path.join(self.sandbox_dir, *relative.split("/"))) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if not is_dir and not entry.is_file():
+                        continue
+                    # Free on Windows; one stat per file elsewhere, without listdir + isfile
+                    stat = entry.stat()
+                except OSError:
+                    continue  # removed while scanning
+                index[entry.name] = FileEntry(
+                    prefix + entry.name, 0 if is_dir else stat.st_size, stat.st_mtime_ns, is_dir
+                )
+        return index
     
-    def list_files(self) -> List[str]:
-        """List all files in the sandbox."""
+    def _load(self, node: _DirNode, relative: str, refresh: bool) -> Dict[str, FileEntry]:
+        """Get a directory's entries, rescanning it if it changed (lock held)."""
+        mtime_ns = os.stat(os.path.join(self.sandbox_dir, *relative.split("/"))).st_mtime_ns
+        if refresh or node.entries is None or mtime_ns != node.mtime_ns:
+            node.entries = self._scan(relative)
+            node.mtime_ns = mtime_ns
+            # Forget subtrees of directories that are gone
+            for name in list(node.children):
+                entry = node.entries.get(name)
+                if entry is None or not entry.is_dir:
+                    del node.children[name]
+        return node.entries
+    
+    def _find_node(self, relative: str, refresh: bool = False) -> Optional[_DirNode]:
+        """Walk the path tree to a directory, one level per path component (lock held)."""
+        node = self._root
+        current = ""
+        for part in relative.split("/") if relative else []:
+            entries = self._load(node, current, False)
+            entry = entries.get(part)
+            if entry is None or not entry.is_dir:
+                return None
+            node = node.children.setdefault(part, _DirNode())
+            current = entry.path
+        self._load(node, current, refresh)
+        return node
+    
+    def list_entries(self, directory: str = "", recursive: bool = False,
+                     refresh: bool = False) -> List[FileEntry]:
+        """List entries of a sandbox directory with their size, mtime and type.
+        
+        The metadata comes from cached scans that are only repeated when a
+        directory's own mtime changes (entries added, removed or renamed) or
+        a file in it was changed through this manager. Files edited in place
+        by other programs are picked up with refresh=True.
+        
+        Args:
+            directory: Directory relative to the sandbox, "" for the root
+            recursive: Include the entries of all subdirectories
+            refresh: Rescan even if a directory looks unchanged
+        
+        Returns:
+            FileEntry records of the files and directories
+        """
+        is_valid, relative = self.normalize_path(directory)
+        if not is_valid:
+            print(f"Error listing files: {relative}")
+            return []
+        
         try:
-            return [f for f in os.listdir(self.sandbox_dir) 
-                   if os.path.isfile(os.path.join(self.sandbox_dir, f))]
+            with self._index_lock:
+                node = self._find_node(relative, refresh)
+                if node is None:
+                    return []
+                if not recursive:
+                    return list(node.entries.values())
+                
+                result = []
+                pending = [node]
+                while pending:
+                    node = pending.pop()
+                    for entry in node.entries.values():
+                        result.append(entry)
+                        if entry.is_dir:
+                            child = node.children.setdefault(entry.name, _DirNode())
+                            try:
+                                self._load(child, entry.path, refresh)
+                            except OSError:
+                                continue  # removed while listing
+                            pending.append(child)
+                return result
         except Exception as e:
             print(f"Error listing files: {e}")
             return []
     
+    def get_entry(self, path: str) -> Optional[FileEntry]:
+        """Look up the metadata of one file or directory, or None if it doesn't exist."""
+        is_valid, relative = self.normalize_path(path)
+        if not is_valid or not relative:
+            return None
+        parent, _, name = relative.rpartition("/")
+        try:
+            with self._index_lock:
+                node = self._find_node(parent)
+                return node.entries.get(name) if node is not None else None
+        except OSError:
+            return None
+    
+    def list_files(self, directory: str = "") -> List[str]:
+        """List the paths of all files in the sandbox, or below a directory."""
+        return [entry.path for entry in self.list_entries(directory, recursive=True) if not entry.is_dir]
+    
+    def make_dir(self, dirpath: str) -> Tuple[bool, str]:
+        """Create a directory (and missing parents) in the sandbox."""
+        is_valid, path_or_error = self._validate_dir(dirpath)
+        if not is_valid:
+            return False, path_or_error
+        relative = self._relative(path_or_error)
+        if not relative:
+            return False, "A directory name is required."
+        if os.path.isfile(path_or_error):
+            return False, f"{relative} is a file."
+        
+        try:
+            os.makedirs(path_or_error, exist_ok=True)
+            self.invalidate_index(relative)
+            return True, f"Successfully created directory {relative}"
+        except Exception as e:
+            return False, f"Error creating directory: {e}"
+    
+    def remove_dir(self, dirpath: str) -> Tuple[bool, str]:
+        """Remove an empty directory from the sandbox."""
+        is_valid, path_or_error = self._validate_dir(dirpath)
+        if not is_valid:
+            return False, path_or_error
+        relative = self._relative(path_or_error)
+        if not relative:
+            return False, "The sandbox root can't be removed."
+        if not os.path.isdir(path_or_error):
+            return False, f"Directory {relative} does not exist."
+        
+        try:
+            os.rmdir(path_or_error)
+            self.invalidate_index(relative)
+            return True, f"Successfully removed directory {relative}"
+        except OSError as e:
+            if os.listdir(path_or_error):
+                return False, f"Directory {relative} is not empty."
+            return False, f"Error removing directory: {e}"
+    
+    def is_binary_file(self, filename: str) -> bool:
+        """Check whether a file is stored in a binary format (images)."""
+        _, ext = os.path.splitext(filename)
+        return ext.lower() in BINARY_EXTENSIONS
+    
+    def list_text_files(self) -> List[str]:
+        """List the sandbox files that can be sent to a model as text."""
+        return [f for f in self.list_files() if not self.is_binary_file(f)]
+    
     def read_file(self, filename: str, binary_mode: bool = False) -> Tuple[bool, str]:
-        """Read a file from the sandbox. If binary_mode is True, returns bytes instead of string."""
+        """Read a file from the sandbox. If binary_mode is True, returns bytes instead of string.
+        
+        Contents are served from the read cache while the file's mtime and
+        size are unchanged, so repeated reads cost one stat call.
+        """
         is_valid, path_or_error = self._validate_path(filename)
         if not is_valid:
             return False, path_or_error
             
         try:
             # Check if it's a binary file format
-            _, ext = os.path.splitext(filename)
-            binary_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
-            is_binary = ext.lower() in binary_extensions or binary_mode
+            is_binary = self.is_binary_file(filename) or binary_mode
+            
+            relative = self._relative(path_or_error)
+            stat = os.stat(path_or_error)
+            content = self.read_cache.get(relative, is_binary, (stat.st_mtime_ns, stat.st_size))
+            if content is not None:
+                return True, content
             
             mode = 'rb' if is_binary else 'r'
             encoding = None if is_binary else 'utf-8'
             
             with open(path_or_error, mode, encoding=encoding) as file:
+                # The signature of the open file matches what is read from it
+                stat = os.fstat(file.fileno())
                 content = file.read()
+            self.read_cache.put(relative, is_binary, (stat.st_mtime_ns, stat.st_size), content)
             return True, content
         except Exception as e:
             return False, f"Error reading file: {e}"
     
+    def open_stream(self, filename: str, chunk_size: int = STREAM_CHUNK_SIZE,
+                    binary_mode: bool = False) -> Tuple[bool, Union[Iterator[Union[str, bytes]], str]]:
+        """Read a file in chunks instead of as one object.
+        
+        Images (or any file with binary_mode) yield bytes, other files
+        decoded text. The file is opened here, so errors are reported in
+        the result, and closed when the generator is exhausted or dropped.
+        
+        Args:
+            filename: File to read
+            chunk_size: Characters (text) or bytes (binary) per chunk
+            binary_mode: Read bytes even for text files
+        
+        Returns:
+            Tuple of (success, chunk_generator_or_error)
+        """
+        is_valid, path_or_error = self._validate_path(filename)
+        if not is_valid:
+            return False, path_or_error
+        
+        is_binary = self.is_binary_file(filename) or binary_mode
+        try:
+            file = open(path_or_error, 'rb' if is_binary else 'r', encoding=None if is_binary else 'utf-8')
+        except Exception as e:
+            return False, f"Error reading file: {e}"
+        
+        def chunks():
+            with file:
+                while True:
+                    chunk = file.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        
+        return True, chunks()
+    
+    def mmap_view(self, filename: str) -> Tuple[bool, Union[memoryview, str]]:
+        """Map a file into memory and return a read-only view of its bytes.
+        
+        Slicing the view reads only the pages that are touched, without a
+        copy of the whole file. The mapping is released with the view
+        (view.release(), or when it is garbage collected).
+        
+        Returns:
+            Tuple of (success, memoryview_or_error)
+        """
+        is_valid, path_or_error = self._validate_path(filename)
+        if not is_valid:
+            return False, path_or_error
+        
+        try:
+            with open(path_or_error, 'rb') as file:
+                # Empty files can't be mapped
+                if os.fstat(file.fileno()).st_size == 0:
+                    return True, memoryview(b"")
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            return True, memoryview(mapped)
+        except Exception as e:
+            return False, f"Error reading file: {e}"
+    
+    def read_excerpt(self, filename: str, max_bytes: int = EXCERPT_BYTES) -> Tuple[bool, str]:
+        """Read a text file for a prompt, reducing large files to their head and tail.
+        
+        Files up to max_bytes are read whole (through the read cache); for
+        larger ones only the two ends of a memory map are decoded.
+        
+        Returns:
+            Tuple of (success, text_or_error)
+        """
+        is_valid, path_or_error = self._validate_path(filename)
+        if not is_valid:
+            return False, path_or_error
+        
+        try:
+            size = os.path.getsize(path_or_error)
+        except Exception as e:
+            return False, f"Error reading file: {e}"
+        if size <= max_bytes:
+            return self.read_file(filename)
+        
+        success, view = self.mmap_view(filename)
+        if not success:
+            return False, view
+        head_bytes = int(max_bytes * 0.7)
+        tail_bytes = max_bytes - head_bytes
+        with view:
+            # A multi-byte character cut at either end is dropped
+            head = bytes(view[:head_bytes]).decode('utf-8', errors='ignore')
+            tail = bytes(view[len(view) - tail_bytes:]).decode('utf-8', errors='ignore')
+        
+        # Cut at line boundaries
+        head = head[:head.rfind("\n") + 1] or head
+        tail = tail[tail.find("\n") + 1:] or tail
+        skipped = size - len(head.encode('utf-8')) - len(tail.encode('utf-8'))
+        return True, f"{head}... [{skipped} bytes not shown] ...\n{tail}"
+    
+    def _write_temp(self, full_path: str, content: Union[str, bytes], is_binary: bool, fsync: bool) -> str:
+        """Write content to a new hidden file next to full_path and return its path.
+        
+        The temp file is in the same directory so it can be renamed over the
+        target atomically; its dot-name keeps it out of directory scans.
+        """
+        directory, name = os.path.split(full_path)
+        temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}.tmp")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            if is_binary:
+                file = os.fdopen(fd, 'wb')
+            else:
+                file = os.fdopen(fd, 'w', encoding='utf-8')
+            with file:
+                file.write(content)
+                if fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            # Keep the permissions of a file being replaced
+            if os.path.exists(full_path):
+                shutil.copymode(full_path, temp_path)
+        except BaseException:
+            self._remove_quietly(temp_path)
+            raise
+        return temp_path
+    
+    def _fsync_dir(self, directory: str) -> None:
+        """Flush a directory entry change (a rename) to disk where the platform allows it."""
+        if not hasattr(os, "O_DIRECTORY"):
+            return  # Windows can't open directories; NTFS journals renames itself
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _remove_quietly(self, path: str) -> None:
+        """Remove a file if it exists, ignoring errors (used while cleaning up)."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
     def write_file(self, filename: str, content: str, binary_mode: bool = False) -> Tuple[bool, str]:
-        """Write content to a file in the sandbox. If binary_mode is True, content should be bytes."""
+        """Write content to a file in the sandbox. If binary_mode is True, content should be bytes.
+        
+        The content is written to a temp file that then replaces the target
+        with a single rename, so readers and a crash see either the old or the
+        new file, never a truncated one.
+        """
         is_valid, path_or_error = self._validate_path(filename)
         if not is_valid:
             return False, path_or_error
             
         try:
-            # Check if it's a binary file format
-            _, ext = os.path.splitext(filename)
-            binary_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']
-            is_binary = ext.lower() in binary_extensions or binary_mode
-            
-            mode = 'wb' if is_binary else 'w'
-            encoding = None if is_binary else 'utf-8'
+            is_binary = self.is_binary_file(filename) or binary_mode
             
-            with open(path_or_error, mode, encoding=encoding) as file:
-                file.write(content)
+            # Missing parent directories are created, e.g. for generated "src/app.py"
+            directory = os.path.dirname(path_or_error)
+            os.makedirs(directory, exist_ok=True)
+            temp_path = self._write_temp(path_or_error, content, is_binary, self.durable_writes)
+            try:
+                os.replace(temp_path, path_or_error)
+            except BaseException:
+                self._remove_quietly(temp_path)
+                raise
+            if self.durable_writes:
+                self._fsync_dir(directory)
+            self._notify_change(self._relative(path_or_error))
             return True, f"Successfully wrote to {filename}"
         except Exception as e:
             return False, f"Error writing file: {e}"
+    
+    def _make_parents(self, directory: str) -> List[str]:
+        """Create a directory and its missing parents, returning the ones created (outermost first)."""
+        missing = []
+        while not os.path.isdir(directory):
+            missing.append(directory)
+            directory = os.path.dirname(directory)
+        created = []
+        for path in reversed(missing):
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                continue  # created concurrently; not ours to remove
+            created.append(path)
+        return created
+    
+    def _remove_dirs(self, directories: List[str]) -> None:
+        """Remove directories created by _make_parents, innermost first, if still empty."""
+        for directory in reversed(directories):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+    
+    def write_many(self, files: Dict[str, Union[str, bytes]], durable: bool = True) -> Tuple[bool, str]:
+        """Write several files as one transaction: either all are written or none.
+        
+        Every file is first written to a temp file next to its target, then the
+        temp files are renamed over the targets. Existing targets are kept as
+        hard-linked backups until all renames succeed; on any failure they are
+        restored, and newly created files and directories are removed. When
+        durable, each temp file is fsynced before the renames and each
+        directory once after them.
+        
+        Args:
+            files: Mapping of sandbox path to content (bytes for binary files)
+            durable: Whether to fsync every temp file and every target directory
+                before returning
+        
+        Returns:
+            Tuple of (success, message)
+        """
+        # Validate every path before touching the disk
+        targets = {}  # full path -> (filename, content)
+        for filename, content in files.items():
+            is_valid, path_or_error = self._validate_path(filename)
+            if not is_valid:
+                return False, path_or_error
+            if path_or_error in targets:
+                return False, f"File {filename} is listed more than once."
+            targets[path_or_error] = (filename, content)
+        
+        if not targets:
+            return True, "No files to write."
+        
+        # Phase 1: write every temp file; nothing visible has changed yet
+        temps = {}  # full path -> temp path
+        created_dirs = []
+        try:
+            for full_path, (filename, content) in targets.items():
+                created_dirs.extend(self._make_parents(os.path.dirname(full_path)))
+                is_binary = self.is_binary_file(filename) or isinstance(content, bytes)
+                temps[full_path] = self._write_temp(full_path, content, is_binary, durable)
+        except Exception as e:
+            for temp_path in temps.values():
+                self._remove_quietly(temp_path)
+            self._remove_dirs(created_dirs)
+            return False, f"Error writing {filename}: {e}. No files were changed."
+        
+        # Phase 2: rename the temp files over the targets, keeping backups for rollback
+        backups = {}  # full path -> backup path, for targets that existed
+        replaced = []
+        try:
+            for full_path, temp_path in temps.items():
+                filename = targets[full_path][0]
+                if os.path.isfile(full_path):
+                    backup_path = temp_path[:-len(".tmp")] + ".bak"
+                    try:
+                        os.link(full_path, backup_path)
+                    except OSError:
+                        # No hard links here (e.g. FAT); a copy keeps the target in place
+                        shutil.copy2(full_path, backup_path)
+                    backups[full_path] = backup_path
+                os.replace(temp_path, full_path)
+                replaced.append(full_path)
+        except Exception as e:
+            for full_path in reversed(replaced):
+                try:
+                    if full_path in backups:
+                        os.replace(backups.pop(full_path), full_path)
+                    else:
+                        os.remove(full_path)
+                except OSError as restore_error:
+                    print(f"Error rolling back {self._relative(full_path)}: {restore_error}")
+            for path in list(temps.values()) + list(backups.values()):
+                self._remove_quietly(path)
+            self._remove_dirs(created_dirs)
+            return False, f"Error writing {filename}: {e}. All changes were rolled back."
+        
+        for backup_path in backups.values():
+            self._remove_quietly(backup_path)
+        if durable:
+            for directory in {os.path.dirname(full_path) for full_path in targets}:
+                self._fsync_dir(directory)
+        
+        for full_path in targets:
+            self._notify_change(self._relative(full_path))
+        return True, f"Successfully wrote {len(targets)} file(s)"
             
     def append_file(self, filename: str, content: str) -> Tuple[bool, str]:
         """Append content to a file in the sandbox."""
@@ -116,6 +674,7 @@ class SandboxManager:
         try:
             with open(path_or_error, 'a', encoding='utf-8') as file:
                 file.write(content)
+            self._notify_change(self._relative(path_or_error))
             return True, f"Successfully appended to {filename}"
         except Exception as e:
             return False, f"Error appending to file: {e}"
@@ -126,17 +685,18 @@ class SandboxManager:
         if not is_valid:
             return False, path_or_error
             
-        if not os.path.exists(path_or_error):
+        if not os.path.isfile(path_or_error):
             return False, f"File {filename} does not exist."
             
         try:
             os.remove(path_or_error)
+            self._notify_change(self._relative(path_or_error))
             return True, f"Successfully deleted {filename}"
         except Exception as e:
             return False, f"Error deleting file: {e}"
             
     def rename_file(self, old_name: str, new_name: str) -> Tuple[bool, str]:
-        """Rename a file in the sandbox."""
+        """Rename a file in the sandbox, or move it to another directory."""
         is_valid_old, old_path = self._validate_path(old_name)
         if not is_valid_old:
             return False, old_path
@@ -145,14 +705,17 @@ class SandboxManager:
         if not is_valid_new:
             return False, new_path
             
-        if not os.path.exists(old_path):
+        if not os.path.isfile(old_path):
             return False, f"File {old_name} does not exist."
             
         if os.path.exists(new_path):
             return False, f"File {new_name} already exists."
             
         try:
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
             shutil.move(old_path, new_path)
+            self._notify_change(self._relative(old_path))
+            self._notify_change(self._relative(new_path))
             return True, f"Successfully renamed {old_name} to {new_name}"
         except Exception as e:
             return False, f"Error renaming file: {e}"
@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Dict, Awaitable, TypeVar
+
+T = TypeVar("T")
+
+# Priority classes, lower runs first
+INTERACTIVE = 0  # The user is watching the output (Ask AI, Explain, ...)
+NORMAL = 1  # Default for untagged requests (CLI, model checks)
+BACKGROUND = 2  # Bulk work (multi-file apply and generation, indexing, images)
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BACKGROUND: "background"}
+
+# Default per-class limits within the total. Background work can never take
+# every slot, so interactive requests always find one free or nearly free.
+DEFAULT_CLASS_LIMITS = {INTERACTIVE: 8, NORMAL: 6, BACKGROUND: 3}
+
+# Priority class of the code currently running; set with priority() or with_priority()
+_current_priority = contextvars.ContextVar("genai_priority", default=NORMAL)
+
+
+def current_priority() -> int:
+    """Get the priority class of the current thread or task."""
+    return _current_priority.get()
+
+
+@contextmanager
+def priority(level: int):
+    """Run the body of a with-block in a priority class.
+    
+    Works for threads and for coroutines; tasks and to_thread() calls started
+    inside the block inherit the class.
+    """
+    token = _current_priority.set(level)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+async def with_priority(coro: Awaitable[T], level: int) -> T:
+    """Await a coroutine in a priority class."""
+    with priority(level):
+        return await coro
+
+
+class _Waiter:
+    """A queued request for a slot, woken by an event (threads) or a future (tasks)."""
+    
+    def __init__(self, level: int, seq: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.level = level
+        self.seq = seq
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+    
+    def grant(self) -> None:
+        """Wake the waiter; called with the scheduler lock held."""
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+    
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class PriorityScheduler:
+    """Admits AI requests by priority class under a total concurrency limit.
+    
+    Waiting requests are admitted in (priority, arrival) order, so a queued
+    background request is overtaken by any interactive request that arrives
+    later. Running requests are never interrupted. Each class also has its
+    own concurrency limit.
+    
+    Slots can be taken from threads (slot()) and from coroutines on any
+    event loop (slot_async()).
+    """
+    
+    def __init__(self, max_concurrency: int = 8, class_limits: Optional[Dict[int, int]] = None):
+        """Initialize the scheduler.
+        
+        Args:
+            max_concurrency: Maximum number of requests running at once
+            class_limits: Optional {priority: limit}, defaults to DEFAULT_CLASS_LIMITS
+        """
+        self.max_concurrency = max_concurrency
+        self.class_limits = dict(DEFAULT_CLASS_LIMITS)
+        if class_limits:
+            self.class_limits.update(class_limits)
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queue = []  # waiters sorted by (level, seq)
+        self._running = {level: 0 for level in PRIORITY_NAMES}
+    
+    def _enqueue(self, waiter: _Waiter) -> None:
+        """Queue a waiter and admit whatever can run (lock held)."""
+        self._queue.append(waiter)
+        self._queue.sort(key=lambda w: (w.level, w.seq))
+        self._dispatch()
+    
+    def _dispatch(self) -> None:
+        """Grant free slots to the highest-priority waiters (lock held)."""
+        for waiter in list(self._queue):
+            if sum(self._running.values()) >= self.max_concurrency:
+                break
+            limit = self.class_limits.get(waiter.level, self.max_concurrency)
+            if self._running[waiter.level] >= limit:
+                continue
+            self._queue.remove(waiter)
+            self._running[waiter.level] += 1
+            waiter.grant()
+    
+    def _release(self, level: int) -> None:
+        with self._lock:
+            self._running[level] -= 1
+            self._dispatch()
+    
+    @contextmanager
+    def slot(self, level: Optional[int] = None):
+        """Hold a slot for the body of a with-block, blocking until one is granted.
+        
+        Args:
+            level: Priority class, defaults to current_priority()
+        """
+        level = current_priority() if level is None else level
+        waiter = _Waiter(level, next(self._seq))
+        with self._lock:
+            self._enqueue(waiter)
+        waiter.event.wait()
+        try:
+            yield
+        finally:
+            self._release(level)
+    
+    @asynccontextmanager
+    async def slot_async(self, level: Optional[int] = None):
+        """Async variant of slot; a task cancelled while queued just leaves the queue."""
+        level = current_priority() if level is None else level
+        waiter = _Waiter(level, next(self._seq), asyncio.get_running_loop())
+        with self._lock:
+            self._enqueue(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._queue.remove(waiter)
+            if granted:
+                self._release(level)
+            raise
+        try:
+            yield
+        finally:
+            self._release(level)
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Get the running and queued request counts per priority class."""
+        with self._lock:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._queue:
+                queued[PRIORITY_NAMES[waiter.level]] += 1
+            running = {PRIORITY_NAMES[level]: count for level, count in self._running.items()}
+        return {"running": running, "queued": queued}
@@ -0,0 +1,430 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict, Any, Tuple, List
+
+from scheduler import priority, BACKGROUND
+
+# NumPy is only needed for the semantic index; the rest of the app works without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+class SemanticIndex:
+    """Embedding-based index over the text files of a sandbox.
+    
+    Each file is split into line-aligned chunks which are embedded in batches
+    through GenAIWrapper.generate_embeddings, so unchanged chunks hit its cache.
+    Vectors live in a single float32 NumPy array (vectors.npy) and a SQLite
+    table maps each row to its file, file hash and chunk offset. Files are
+    re-embedded only when their mtime/size and content hash change.
+    
+    Queries refresh the index only when the sandbox reported a change or the
+    last scan is older than RESCAN_INTERVAL (for files edited by other
+    programs); update() always rescans.
+    """
+    
+    DEFAULT_EMBEDDING_MODEL = "text-embedding-004"
+    
+    # Seconds after which a query rescans the sandbox without a change notification
+    RESCAN_INTERVAL = 30.0
+    
+    def __init__(self, sandbox_manager, genai_wrapper, index_dir: Optional[str] = None,
+                 chunk_chars: int = 1500, overlap_lines: int = 3):
+        """Initialize the index.
+        
+        Args:
+            sandbox_manager: SandboxManager whose files are indexed
+            genai_wrapper: GenAIWrapper used for embeddings
+            index_dir: Directory for the index files, defaults to a per-sandbox
+                directory under the GenAI cache directory
+            chunk_chars: Target chunk size in characters
+            overlap_lines: Lines shared between consecutive chunks
+        """
+        self.sandbox = sandbox_manager
+        self.genai = genai_wrapper
+        self.chunk_chars = chunk_chars
+        self.overlap_lines = overlap_lines
+        
+        if index_dir is None:
+            sandbox_id = hashlib.sha256(self.sandbox.sandbox_dir.encode("utf-8")).hexdigest()[:16]
+            index_dir = os.path.join(self.genai.cache_dir, "index", sandbox_id)
+        self.index_dir = index_dir
+        self.vectors_path = os.path.join(index_dir, "vectors.npy")
+        
+        # _lock guards the database and vectors and is not held while embedding;
+        # _update_lock lets one update (or clear) run at a time
+        self._lock = threading.RLock()
+        self._update_lock = threading.Lock()
+        self._db = None
+        self._vectors = None  # float32 array, one L2-normalized row per chunk
+        self._model = None  # embedding model of the indexed vectors
+        
+        self._dirty = True  # set by sandbox change notifications
+        self._last_scan = 0.0
+        self.sandbox.add_change_listener(self._on_change)
+    
+    @property
+    def available(self) -> bool:
+        """Whether the index can be used (NumPy installed)."""
+        return NUMPY_AVAILABLE
+    
+    @property
+    def embedding_model(self) -> str:
+        """Embedding model used for both documents and queries."""
+        return self.genai.embedding_model() or self.DEFAULT_EMBEDDING_MODEL
+    
+    def _on_change(self, filename: str) -> None:
+        """Sandbox change listener: refresh before the next query."""
+        self._dirty = True
+    
+    def _open(self) -> None:
+        """Open the metadata database and load the vectors, if not done yet."""
+        if self._db is not None:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(self.index_dir, "index.sqlite3"),
+            check_same_thread=False
+        )
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "filename TEXT PRIMARY KEY, file_hash TEXT NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, filename TEXT NOT NULL, file_hash TEXT NOT NULL, "
+            "offset INTEGER NOT NULL, length INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        self._db.commit()
+        
+        rows = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        vectors = None
+        if os.path.exists(self.vectors_path):
+            try:
+                vectors = np.load(self.vectors_path)
+            except Exception as e:
+                print(f"Error loading index vectors: {e}")
+        
+        # Start over if the vectors and metadata disagree or the model changed
+        if vectors is None or len(vectors) != rows or self._get_meta("model") != self.embedding_model:
+            self._reset()
+        else:
+            self._vectors = vectors
+            self._model = self._get_meta("model")
+    
+    def _get_meta(self, key: str) -> Optional[str]:
+        """Read a value from the meta table."""
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def _reset(self) -> None:
+        """Drop all indexed data; new vectors will come from the current embedding model."""
+        self._model = self.embedding_model
+        self._db.execute("DELETE FROM files")
+        self._db.execute("DELETE FROM chunks")
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (self._model,)
+        )
+        self._db.commit()
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+    
+    def chunk_text(self, content: str) -> List[Tuple[int, int]]:
+        """Split text into line-aligned chunks.
+        
+        Args:
+            content: File content
+        
+        Returns:
+            List of (offset, length) character ranges
+        """
+        lines = content.splitlines(keepends=True)
+        starts = []
+        position = 0
+        for line in lines:
+            starts.append(position)
+            position += len(line)
+        
+        chunks = []
+        first = 0
+        while first < len(lines):
+            last = first
+            size = 0
+            while last < len(lines) and (size == 0 or size + len(lines[last]) <= self.chunk_chars):
+                size += len(lines[last])
+                last += 1
+            chunks.append((starts[first], size))
+            if last >= len(lines):
+                break
+            first = max(first + 1, last - self.overlap_lines)
+        return chunks
+    
+    def _embed(self, texts: List[str], model: str) -> "np.ndarray":
+        """Embed texts (batched and cached by the wrapper) as L2-normalized float32 rows."""
+        success, vectors, message = self.genai.generate_embeddings(texts, model)
+        if not success:
+            raise RuntimeError(message)
+        
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def update(self) -> Tuple[bool, str]:
+        """Bring the index up to date with the sandbox, embedding only changed files.
+        
+        Returns:
+            Tuple of (success, message)
+        """
+        if not self.available:
+            return False, "Semantic index requires numpy (pip install numpy)"
+        
+        # Indexing is bulk work; let interactive requests go first
+        with self._update_lock, priority(BACKGROUND):
+            try:
+                return self._update()
+            except Exception as e:
+                self._dirty = True  # retry on the next query
+                return False, f"Error updating index: {e}"
+    
+    def _refresh(self) -> Tuple[bool, str]:
+        """Update the index if the sandbox changed or the last scan is stale."""
+        if not self._dirty and time.monotonic() - self._last_scan < self.RESCAN_INTERVAL:
+            with self._lock:
+                self._open()
+                if self._model == self.embedding_model:
+                    return True, "Index is up to date"
+        return self.update()
+    
+    def _update(self) -> Tuple[bool, str]:
+        """Re-embed new and changed files and drop removed ones (update lock held).
+        
+        The sandbox scan and the embedding run without _lock, so queries are
+        answered from the previous index meanwhile; the result is swapped in
+        under the lock at the end.
+        """
+        with self._lock:
+            self._open()
+            # Vectors of different models can't be mixed (or even stacked)
+            if self._model != self.embedding_model:
+                self._reset()
+            model = self._model
+            known = {
+                filename: (file_hash, mtime_ns, size)
+                for filename, file_hash, mtime_ns, size in self._db.execute(
+                    "SELECT filename, file_hash, mtime_ns, size FROM files"
+                )
+            }
+        
+        # Changes notified from here on are picked up by the next refresh
+        self._dirty = False
+        self._last_scan = time.monotonic()
+        
+        current = {}  # filename -> (file_hash, mtime_ns, size)
+        changed = {}  # filename -> content
+        # A fresh scan, so files edited in place by other programs are seen
+        for entry in self.sandbox.list_entries(recursive=True, refresh=True):
+            filename = entry.path
+            if entry.is_dir or self.sandbox.is_binary_file(filename):
+                continue
+            previous = known.get(filename)
+            if previous and previous[1:] == (entry.mtime_ns, entry.size):
+                current[filename] = previous
+                continue
+            
+            success, content = self.sandbox.read_file(filename)
+            if not success or not isinstance(content, str):
+                continue
+            file_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            current[filename] = (file_hash, entry.mtime_ns, entry.size)
+            if not previous or previous[0] != file_hash:
+                changed[filename] = content
+        
+        removed = [filename for filename in known if filename not in current]
+        if not changed and not removed:
+            # Only mtimes may have moved
+            with self._lock:
+                self._save_files(current)
+            return True, "Index is up to date"
+        
+        new_meta = []
+        new_texts = []
+        for filename, content in changed.items():
+            file_hash = current[filename][0]
+            for offset, length in self.chunk_text(content):
+                new_meta.append((filename, file_hash, offset, length))
+                new_texts.append(f"File: {filename}\n{content[offset:offset + length]}")
+        
+        start = time.time()
+        new_vectors = self._embed(new_texts, model) if new_texts else None
+        
+        with self._lock:
+            # Keep the rows of unchanged files, in their current order
+            kept_rows = []
+            kept_meta = []
+            for row, filename, file_hash, offset, length in self._db.execute(
+                "SELECT row, filename, file_hash, offset, length FROM chunks ORDER BY row"
+            ):
+                if filename in current and filename not in changed:
+                    kept_rows.append(row)
+                    kept_meta.append((filename, file_hash, offset, length))
+            
+            parts = []
+            if kept_rows:
+                parts.append(self._vectors[kept_rows])
+            if new_vectors is not None:
+                parts.append(new_vectors)
+            vectors = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+            
+            # Write the vectors first, then swap the metadata in one transaction
+            temp_path = self.vectors_path + ".tmp.npy"
+            np.save(temp_path, vectors)
+            os.replace(temp_path, self.vectors_path)
+            
+            self._db.execute("DELETE FROM chunks")
+            self._db.executemany(
+                "INSERT INTO chunks (row, filename, file_hash, offset, length) VALUES (?, ?, ?, ?, ?)",
+                [(row,) + meta for row, meta in enumerate(kept_meta + new_meta)]
+            )
+            self._save_files(current, commit=False)
+            self._db.commit()
+            self._vectors = vectors
+        
+        return True, (
+            f"Indexed {len(changed)} changed file(s) ({len(new_texts)} chunks) in "
+            f"{time.time() - start:.1f}s, removed {len(removed)}; {len(vectors)} chunks total"
+        )
+    
+    def _save_files(self, current: Dict[str, Tuple[str, int, int]], commit: bool = True) -> None:
+        """Replace the per-file (hash, mtime, size) records."""
+        self._db.execute("DELETE FROM files")
+        self._db.executemany(
+            "INSERT INTO files (filename, file_hash, mtime_ns, size) VALUES (?, ?, ?, ?)",
+            [(filename,) + values for filename, values in current.items()]
+        )
+        if commit:
+            self._db.commit()
+    
+    def search(self, query: str, top_k: int = 8,
+               filenames: Optional[List[str]] = None) -> Tuple[bool, Any]:
+        """Find the chunks most similar to a query.
+        
+        Args:
+            query: Natural-language query
+            top_k: Maximum number of chunks to return
+            filenames: Optional list restricting the search to these files
+        
+        Returns:
+            Tuple of (success, results) where results is a list of dicts with
+            filename, offset, length, score and text, or an error message
+        """
+        success, message = self._refresh()
+        if not success:
+            return False, message
+        
+        with self._lock:
+            if len(self._vectors) == 0:
+                return True, []
+            model = self._model
+        
+        try:
+            query_vector = self._embed([query], model)[0]
+        except Exception as e:
+            return False, f"Error embedding query: {e}"
+        
+        with self._lock:
+            if self._model != model:
+                return False, "The embedding model changed while searching, please try again"
+            
+            rows = self._db.execute(
+                "SELECT row, filename, offset, length FROM chunks ORDER BY row"
+            ).fetchall()
+            candidates = [r for r in rows if filenames is None or r[1] in filenames]
+            if not candidates:
+                return True, []
+            
+            indices = np.array([r[0] for r in candidates])
+            scores = self._vectors[indices] @ query_vector
+            best = np.argsort(-scores)[:top_k]
+        
+        results = []
+        contents = {}
+        for position in best:
+            _, filename, offset, length = candidates[position]
+            if filename not in contents:
+                success, content = self.sandbox.read_file(filename)
+                contents[filename] = content if success else ""
+            results.append({
+                "filename": filename,
+                "offset": offset,
+                "length": length,
+                "score": float(scores[position]),
+                "text": contents[filename][offset:offset + length]
+            })
+        return True, results
+    
+    def relevant_files(self, query: str, top_k: int = 8,
+                       filenames: Optional[List[str]] = None) -> Tuple[bool, Any]:
+        """Get the top-k chunks for a query grouped into per-file excerpts.
+        
+        The result can be passed wherever a {filename: content} dictionary of
+        context files is expected. Excerpts of a file are kept in file order.
+        
+        Args:
+            query: Natural-language query
+            top_k: Maximum number of chunks to include
+            filenames: Optional list restricting the search to these files
+        
+        Returns:
+            Tuple of (success, {filename: excerpt_text}) or (False, error_message)
+        """
+        success, results = self.search(query, top_k, filenames)
+        if not success:
+            return False, results
+        
+        by_file = {}
+        for result in results:
+            by_file.setdefault(result["filename"], []).append(result)
+        
+        excerpts = {}
+        for filename, chunks in by_file.items():
+            chunks.sort(key=lambda chunk: chunk["offset"])
+            parts = []
+            end = 0
+            for chunk in chunks:
+                text = chunk["text"]
+                if chunk["offset"] < end:
+                    # Overlapping chunks - skip the part already included
+                    text = text[end - chunk["offset"]:]
+                elif chunk["offset"] > 0:
+                    parts.append("...\n")
+                parts.append(text)
+                end = max(end, chunk["offset"] + chunk["length"])
+            excerpts[filename] = "".join(parts)
+        return True, excerpts
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of indexed files and chunks."""
+        if not self.available:
+            return {"files": 0, "chunks": 0, "model": self.embedding_model}
+        with self._lock:
+            self._open()
+            files = self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            return {"files": files, "chunks": len(self._vectors), "model": self.embedding_model}
+    
+    def clear(self) -> None:
+        """Remove all indexed data so the next update re-embeds everything."""
+        if not self.available:
+            return
+        with self._update_lock, self._lock:
+            self._open()
+            self._reset()
+            self._dirty = True
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+from typing import Callable, Awaitable, AsyncIterator, Dict, Any, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    """A blocking call in flight, shared by everyone asking for the same key."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _StreamFlight:
+    """A streamed response in flight; chunks are kept so late joiners can replay them."""
+    
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.changed = asyncio.Event()
+        self.consumers = 0
+        self.task = None
+    
+    def notify(self) -> None:
+        """Wake every consumer waiting for the next chunk."""
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """Coalesces concurrent identical requests into one underlying call.
+    
+    While a call for a key is running, further calls with the same key wait
+    for it and receive the same result (or exception) instead of sending a
+    duplicate request. Finished calls are forgotten immediately; repeating a
+    finished request is the response cache's job.
+    
+    The blocking variant may be used from any thread; the async variants
+    must all run on the same event loop.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+        self._async_calls = {}  # key -> asyncio.Future
+        self._streams = {}  # key -> _StreamFlight
+        self._stats = {"calls": 0, "coalesced": 0}
+    
+    def stats(self) -> Dict[str, int]:
+        """Get the number of underlying calls and of requests that joined one."""
+        with self._lock:
+            return dict(self._stats)
+    
+    def _count(self, leader: bool) -> None:
+        with self._lock:
+            self._stats["calls" if leader else "coalesced"] += 1
+    
+    def do(self, key: str, func: Callable[[], T]) -> T:
+        """Run func, or wait for the identical call already running.
+        
+        Args:
+            key: Identity of the request, e.g. a response cache key
+            func: Function performing the request
+        
+        Returns:
+            The result of the shared call
+        
+        Raises:
+            Exception: The error raised by the shared call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            self._stats["calls" if leader else "coalesced"] += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    async def do_async(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Async variant of do; factory creates the awaitable if no call is running.
+        
+        A caller that is cancelled stops waiting, but the shared call keeps
+        running for the others.
+        """
+        future = self._async_calls.get(key)
+        self._count(future is None)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._async_calls[key] = future
+            
+            def forget(finished):
+                if self._async_calls.get(key) is finished:
+                    del self._async_calls[key]
+                # Mark the error as retrieved even if every waiter was cancelled
+                if not finished.cancelled():
+                    finished.exception()
+            future.add_done_callback(forget)
+        return await asyncio.shield(future)
+    
+    async def stream_async(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Share one async stream between concurrent identical requests.
+        
+        The first caller starts the stream; callers joining later first
+        receive the chunks produced so far, then follow along. The stream is
+        cancelled when the last consumer stops reading before it ends.
+        
+        Args:
+            key: Identity of the request
+            factory: Function returning the async iterator of chunks
+        
+        Yields:
+            Chunks of the shared stream
+        
+        Raises:
+            Exception: The error raised by the shared stream
+        """
+        flight = self._streams.get(key)
+        self._count(flight is None)
+        if flight is None:
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, factory))
+        
+        flight.consumers += 1
+        try:
+            index = 0
+            while True:
+                changed = flight.changed
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                if changed is flight.changed:
+                    await changed.wait()
+        finally:
+            flight.consumers -= 1
+            if flight.consumers == 0 and not flight.finished:
+                flight.task.cancel()
+    
+    async def _pump(self, key: str, flight: _StreamFlight, factory: Callable[[], AsyncIterator[Any]]) -> None:
+        """Read the underlying stream into the flight's chunk list."""
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.finished = True
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+            flight.notify()
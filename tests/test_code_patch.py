@@ -0,0 +1,134 @@
+from code_patch import apply_patch, edit_stats, parse_unified_diff, plan_patch
+
+ORIGINAL = "\n".join([
+    "import os",
+    "",
+    "def load(path):",
+    "    with open(path) as f:",
+    "        return f.read()",
+    "",
+    "def save(path, text):",
+    "    with open(path, 'w') as f:",
+    "        f.write(text)",
+    "",
+])
+
+
+def test_applies_hunk_with_correct_line_numbers():
+    diff = (
+        "--- a/code\n"
+        "+++ b/code\n"
+        "@@ -3,3 +3,3 @@\n"
+        " def load(path):\n"
+        "-    with open(path) as f:\n"
+        "+    with open(path, encoding='utf-8') as f:\n"
+        "         return f.read()\n"
+    )
+    success, patched = apply_patch(ORIGINAL, diff)
+    assert success
+    assert patched == ORIGINAL.replace("open(path) as f", "open(path, encoding='utf-8') as f")
+
+
+def test_hunk_is_located_by_content_when_line_numbers_are_off():
+    diff = (
+        "@@ -40,3 +40,4 @@\n"
+        " def save(path, text):\n"
+        "     with open(path, 'w') as f:\n"
+        "         f.write(text)\n"
+        "+    return len(text)\n"
+    )
+    success, patched = apply_patch(ORIGINAL, diff)
+    assert success
+    assert patched == ORIGINAL.replace("f.write(text)\n", "f.write(text)\n    return len(text)\n")
+
+
+def test_hunk_header_without_numbers_and_fenced_diff():
+    diff = (
+        "Here is the change:\n"
+        "```diff\n"
+        "@@\n"
+        "-import os\n"
+        "+import os\n"
+        "+import sys\n"
+        "```\n"
+    )
+    success, patched = apply_patch(ORIGINAL, diff)
+    assert success
+    assert patched.startswith("import os\nimport sys\n\ndef load")
+
+
+def test_context_with_wrong_whitespace_still_matches():
+    # Trailing whitespace and indentation drift in context lines are tolerated
+    diff = (
+        "@@ -7,2 +7,2 @@\n"
+        " def save(path, text):   \n"
+        "-  with open(path, 'w') as f:\n"
+        "+    with open(path, 'a') as f:\n"
+    )
+    success, patched = apply_patch(ORIGINAL, diff)
+    assert success
+    assert "    with open(path, 'a') as f:" in patched
+    assert "'w'" not in patched
+
+
+def test_closest_match_to_the_stated_line_wins():
+    original = "x = 1\ny = 2\nx = 1\ny = 2\n"
+    diff = "@@ -3,2 +3,2 @@\n x = 1\n-y = 2\n+y = 3\n"
+    success, patched = apply_patch(original, diff)
+    assert success
+    assert patched == "x = 1\ny = 2\nx = 1\ny = 3\n"
+
+
+def test_conflicting_hunk_is_rejected():
+    diff = "@@ -3,2 +3,2 @@\n def load(path):\n-    return None\n+    return ''\n"
+    success, error = apply_patch(ORIGINAL, diff)
+    assert not success
+    assert "Hunk 1" in error and "conflict" in error
+
+
+def test_empty_diff_changes_nothing_and_prose_is_rejected():
+    assert plan_patch(ORIGINAL, "") == (True, [])
+    success, error = apply_patch(ORIGINAL, "I would rename the function.")
+    assert not success
+    assert error == "Response is not a unified diff"
+
+
+def test_edits_keep_only_changed_lines():
+    diff = (
+        "@@ -3,3 +3,3 @@\n"
+        " def load(path):\n"
+        "-    with open(path) as f:\n"
+        "+    with open(path, 'rb') as f:\n"
+        "         return f.read()\n"
+    )
+    success, edits = plan_patch(ORIGINAL, diff)
+    assert success
+    assert edits == [(3, 4, ["    with open(path, 'rb') as f:"])]
+    assert edit_stats(edits) == (1, 1)
+
+
+def test_trailing_blank_context_and_commentary_are_dropped():
+    diff = "@@ -1,1 +1,1 @@\n-import os\n+import os.path\n\nThat's all.\n"
+    hunks = parse_unified_diff(diff)
+    assert len(hunks) == 1
+    assert hunks[0].old_lines == ["import os"]
+    assert hunks[0].new_lines == ["import os.path"]
+
+
+def test_removed_line_that_looks_like_a_file_header():
+    original = "a\n-- comment\nb\n"
+    diff = "--- a/code\n+++ b/code\n@@ -1,3 +1,2 @@\n a\n--- comment\n b\n"
+    assert apply_patch(original, diff) == (True, "a\nb\n")
+
+
+def test_added_line_that_looks_like_a_file_header():
+    original = "a\n-- comment\nb\n"
+    diff = "--- a/code\n+++ b/code\n@@ -1,3 +1,4 @@\n a\n -- comment\n+++ added\n b\n"
+    assert apply_patch(original, diff) == (True, "a\n-- comment\n++ added\nb\n")
+
+
+def test_header_after_a_complete_hunk_ends_it():
+    diff = "@@ -1,1 +1,1 @@\n-a\n+b\n--- a/other\n+++ b/other\n"
+    hunks = parse_unified_diff(diff)
+    assert len(hunks) == 1
+    assert (hunks[0].old_lines, hunks[0].new_lines) == (["a"], ["b"])
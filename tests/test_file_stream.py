@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from file_stream import FileStreamParser, parse_files_json, parse_manifest, strip_code_fence
+
+FILES = [
+    {"filename": "app.py", "language": "python",
+     "content": 'print("a \\"quoted\\" {brace} [bracket]")\nif x:\n\tpass\n'},
+    {"filename": "notes.md", "language": "markdown", "content": "back\\slash } and ] and \u00e9\n"},
+]
+
+
+def feed_in_chunks(text, size):
+    parser = FileStreamParser()
+    files = []
+    for start in range(0, len(text), size):
+        files.extend(parser.feed(text[start:start + size]))
+    parser.close()
+    return files
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_objects_decode_whatever_the_chunk_boundaries(size):
+    # Every split point is hit with size 1, including inside escapes like \" and \\
+    text = json.dumps(FILES, indent=2)
+    assert feed_in_chunks(text, size) == FILES
+
+
+def test_escape_split_across_chunks():
+    text = json.dumps([{"filename": "a.txt", "content": 'say \\"hi\\" }'}])
+    split = text.index('\\\\\\"') + 1  # between the two backslashes
+    parser = FileStreamParser()
+    assert parser.feed(text[:split]) == []
+    assert parser.feed(text[split:]) == [{"filename": "a.txt", "language": "", "content": 'say \\"hi\\" }'}]
+    parser.close()
+
+
+def test_each_object_is_returned_as_soon_as_it_is_complete():
+    text = json.dumps(FILES)
+    first_end = text.index("}, {") + 1
+    parser = FileStreamParser()
+    assert parser.feed(text[:first_end]) == [FILES[0]]
+    assert parser.feed(text[first_end:]) == [FILES[1]]
+    parser.close()
+
+
+def test_objects_without_filename_are_skipped():
+    text = json.dumps([{"content": "orphan"}, {"filename": " b.py ", "content": "x = 1"}])
+    assert parse_files_json(text) == {"b.py": "x = 1"}
+
+
+def test_truncated_response_is_reported():
+    text = json.dumps(FILES)
+    parser = FileStreamParser()
+    parser.feed(text[:len(text) // 2])
+    with pytest.raises(ValueError, match="ended early"):
+        parser.close()
+
+
+def test_invalid_object_and_unbalanced_json_raise():
+    with pytest.raises(ValueError, match="Invalid file object"):
+        FileStreamParser().feed('[{"filename": "a", "content": nope}]')
+    with pytest.raises(ValueError, match="Unexpected"):
+        FileStreamParser().feed("]")
+
+
+def test_manifest_drops_duplicates_and_accepts_wrapped_array():
+    text = json.dumps({"files": [
+        {"filename": "a.py", "purpose": "entry point"},
+        {"filename": "a.py", "purpose": "again"},
+        {"purpose": "no name"},
+        {"filename": "b.py", "purpose": "helpers", "interfaces": "def helper()"},
+    ]})
+    assert parse_manifest(text) == [
+        {"filename": "a.py", "purpose": "entry point", "interfaces": ""},
+        {"filename": "b.py", "purpose": "helpers", "interfaces": "def helper()"},
+    ]
+    with pytest.raises(ValueError):
+        parse_manifest('"just a string"')
+
+
+def test_strip_code_fence():
+    assert strip_code_fence("```json\n[1, 2]\n```") == "[1, 2]"
+    assert strip_code_fence("[1, 2]") == "[1, 2]"
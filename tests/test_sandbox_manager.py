@@ -0,0 +1,148 @@
+import os
+
+import pytest
+
+from sandbox_manager import SandboxManager
+
+
+@pytest.fixture
+def sandbox(tmp_path):
+    return SandboxManager(str(tmp_path / "sandbox"))
+
+
+def read(sandbox, name):
+    with open(os.path.join(sandbox.sandbox_dir, name), encoding="utf-8") as file:
+        return file.read()
+
+
+def all_names(sandbox):
+    """Every file and directory in the sandbox, hidden ones included."""
+    names = []
+    for root, dirs, files in os.walk(sandbox.sandbox_dir):
+        for name in dirs + files:
+            names.append(os.path.relpath(os.path.join(root, name), sandbox.sandbox_dir).replace(os.sep, "/"))
+    return sorted(names)
+
+
+def fail_on_rename(monkeypatch, failing_call):
+    """Make the failing_call-th rename of a temp file over its target raise."""
+    real_replace = os.replace
+    calls = []
+    
+    def replace(src, dst):
+        if str(src).endswith(".tmp"):
+            calls.append(dst)
+            if len(calls) == failing_call:
+                raise OSError("disk full")
+        return real_replace(src, dst)
+    
+    monkeypatch.setattr(os, "replace", replace)
+    return calls
+
+
+def test_write_file_replaces_atomically(sandbox, monkeypatch):
+    sandbox.write_file("a.txt", "old")
+    fail_on_rename(monkeypatch, 1)
+    
+    success, message = sandbox.write_file("a.txt", "new")
+    
+    assert not success
+    assert "disk full" in message
+    assert read(sandbox, "a.txt") == "old"
+    assert all_names(sandbox) == ["a.txt"]
+
+
+def test_write_file_keeps_permissions(sandbox):
+    sandbox.write_file("a.txt", "old")
+    os.chmod(os.path.join(sandbox.sandbox_dir, "a.txt"), 0o600)
+    
+    sandbox.write_file("a.txt", "new")
+    
+    assert read(sandbox, "a.txt") == "new"
+    assert os.stat(os.path.join(sandbox.sandbox_dir, "a.txt")).st_mode & 0o777 == 0o600
+
+
+def test_write_many_writes_every_file(sandbox):
+    changed = []
+    sandbox.add_change_listener(changed.append)
+    
+    success, _ = sandbox.write_many({"a.txt": "A", "src/pkg/b.py": "B", "img.png": b"\x89PNG"})
+    
+    assert success
+    assert read(sandbox, "a.txt") == "A"
+    assert read(sandbox, "src/pkg/b.py") == "B"
+    with open(os.path.join(sandbox.sandbox_dir, "img.png"), "rb") as file:
+        assert file.read() == b"\x89PNG"
+    assert sorted(changed) == ["a.txt", "img.png", "src/pkg/b.py"]
+    assert all_names(sandbox) == ["a.txt", "img.png", "src", "src/pkg", "src/pkg/b.py"]
+
+
+def test_write_many_rejects_invalid_path_before_writing(sandbox):
+    success, _ = sandbox.write_many({"a.txt": "A", "../escape.txt": "B"})
+    
+    assert not success
+    assert all_names(sandbox) == []
+
+
+def test_write_many_rolls_back_partial_renames(sandbox, monkeypatch):
+    sandbox.write_many({"a.txt": "old a", "c.txt": "old c"})
+    changed = []
+    sandbox.add_change_listener(changed.append)
+    calls = fail_on_rename(monkeypatch, 4)
+    
+    success, message = sandbox.write_many({
+        "a.txt": "new a", "new/dir/b.txt": "new b", "c.txt": "new c", "d.txt": "new d"
+    })
+    
+    assert not success
+    assert "rolled back" in message
+    assert len(calls) == 4
+    # Replaced files are restored from their backups, new files and folders removed
+    assert read(sandbox, "a.txt") == "old a"
+    assert read(sandbox, "c.txt") == "old c"
+    assert all_names(sandbox) == ["a.txt", "c.txt"]
+    assert changed == []
+
+
+def test_write_many_restores_copied_backups_without_hard_links(sandbox, monkeypatch):
+    sandbox.write_many({"a.txt": "old a"})
+    
+    def no_link(src, dst):
+        raise OSError("hard links not supported")
+    
+    monkeypatch.setattr(os, "link", no_link)
+    fail_on_rename(monkeypatch, 2)
+    
+    success, _ = sandbox.write_many({"a.txt": "new a", "b.txt": "new b"})
+    
+    assert not success
+    assert read(sandbox, "a.txt") == "old a"
+    assert all_names(sandbox) == ["a.txt"]
+
+
+def test_write_many_cleans_up_when_a_temp_file_fails(sandbox, monkeypatch):
+    real_write_temp = sandbox._write_temp
+    
+    def write_temp(full_path, content, is_binary, fsync):
+        if full_path.endswith("b.txt"):
+            raise OSError("no space left")
+        return real_write_temp(full_path, content, is_binary, fsync)
+    
+    monkeypatch.setattr(sandbox, "_write_temp", write_temp)
+    
+    success, message = sandbox.write_many({"x/a.txt": "A", "y/b.txt": "B"})
+    
+    assert not success
+    assert "No files were changed" in message
+    assert all_names(sandbox) == []
+
+
+def test_write_many_rollback_keeps_existing_directories(sandbox, monkeypatch):
+    sandbox.write_many({"src/a.txt": "old a"})
+    fail_on_rename(monkeypatch, 2)
+    
+    success, _ = sandbox.write_many({"src/a.txt": "new a", "src/lib/b.txt": "new b"})
+    
+    assert not success
+    assert all_names(sandbox) == ["src", "src/a.txt"]
+    assert read(sandbox, "src/a.txt") == "old a"
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import BACKGROUND, INTERACTIVE, NORMAL, PriorityScheduler, current_priority, priority
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def queued(scheduler):
+    return sum(scheduler.stats()["queued"].values())
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    scheduler = PriorityScheduler(max_concurrency=1)
+    order = []
+    
+    def request(name, level):
+        with scheduler.slot(level):
+            order.append(name)
+    
+    with scheduler.slot(NORMAL):
+        threads = []
+        for name, level in [("bg-1", BACKGROUND), ("normal", NORMAL), ("bg-2", BACKGROUND),
+                            ("interactive-1", INTERACTIVE), ("interactive-2", INTERACTIVE)]:
+            thread = threading.Thread(target=request, args=(name, level))
+            thread.start()
+            threads.append(thread)
+            # Queue them one at a time so the arrival order is known
+            wait_until(lambda: queued(scheduler) == len(threads))
+    for thread in threads:
+        thread.join(5)
+    
+    assert order == ["interactive-1", "interactive-2", "normal", "bg-1", "bg-2"]
+
+
+def test_class_limit_leaves_room_for_other_classes():
+    scheduler = PriorityScheduler(max_concurrency=3, class_limits={BACKGROUND: 1})
+    release = threading.Event()
+    
+    def background():
+        with scheduler.slot(BACKGROUND):
+            release.wait(5)
+    
+    threads = [threading.Thread(target=background) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: queued(scheduler) == 1)
+    assert scheduler.stats()["running"]["background"] == 1
+    
+    # The queued background request doesn't stop an interactive one from running
+    with scheduler.slot(INTERACTIVE):
+        assert scheduler.stats()["running"] == {"interactive": 1, "normal": 0, "background": 1}
+    
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert scheduler.stats()["running"] == {"interactive": 0, "normal": 0, "background": 0}
+
+
+def test_slot_defaults_to_the_current_priority():
+    scheduler = PriorityScheduler()
+    assert current_priority() == NORMAL
+    with priority(BACKGROUND):
+        assert current_priority() == BACKGROUND
+        with scheduler.slot():
+            assert scheduler.stats()["running"]["background"] == 1
+    assert current_priority() == NORMAL
+
+
+def test_async_waiters_are_admitted_by_priority():
+    scheduler = PriorityScheduler(max_concurrency=1)
+    order = []
+    
+    async def request(name, level):
+        async with scheduler.slot_async(level):
+            order.append(name)
+            await asyncio.sleep(0)
+    
+    async def main():
+        async with scheduler.slot_async(NORMAL):
+            tasks = []
+            for name, level in [("bg", BACKGROUND), ("normal", NORMAL), ("interactive", INTERACTIVE)]:
+                tasks.append(asyncio.ensure_future(request(name, level)))
+                await asyncio.sleep(0)
+            assert queued(scheduler) == 3
+        await asyncio.gather(*tasks)
+    
+    asyncio.run(main())
+    assert order == ["interactive", "normal", "bg"]
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    scheduler = PriorityScheduler(max_concurrency=1)
+    
+    async def main():
+        async with scheduler.slot_async():
+            waiter = asyncio.ensure_future(scheduler.slot_async().__aenter__())
+            await asyncio.sleep(0)
+            assert queued(scheduler) == 1
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert queued(scheduler) == 0
+        # The slot is free again
+        async with scheduler.slot_async():
+            assert scheduler.stats()["running"]["normal"] == 1
+    
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    
+    def request():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+    
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", request)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("key", request))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    
+    assert results == ["answer"] * 4
+    assert calls == [1]
+    assert flight.stats() == {"calls": 1, "coalesced": 3}
+
+
+def test_error_reaches_every_waiter_and_is_not_remembered():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("quota")
+    
+    errors = []
+    
+    def call():
+        try:
+            flight.do("key", failing)
+        except ValueError as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    
+    assert len(errors) == 2 and errors[0] is errors[1]
+    # A finished call is forgotten, the next one runs again
+    assert flight.do("key", lambda: "retried") == "retried"
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats() == {"calls": 2, "coalesced": 0}
+
+
+def test_do_async_coalesces_and_propagates_errors():
+    flight = SingleFlight()
+    calls = []
+    
+    async def request(result):
+        calls.append(result)
+        await asyncio.sleep(0.01)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    async def main():
+        results = await asyncio.gather(*(flight.do_async("ok", lambda: request("answer")) for _ in range(3)))
+        assert results == ["answer"] * 3
+        
+        error = ValueError("boom")
+        outcomes = await asyncio.gather(
+            *(flight.do_async("bad", lambda: request(error)) for _ in range(2)), return_exceptions=True
+        )
+        assert outcomes == [error, error]
+    
+    asyncio.run(main())
+    assert len(calls) == 2
+    assert flight.stats() == {"calls": 2, "coalesced": 3}
+
+
+def test_cancelled_waiter_leaves_shared_call_running():
+    flight = SingleFlight()
+    
+    async def request():
+        await asyncio.sleep(0.05)
+        return "answer"
+    
+    async def main():
+        first = asyncio.ensure_future(flight.do_async("key", request))
+        second = asyncio.ensure_future(flight.do_async("key", request))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+    
+    asyncio.run(main())
+
+
+def test_stream_late_joiner_replays_earlier_chunks():
+    flight = SingleFlight()
+    opened = []
+    
+    async def chunks():
+        opened.append(1)
+        for chunk in ["a", "b", "c"]:
+            await asyncio.sleep(0.01)
+            yield chunk
+    
+    async def consume(delay):
+        await asyncio.sleep(delay)
+        return [chunk async for chunk in flight.stream_async("key", chunks)]
+    
+    async def main():
+        return await asyncio.gather(consume(0), consume(0.015))
+    
+    assert asyncio.run(main()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert opened == [1]
+
+
+def test_stream_error_reaches_every_consumer():
+    flight = SingleFlight()
+    
+    async def chunks():
+        yield "a"
+        await asyncio.sleep(0.01)
+        raise ValueError("stream broke")
+    
+    async def consume():
+        received = []
+        with pytest.raises(ValueError, match="stream broke"):
+            async for chunk in flight.stream_async("key", chunks):
+                received.append(chunk)
+        return received
+    
+    async def main():
+        return await asyncio.gather(consume(), consume())
+    
+    assert asyncio.run(main()) == [["a"], ["a"]]